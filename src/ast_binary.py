@@ -0,0 +1,390 @@
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from collections.abc import Mapping
+from itertools import accumulate
+
+# Двоичный формат дерева трансформера.
+#
+# Файл (все числа - uint32 little-endian):
+#   заголовок   MAGIC, число строк, байт в блоке строк, слов в таблице
+#               форм, слов в записях, ленивых записей, объявлений, корень
+#   строки      длины в символах, затем UTF-8 всех строк подряд
+#               (идентификаторы, типы, литералы - каждая один раз)
+#   формы       для каждой формы dict: число ключей, номера строк ключей
+#               (форм в дереве несколько десятков)
+#   записи      массив слов: заголовок записи (форма dict или длина list
+#               и вид), затем по слову на значение
+#   ленивые     (начало поддерева, запись) для каждого method_body
+#   объявления  (начало поддерева, значение) для элементов unit["items"]
+#
+# Значение - одно слово: 3 младших бита - вид, остальные - номер строки,
+# константа, неотрицательное целое или смещение записи. Прочие числа
+# (отрицательные, большие, float - например, const_value после
+# constants.py) хранятся текстом repr в таблице строк. Записи пишутся после своих детей, поэтому
+# поддерево - непрерывный отрезок массива, который заканчивается его
+# записью, и читается одним линейным проходом без рекурсии. Объявление
+# верхнего уровня декодируется отдельно по своему отрезку, а тела методов
+# AstReader пропускает целиком и отдаёт вместо них LazyNode, который
+# декодирует тело при первом доступе.
+
+MAGIC = b"FOREAST3"
+LAZY_TYPES = frozenset(["method_body"])
+
+_HEADER = struct.Struct("<8s7I")
+_STR, _CONST, _DICT, _LIST, _LAZY, _INT, _NUMBER = range(7)
+_CONSTS = (None, False, True)
+
+
+class _Encoder:
+    def __init__(self):
+        self.strings = {}
+        self.shapes = {}
+        self.shape_words = array("I")
+        self.words = array("I")
+        self.lazy = array("I")
+
+    def string(self, value):
+        index = self.strings.get(value)
+        if index is None:
+            index = self.strings[value] = len(self.strings)
+        return index
+
+    def shape(self, keys):
+        index = self.shapes.get(keys)
+        if index is None:
+            index = self.shapes[keys] = len(self.shapes)
+            self.shape_words.append(len(keys))
+            self.shape_words.extend(self.string(k) for k in keys)
+        return index
+
+    def record(self, kind, head, items):
+        offset = len(self.words)
+        self.words.append(head << 3 | kind)
+        self.words.extend(items)
+        return offset << 3 | kind
+
+    def value(self, value):
+        if value is None:
+            return _CONST
+        if value is False or value is True:
+            return (1 + value) << 3 | _CONST
+        if isinstance(value, str):
+            return self.string(str(value)) << 3 | _STR
+        if isinstance(value, int) and 0 <= value < 1 << 29:
+            # Смещения (body_span в skim-дереве)
+            return value << 3 | _INT
+        if isinstance(value, (int, float)):
+            return self.string(repr(value)) << 3 | _NUMBER
+        if hasattr(value, "to_dict"):
+            # Слотовые узлы CompactTransformer
+            value = value.to_dict()
+        if isinstance(value, list):
+            return self.record(_LIST, len(value), [self.value(v) for v in value])
+        if not isinstance(value, dict):
+            raise TypeError("unsupported value in tree: %r" % (value,))
+        start = len(self.words)
+        items = [self.value(v) for v in value.values()]
+        if value.get("_type") in LAZY_TYPES:
+            word = self.record(_LAZY, self.shape(tuple(value)), items)
+            self.lazy.extend((start, word >> 3))
+            return word
+        return self.record(_DICT, self.shape(tuple(value)), items)
+
+
+def _le(words):
+    if sys.byteorder != "little":
+        words = array("I", words)
+        words.byteswap()
+    return words.tobytes()
+
+
+def dumps(tree):
+    # unit -> bytes
+    encoder = _Encoder()
+    items = array("I")
+    if isinstance(tree, dict) and isinstance(tree.get("items"), list):
+        # Объявления пишутся по одному, чтобы запомнить начало каждого
+        for node in tree["items"]:
+            start = len(encoder.words)
+            items.extend((start, encoder.value(node)))
+        values = [
+            encoder.record(_LIST, len(items) // 2, items[1::2]) if key == "items" else encoder.value(v)
+            for key, v in tree.items()
+        ]
+        root = encoder.record(_DICT, encoder.shape(tuple(tree)), values)
+    else:
+        root = encoder.value(tree)
+
+    strings = list(encoder.strings)
+    text = "".join(strings).encode("utf-8")
+    text += b"\0" * (-len(text) % 4)
+    header = _HEADER.pack(
+        MAGIC,
+        len(strings),
+        len(text),
+        len(encoder.shape_words),
+        len(encoder.words),
+        len(encoder.lazy) // 2,
+        len(items) // 2,
+        root,
+    )
+    return b"".join(
+        [
+            header,
+            _le(array("I", map(len, strings))),
+            text,
+            _le(encoder.shape_words),
+            _le(encoder.words),
+            _le(encoder.lazy),
+            _le(items),
+        ]
+    )
+
+
+def dump(tree, path):
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    data = dumps(tree)
+
+    # Атомарная запись: временный файл в том же каталоге + os.replace
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".fast")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+class LazyNode(Mapping):
+    # Тело метода: ключи известны из формы, значения - после первого обращения
+    __slots__ = ("_reader", "_start", "_offset", "_node")
+
+    def __init__(self, reader, start, offset):
+        self._reader = reader
+        self._start = start
+        self._offset = offset
+        self._node = None
+
+    def _load(self):
+        if self._node is None:
+            self._node = self._reader._scan(self._start, self._offset, False)
+        return self._node
+
+    @property
+    def loaded(self):
+        return self._node is not None
+
+    def __getitem__(self, key):
+        return self._load()[key]
+
+    def __iter__(self):
+        return iter(self._reader._keys(self._offset))
+
+    def __len__(self):
+        return len(self._reader._keys(self._offset))
+
+    def __repr__(self):
+        return "LazyNode(%r)" % (self._load(),)
+
+    def to_dict(self):
+        return self._load()
+
+
+def to_plain(value):
+    # Дерево с LazyNode -> обычные dict/list (например, для json.dumps)
+    if isinstance(value, LazyNode):
+        return value.to_dict()
+    if isinstance(value, dict):
+        return {k: to_plain(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [to_plain(v) for v in value]
+    return value
+
+
+def _number(text):
+    return int(text) if text.lstrip("-").isdigit() else float(text)
+
+
+def _words(data, start, count):
+    # Слова без копирования (для mmap - без чтения файла целиком)
+    view = memoryview(data)[start : start + 4 * count].cast("I")
+    if sys.byteorder != "little":
+        words = array("I", view)
+        words.byteswap()
+        view.release()
+        view = memoryview(words)
+    return view
+
+
+class AstReader:
+    def __init__(self, source, lazy=True):
+        # source - путь, bytes или mmap
+        self.lazy = lazy
+        self._file = None
+        if isinstance(source, (str, os.PathLike)):
+            import mmap
+
+            with open(source, "rb") as f:
+                self._file = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            source = self._file
+
+        magic, n_strings, text_bytes, n_shape_words, n_words, n_lazy, n_items, self.root = _HEADER.unpack_from(
+            source, 0
+        )
+        if magic != MAGIC:
+            raise ValueError("not a binary AST file")
+        pos = _HEADER.size
+        lengths = _words(source, pos, n_strings)
+        pos += 4 * n_strings
+        text = str(source[pos : pos + text_bytes], "utf-8").rstrip("\0")
+        pos += text_bytes
+        bounds = [0, *accumulate(lengths)]
+        self.strings = [text[a:b] for a, b in zip(bounds, bounds[1:])]
+        lengths.release()
+
+        shape_words = _words(source, pos, n_shape_words)
+        pos += 4 * n_shape_words
+        self.shapes = []
+        i = 0
+        while i < n_shape_words:
+            count = shape_words[i]
+            self.shapes.append(tuple(self.strings[w] for w in shape_words[i + 1 : i + 1 + count]))
+            i += 1 + count
+        shape_words.release()
+
+        self.words = _words(source, pos, n_words)
+        pos += 4 * n_words
+        lazy_words = _words(source, pos, 2 * n_lazy)
+        pos += 8 * n_lazy
+        self.skips = dict(zip(lazy_words[0::2], lazy_words[1::2]))
+        lazy_words.release()
+        self.items = _words(source, pos, 2 * n_items).tolist()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._file is not None:
+            self.words.release()
+            self._file.close()
+            self._file = None
+
+    def __len__(self):
+        return len(self.items) // 2
+
+    def __getitem__(self, index):
+        # Объявление верхнего уровня по номеру - без чтения остальных
+        index = range(len(self))[index]
+        start, word = self.items[2 * index], self.items[2 * index + 1]
+        return self.value(word, start)
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def unit(self):
+        return self.value(self.root, 0)
+
+    def value(self, word, start):
+        # Значение по слову; start - начало его поддерева
+        kind = word & 7
+        if kind == _STR:
+            return self.strings[word >> 3]
+        if kind == _CONST:
+            return _CONSTS[word >> 3]
+        if kind == _INT:
+            return word >> 3
+        if kind == _NUMBER:
+            return _number(self.strings[word >> 3])
+        return self._scan(start, word >> 3, self.lazy)
+
+    def _keys(self, offset):
+        return self.shapes[self.words[offset] >> 3]
+
+    def _size(self, offset):
+        head = self.words[offset]
+        return (head >> 3 if head & 7 == _LIST else len(self.shapes[head >> 3])) + 1
+
+    def _scan(self, start, stop, lazy):
+        # Записи поддерева [start, stop] по порядку: дети каждой записи уже
+        # декодированы и ждут в objs, пока их не заберёт родитель
+        strings = self.strings
+        shapes = self.shapes
+        consts = _CONSTS
+        skips = self.skips if lazy else {}
+        words = self.words[start : stop + self._size(stop)].tolist()
+        objs = {}
+        pop = objs.pop
+
+        pos = start
+        while pos <= stop:
+            body = skips.get(pos)
+            if body is not None and body <= stop:
+                objs[body] = LazyNode(self, pos, body)
+                pos = body + self._size(body)
+                continue
+            i = pos - start
+            head = words[i]
+            kind = head & 7
+            end = i + 1 + (head >> 3 if kind == _LIST else len(shapes[head >> 3]))
+            # Значение: строка, запись (уже в objs), константа или число
+            values = [
+                strings[w >> 3]
+                if w & 7 == _STR
+                else pop(w >> 3)
+                if _CONST < w & 7 < _INT
+                else consts[w >> 3]
+                if w & 7 == _CONST
+                else w >> 3
+                if w & 7 == _INT
+                else _number(strings[w >> 3])
+                for w in words[i + 1 : end]
+            ]
+            objs[pos] = values if kind == _LIST else dict(zip(shapes[head >> 3], values))
+            pos = start + end
+        return objs[stop]
+
+
+def load(path, lazy=False):
+    # Весь unit. lazy=True - тела методов остаются LazyNode; файл читается
+    # в память, так что дерево не зависит от открытого отображения
+    with open(path, "rb") as f:
+        data = f.read()
+    return AstReader(data, lazy).unit()
+
+
+def loads(data, lazy=False):
+    return AstReader(data, lazy).unit()
+
+
+def main(argv=None):
+    import argparse
+    import json
+
+    ap = argparse.ArgumentParser(prog="ast_binary")
+    ap.add_argument("command", choices=["pack", "unpack"])
+    ap.add_argument("input")
+    ap.add_argument("output")
+    args = ap.parse_args(argv)
+
+    if args.command == "pack":
+        with open(args.input, "r", encoding="utf-8") as f:
+            dump(json.load(f), args.output)
+    else:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(load(args.input), f, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
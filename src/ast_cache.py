@@ -0,0 +1,156 @@
+import hashlib
+import os
+import tempfile
+import lark
+from parser_factory import CACHE_DIR, GRAMMAR_PATH, read_grammar
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+TRANSFORMER_PATH = os.path.join(SRC_DIR, "transformer.py")
+# Всё, от чего зависит дерево: грамматика, трансформер, лексер с проходом
+# комментариев, опции парсера и декодирование исходника
+OUTPUT_SOURCES = (
+    GRAMMAR_PATH,
+    TRANSFORMER_PATH,
+    os.path.join(SRC_DIR, "lexer.py"),
+    os.path.join(SRC_DIR, "comments.py"),
+    os.path.join(SRC_DIR, "parser_factory.py"),
+    os.path.join(SRC_DIR, "source.py"),
+)
+
+DEFAULT_MAX_BYTES = 1 << 30
+
+
+def _file_digest(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def transformer_version():
+    # Любая правка OUTPUT_SOURCES или другая версия lark инвалидирует кэш
+    digest = hashlib.sha256(lark.__version__.encode("ascii"))
+    for path in OUTPUT_SOURCES:
+        digest.update(_file_digest(path).encode("ascii"))
+    return digest.hexdigest()
+
+
+class AstCache:
+    def __init__(self, path=None, max_bytes=DEFAULT_MAX_BYTES, grammar=None, prune_every=256):
+        self.path = path or os.path.join(CACHE_DIR, "ast")
+        self.max_bytes = max_bytes
+        self.prune_every = prune_every
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._puts = 0
+
+        grammar = grammar if grammar is not None else read_grammar(GRAMMAR_PATH)
+        salt = hashlib.sha256()
+        salt.update(hashlib.sha256(grammar.encode("utf-8")).digest())
+        salt.update(transformer_version().encode("ascii"))
+        self._salt = salt.digest()
+
+        os.makedirs(self.path, exist_ok=True)
+
+    def key(self, source):
+        # source - str, bytes или mmap (хэшируется без копии)
+        if isinstance(source, str):
+            source = source.encode("utf-8")
+        digest = hashlib.sha256(self._salt)
+        digest.update(source)
+        return digest.hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.path, key[:2], key + ".json")
+
+    def get(self, key):
+        entry = self._entry_path(key)
+        try:
+            with open(entry, "r", encoding="utf-8") as f:
+                text = f.read()
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+
+        # mtime используется как время последнего доступа для LRU
+        try:
+            os.utime(entry)
+        except OSError:
+            pass
+
+        self.hits += 1
+        return text
+
+    def put(self, key, text):
+        entry = self._entry_path(key)
+        directory = os.path.dirname(entry)
+        os.makedirs(directory, exist_ok=True)
+
+        # Атомарная запись: временный файл в том же каталоге + os.replace
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".json")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp, entry)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+
+        self._puts += 1
+        if self.prune_every and self._puts % self.prune_every == 0:
+            self.prune()
+
+    def entries(self):
+        result = []
+        for dirpath, _, filenames in os.walk(self.path):
+            for name in filenames:
+                if name.startswith(".tmp-") or not name.endswith(".json"):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                result.append((st.st_mtime, st.st_size, path))
+        return result
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def prune(self, max_bytes=None):
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        if total <= max_bytes:
+            return 0
+
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+
+        self.evictions += removed
+        return removed
+
+    def clear(self):
+        return self.prune(0)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+    def get_or_parse(self, source, parse):
+        # parse(source) -> JSON-текст результата трансформера
+        key = self.key(source)
+        text = self.get(key)
+        if text is None:
+            text = parse(source)
+            self.put(key, text)
+        return text
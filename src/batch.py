@@ -0,0 +1,173 @@
+import json
+import os
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from parser_factory import get_parser
+from source import Source, decode_bytes
+
+DEFAULT_EXTENSIONS = (".txt", ".fore")
+
+_parser = None
+_cache = None
+_recover = False
+
+
+def find_sources(root, extensions=DEFAULT_EXTENSIONS):
+    paths = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+        for name in sorted(filenames):
+            if name.lower().endswith(tuple(extensions)):
+                paths.append(os.path.join(dirpath, name))
+    return paths
+
+
+def _init_parser():
+    global _parser
+    if _parser is None:
+        _parser = get_parser()
+
+
+def _init_worker(cache_dir=None, cache_max_bytes=None, recover=False):
+    # Парсер строится один раз на процесс, а не на каждый файл
+    global _cache, _recover
+    _init_parser()
+    _recover = recover
+
+    if cache_dir is not None:
+        from ast_cache import AstCache, DEFAULT_MAX_BYTES
+
+        _cache = AstCache(cache_dir, max_bytes=cache_max_bytes or DEFAULT_MAX_BYTES)
+
+
+def parse_source(code):
+    _init_parser()
+    return _parser.parse(code, "unit")
+
+
+def _parse_to_json(data):
+    return json.dumps(parse_source(decode_bytes(data)), ensure_ascii=False)
+
+
+def _parse_recovering(data):
+    from recovery import parse_recovering
+
+    _init_parser()
+    tree, diagnostics = parse_recovering(decode_bytes(data), _parser)
+    return json.dumps(tree, ensure_ascii=False), diagnostics
+
+
+def _parse_file(job):
+    path, rel, out_dir = job
+    hit = None
+    diagnostics = None
+    try:
+        # Файл отображается в память: хэш для кэша и декодер читают
+        # прямо из отображения
+        with Source(path) as source:
+            data = source.data
+            if _recover:
+                # В кэш попадают только модули без ошибок - их дерево то же,
+                # что и у обычного разбора
+                text = None
+                if _cache is not None:
+                    key = _cache.key(data)
+                    text = _cache.get(key)
+                    hit = text is not None
+                if text is None:
+                    text, diagnostics = _parse_recovering(data)
+                    if _cache is not None and not diagnostics:
+                        _cache.put(key, text)
+            elif _cache is not None:
+                misses = _cache.misses
+                text = _cache.get_or_parse(data, _parse_to_json)
+                hit = _cache.misses == misses
+            else:
+                text = _parse_to_json(data)
+
+        if out_dir is not None:
+            out_path = os.path.join(out_dir, rel + ".json")
+            os.makedirs(os.path.dirname(out_path), exist_ok=True)
+            with open(out_path, "w", encoding="utf-8") as f:
+                f.write(text)
+            text = None
+
+        return rel, text, hit, None, diagnostics
+    except Exception as e:
+        error = {
+            "path": rel,
+            "error": type(e).__name__,
+            "message": str(e),
+            "traceback": traceback.format_exc(),
+        }
+        return rel, None, hit, error, diagnostics
+
+
+def iter_parse_dir(
+    root,
+    out_dir=None,
+    jobs=None,
+    extensions=DEFAULT_EXTENSIONS,
+    cache_dir=None,
+    cache_max_bytes=None,
+    recover=False,
+):
+    paths = find_sources(root, extensions)
+    work = [(p, os.path.relpath(p, root), out_dir) for p in paths]
+    if not work:
+        return
+
+    chunksize = max(1, len(work) // ((jobs or os.cpu_count() or 1) * 4))
+    with ProcessPoolExecutor(
+        max_workers=jobs, initializer=_init_worker, initargs=(cache_dir, cache_max_bytes, recover)
+    ) as pool:
+        for result in pool.map(_parse_file, work, chunksize=chunksize):
+            yield result
+
+
+def parse_dir(
+    root,
+    out_dir=None,
+    stream=None,
+    jobs=None,
+    extensions=DEFAULT_EXTENSIONS,
+    cache_dir=None,
+    cache_max_bytes=None,
+    recover=False,
+):
+    # out_dir - по одному JSON на модуль, stream - общий NDJSON-поток.
+    # recover - модули с синтаксическими ошибками не падают целиком
+    # (recovery.py), ошибки попадают в report["diagnostics"]
+    report = {"root": root, "parsed": 0, "failed": 0, "errors": []}
+    if cache_dir is not None:
+        report["cache_hits"] = 0
+        report["cache_misses"] = 0
+    if recover:
+        report["recovered"] = 0
+        report["diagnostics"] = []
+
+    results = iter_parse_dir(root, out_dir, jobs, extensions, cache_dir, cache_max_bytes, recover)
+    for rel, text, hit, error, diagnostics in results:
+        if hit is not None:
+            report["cache_hits" if hit else "cache_misses"] += 1
+        if diagnostics:
+            report["recovered"] += 1
+            report["diagnostics"].extend(dict(d, path=rel) for d in diagnostics)
+
+        if error is not None:
+            report["failed"] += 1
+            report["errors"].append(error)
+            continue
+
+        report["parsed"] += 1
+        if stream is not None:
+            stream.write('{"path": %s, "tree": %s}\n' % (json.dumps(rel, ensure_ascii=False), text))
+
+    return report
+
+
+def prune_cache(cache_dir, max_bytes=None):
+    from ast_cache import AstCache
+
+    cache = AstCache(cache_dir)
+    return cache.prune(max_bytes)
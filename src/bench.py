@@ -0,0 +1,513 @@
+import argparse
+import gc
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+STARTUP_SNIPPET = """
+import time
+t = time.perf_counter()
+from parser_factory import build_parser
+build_parser(cache={cache}, cache_dir={cache_dir!r})
+print(time.perf_counter() - t)
+"""
+
+# Холодный старт до готового дерева small.txt
+COLD_PARSE_SNIPPET = """
+import time
+t = time.perf_counter()
+{setup}
+with open({path!r}, "r", encoding="utf-8") as f:
+    parse(f.read())
+print(time.perf_counter() - t)
+"""
+
+COLD_PARSE_SETUPS = {
+    "factory": "from parser_factory import get_parser\nparse = get_parser().parse",
+    "standalone": "from standalone import parse",
+}
+
+
+def _run_snippet(snippet):
+    out = subprocess.check_output([sys.executable, "-c", snippet], cwd=SRC_DIR)
+    return float(out.decode().strip())
+
+
+def _run_startup(cache, cache_dir):
+    return _run_snippet(STARTUP_SNIPPET.format(cache=cache, cache_dir=cache_dir))
+
+
+def bench_cold_parse(repeat=5, path=None):
+    path = path or os.path.join(SRC_DIR, "..", "examples", "small.txt")
+    result = {}
+    for name, setup in COLD_PARSE_SETUPS.items():
+        _run_snippet(COLD_PARSE_SNIPPET.format(setup=setup, path=path))  # прогрев кэшей
+        result[name] = min(
+            _run_snippet(COLD_PARSE_SNIPPET.format(setup=setup, path=path)) for _ in range(repeat)
+        )
+    return result
+
+
+def bench_startup(repeat=5):
+    # Каждый замер - отдельный процесс, чтобы не было прогретых кэшей
+    cache_dir = tempfile.mkdtemp(prefix="forestroyer-bench-")
+    try:
+        cold = [_run_startup(False, cache_dir) for _ in range(repeat)]
+        _run_startup(True, cache_dir)  # заполнить кэш
+        warm = [_run_startup(True, cache_dir) for _ in range(repeat)]
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    return {"build": min(cold), "cached": min(warm)}
+
+
+def _examples(name):
+    with open(os.path.join(SRC_DIR, "..", "examples", name), "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def scaled_code(scale, seed=0):
+    # code.txt и, при scale > 1, синтетический корпус (corpus.py) на
+    # остальные (scale - 1) размера code.txt: разные модули, а не повтор
+    # одного
+    from corpus import generate
+
+    code = _examples("code.txt")
+    if scale <= 1:
+        return code
+    return "\n".join([code, generate((scale - 1) * (code.count("\n") + 1), seed=seed)])
+
+
+def _retained(parse, code):
+    # Память, удерживаемая деревом после разбора, и пиковая память разбора
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    t = time.perf_counter()
+    tree = parse(code)
+    elapsed = time.perf_counter() - t
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del tree
+    return {"retained": current - base, "peak": peak - base, "time": elapsed}
+
+
+def bench_memory(scale=1):
+    from nodes import CompactTransformer
+    from parser_factory import get_parser
+    from spans import parse_with_spans
+
+    code = scaled_code(scale)
+    dict_parser = get_parser()
+    compact_parser = get_parser(CompactTransformer())
+    # Прогрев: первый вызов parse_with_spans строит свой парсер
+    parse_with_spans("")
+
+    return {
+        "lines": code.count("\n") + 1,
+        "dict": _retained(dict_parser.parse, code),
+        "compact": _retained(compact_parser.parse, code),
+        "spans": _retained(parse_with_spans, code),
+    }
+
+
+def bench_incremental(scale=1, edits=50):
+    import random
+    import re
+    from incremental import IncrementalParser
+
+    code = scaled_code(scale)
+    inc = IncrementalParser(code)
+
+    t = time.perf_counter()
+    inc.reparse()
+    full = time.perf_counter() - t
+
+    # Правки размером с нажатие клавиши: пробел после := в теле метода
+    rnd = random.Random(0)
+    timings = {}
+    for _ in range(edits):
+        pos = rnd.choice([m.end() for m in re.finditer(r":= ", inc.code)])
+        t = time.perf_counter()
+        level = inc.edit(pos, pos, " ")
+        timings.setdefault(level, []).append(time.perf_counter() - t)
+
+    return {"lines": code.count("\n") + 1, "full": full, "edits": timings}
+
+
+def bench_binary(scale=1, repeat=5):
+    # Размер и загрузка: JSON против ast_binary (полностью, с ленивыми
+    # телами методов и одно объявление по номеру)
+    import ast_binary
+    from parser_factory import get_parser
+
+    code = scaled_code(scale)
+    tree = get_parser().parse(code)
+    text = json.dumps(tree, ensure_ascii=False).encode("utf-8")
+    data = ast_binary.dumps(tree)
+    reader = ast_binary.AstReader(data)
+
+    def signatures():
+        # Имена классов и методов без тел - типичный запрос индексатора
+        names = []
+        for item in ast_binary.AstReader(data):
+            body = item.get("class_body")
+            if body is not None:
+                names.extend(m["name"] for m in body["method_declarations"])
+        return names
+
+    return {
+        "lines": code.count("\n") + 1,
+        "json_bytes": len(text),
+        "binary_bytes": len(data),
+        "json_load": _best(lambda: json.loads(text), repeat)[0],
+        "binary_load": _best(lambda: ast_binary.loads(data), repeat)[0],
+        "binary_lazy": _best(lambda: ast_binary.loads(data, lazy=True), repeat)[0],
+        "signatures": _best(signatures, repeat)[0],
+        "one_item": _best(lambda: reader[len(reader) // 2], repeat)[0],
+    }
+
+
+def bench_skim(scale=1, repeat=5):
+    # Индексация API: полный разбор против skim (тела методов не разбираются)
+    from parser_factory import get_parser
+    from skim import parse_skim
+    from symbols import extract_symbols
+
+    code = scaled_code(scale)
+    parser = get_parser()
+    parse_skim(code)
+
+    return {
+        "lines": code.count("\n") + 1,
+        "full": _best(lambda: extract_symbols(parser.parse(code)), repeat)[0],
+        "skim": _best(lambda: extract_symbols(parse_skim(code)), repeat)[0],
+    }
+
+
+# === Набор бенчмарков по стадиям ===
+
+# Под git, чтобы сравнение с базовой линией было общим
+DEFAULT_BASELINE = os.path.normpath(os.path.join(SRC_DIR, "..", "bench", "baseline.json"))
+SUITE_STAGES = ("grammar", "lex", "parse", "transform", "serialize", "total")
+# Стадии короче этого - шум таймера, с базовой линией не сравниваются
+MIN_COMPARED_SECONDS = 0.005
+
+
+def _calibration_work():
+    # Фиксированная нагрузка без кода проекта (строки, regex, dict, json):
+    # по ней стадии пересчитываются в доли, сравнимые между машинами
+    text = " ".join("w%d" % (i * 7919 % 10007) for i in range(20000))
+    nodes = [{"_type": "word", "value": w, "n": len(w)} for w in re.findall(r"\w+", text)]
+    nodes.sort(key=lambda n: n["value"])
+    json.loads(json.dumps(nodes))
+
+
+def corpora(scales=(10,)):
+    # Имя -> текст модуля. Масштабированные корпуса - scaled_code(N)
+    result = {"small": _examples("small.txt"), "code": _examples("code.txt")}
+    for n in scales:
+        result["scaled_x%d" % n] = scaled_code(n)
+    return result
+
+
+def _best(fn, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        t = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - t
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def _timed_lexer(parser):
+    # Оборачивает контекстный лексер парсера и копит время, проведённое в нём
+    lexer = parser.parser.lexer
+    original = type(lexer).lex
+    spent = [0.0]
+
+    def lex(lexer_state, parser_state):
+        tokens = original(lexer, lexer_state, parser_state)
+        while True:
+            t = time.perf_counter()
+            try:
+                token = next(tokens)
+            except StopIteration:
+                spent[0] += time.perf_counter() - t
+                return
+            spent[0] += time.perf_counter() - t
+            yield token
+
+    lexer.lex = lex
+    return spent
+
+
+def measure_stages(code, repeat=3):
+    # Стадии меряются по отдельности:
+    #   grammar   - построение LALR из syntax.lark без кэша
+    #   lex       - время внутри контекстного лексера во время разбора
+    #   parse     - LALR с построением lark.Tree, минус лексинг
+    #   transform - обход Tree колбэками ClassDeclarationsTransformer
+    #   serialize - json.dumps результата
+    #   total     - parse со встроенным трансформером + json.dumps
+    import resource
+    from parser_factory import build_parser, get_parser
+    from transformer import ClassDeclarationsTransformer
+
+    stages = {}
+    stages["grammar"], _ = _best(lambda: build_parser(transformer=False, cache=False), 1)
+
+    tree_parser = get_parser(False)
+    full_parser = get_parser()
+    tree_parser.parse(code)
+
+    parse_time, tree = _best(lambda: tree_parser.parse(code), repeat)
+
+    lex_parser = build_parser(transformer=False)
+    lex_parser.parse(code)
+    spent = _timed_lexer(lex_parser)
+    lex_times = []
+    # Без GC: сборки, вызванные растущим деревом, иначе попадают в лексер
+    # (на scaled_x10 - до половины его времени) и остаются в parse
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            spent[0] = 0.0
+            lex_parser.parse(code)
+            lex_times.append(spent[0])
+    finally:
+        gc.enable()
+    stages["lex"] = min(lex_times)
+    stages["parse"] = max(parse_time - stages["lex"], 0.0)
+    stages["transform"], result = _best(lambda: ClassDeclarationsTransformer().transform(tree), repeat)
+    stages["serialize"], _ = _best(lambda: json.dumps(result, ensure_ascii=False), repeat)
+    stages["total"], _ = _best(lambda: json.dumps(full_parser.parse(code), ensure_ascii=False), repeat)
+    calibration, _ = _best(_calibration_work, max(repeat, 5))
+
+    lines = code.count("\n") + 1
+    return {
+        "lines": lines,
+        "seconds": stages,
+        "calibration": calibration,
+        "relative": {k: v / calibration for k, v in stages.items()},
+        "lines_per_sec": {k: lines / v if v else None for k, v in stages.items() if k != "grammar"},
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def _measure_in_child(code, repeat):
+    # Отдельный процесс на корпус, чтобы peak RSS не копился между замерами
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+        return pool.submit(measure_stages, code, repeat).result()
+
+
+def run_suite(scales=(10,), repeat=3, isolate=True):
+    results = {}
+    for name, code in corpora(scales).items():
+        results[name] = _measure_in_child(code, repeat) if isolate else measure_stages(code, repeat)
+    return results
+
+
+def compare(results, baseline, threshold):
+    # Регрессия: время стадии в долях калибровки (relative) или peak RSS
+    # выросли больше чем на threshold. Абсолютные секунды с другой машины
+    # или под нагрузкой не сравниваются
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        for stage, ratio in current["relative"].items():
+            old = base.get("relative", {}).get(stage)
+            if base["seconds"].get(stage, 0) < MIN_COMPARED_SECONDS:
+                continue
+            if old and ratio > old * (1 + threshold):
+                regressions.append((name, stage, old, ratio))
+        old_rss = base.get("peak_rss_kb")
+        if old_rss and current["peak_rss_kb"] > old_rss * (1 + threshold):
+            regressions.append((name, "peak_rss_kb", old_rss, current["peak_rss_kb"]))
+    return regressions
+
+
+# === Масштабирование на синтетическом корпусе ===
+
+
+def measure_scaling(lines, repeat=1, **options):
+    # Разбор потоком в никуда: дерево не удерживается, память не растёт с корпусом
+    import resource
+    from corpus import generate
+    from parser_factory import get_parser
+    from streaming import stream_unit
+
+    code = generate(lines, **options)
+    parser = get_parser()
+    with open(os.devnull, "w", encoding="utf-8") as out:
+        elapsed, _ = _best(lambda: stream_unit(code, out, "ndjson", parser=parser), repeat)
+
+    lines = code.count("\n") + 1
+    return {
+        "lines": lines,
+        "bytes": len(code.encode("utf-8")),
+        "seconds": elapsed,
+        "us_per_line": elapsed / lines * 1e6,
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def bench_scaling(sizes=(10000, 100000), repeat=1, **options):
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    for lines in sizes:
+        # Корпус генерируется в дочернем процессе, чтобы не гонять его через pickle
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+            results.append(pool.submit(measure_scaling, lines, repeat, **options).result())
+    return results
+
+
+def print_suite(results):
+    print(
+        "%-10s %8s " % ("corpus", "lines")
+        + " ".join("%10s" % s for s in SUITE_STAGES)
+        + " %12s %10s %10s" % ("lines/s", "rss MB", "calib")
+    )
+    for name, r in results.items():
+        print(
+            "%-10s %8d " % (name, r["lines"])
+            + " ".join("%8.1fms" % (r["seconds"][s] * 1000) for s in SUITE_STAGES)
+            + " %12.0f %10.1f %8.1fms" % (r["lines_per_sec"]["total"], r["peak_rss_kb"] / 1024, r["calibration"] * 1000)
+        )
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="bench")
+    ap.add_argument("bench", choices=["startup", "memory", "incremental", "suite", "scaling", "binary", "skim"])
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--scale", type=int, default=1)
+    ap.add_argument("--scales", default="10", help="suite: comma-separated corpus sizes in multiples of code.txt")
+    ap.add_argument("--baseline", default=DEFAULT_BASELINE)
+    ap.add_argument("--save-baseline", action="store_true")
+    ap.add_argument("--check", action="store_true", help="suite: exit 1 on a regression against the baseline")
+    ap.add_argument("--threshold", type=float, default=0.15)
+    ap.add_argument("--json", help="suite: also write results to this file")
+    ap.add_argument("--sizes", default="10000,100000", help="scaling: comma-separated corpus sizes in lines")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--depth", type=int, default=3)
+    args = ap.parse_args(argv)
+
+    if args.bench == "scaling":
+        sizes = tuple(int(x) for x in args.sizes.split(",") if x)
+        results = bench_scaling(sizes, 1, seed=args.seed, depth=args.depth)
+        print("%10s %10s %10s %10s %10s" % ("lines", "MB", "seconds", "us/line", "rss MB"))
+        for r in results:
+            print(
+                "%10d %10.1f %10.2f %10.2f %10.1f"
+                % (r["lines"], r["bytes"] / 2**20, r["seconds"], r["us_per_line"], r["peak_rss_kb"] / 1024)
+            )
+        # Линейность: время на строку на большом корпусе против самого малого
+        growth = results[-1]["us_per_line"] / results[0]["us_per_line"]
+        print("us/line growth %d -> %d lines: %.2fx" % (results[0]["lines"], results[-1]["lines"], growth))
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=2)
+        return 1 if growth > 1 + args.threshold * 2 else 0
+
+    if args.bench == "suite":
+        scales = tuple(int(x) for x in args.scales.split(",") if x)
+        results = run_suite(scales, args.repeat)
+        print_suite(results)
+
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=2)
+
+        if args.save_baseline:
+            os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+            with open(args.baseline, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=2)
+            print("baseline saved to %s" % args.baseline)
+        elif os.path.exists(args.baseline):
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                regressions = compare(results, json.load(f), args.threshold)
+            for name, stage, old, new in regressions:
+                print("REGRESSION %s/%s: %.4g -> %.4g" % (name, stage, old, new))
+            if regressions and args.check:
+                return 1
+        return 0
+
+    if args.bench == "startup":
+        res = bench_startup(args.repeat)
+        print("grammar build:  %8.1f ms" % (res["build"] * 1000))
+        print("cached load:    %8.1f ms" % (res["cached"] * 1000))
+        print("speedup:        %8.1fx" % (res["build"] / res["cached"]))
+
+        res = bench_cold_parse(args.repeat)
+        print("cold parse of small.txt:")
+        for name, elapsed in res.items():
+            print("  %-12s %8.1f ms" % (name, elapsed * 1000))
+
+    if args.bench == "memory":
+        res = bench_memory(args.scale)
+        print("lines: %d" % res["lines"])
+        print("%-8s %12s %12s %10s" % ("model", "retained KB", "peak KB", "time ms"))
+        for model in ("dict", "compact", "spans"):
+            r = res[model]
+            print(
+                "%-8s %12.1f %12.1f %10.1f"
+                % (model, r["retained"] / 1024, r["peak"] / 1024, r["time"] * 1000)
+            )
+        print("retained ratio: %.2fx" % (res["dict"]["retained"] / res["compact"]["retained"]))
+        print(
+            "spans overhead: %+.1f%% memory, %+.1f%% time"
+            % (
+                (res["spans"]["retained"] / res["dict"]["retained"] - 1) * 100,
+                (res["spans"]["time"] / res["dict"]["time"] - 1) * 100,
+            )
+        )
+
+    if args.bench == "binary":
+        res = bench_binary(args.scale, args.repeat)
+        print("lines: %d" % res["lines"])
+        print(
+            "size:   json %10d B, binary %10d B (%.1fx)"
+            % (res["json_bytes"], res["binary_bytes"], res["json_bytes"] / res["binary_bytes"])
+        )
+        for name in ("json_load", "binary_load", "binary_lazy", "signatures", "one_item"):
+            print("%-12s %10.2f ms" % (name, res[name] * 1000))
+
+    if args.bench == "skim":
+        res = bench_skim(args.scale, args.repeat)
+        print("lines: %d" % res["lines"])
+        print("full parse + symbols: %8.1f ms" % (res["full"] * 1000))
+        print("skim parse + symbols: %8.1f ms" % (res["skim"] * 1000))
+        print("speedup:              %8.1fx" % (res["full"] / res["skim"]))
+
+    if args.bench == "incremental":
+        res = bench_incremental(args.scale, args.repeat * 10)
+        print("lines: %d" % res["lines"])
+        print("full re-parse:        %8.2f ms" % (res["full"] * 1000))
+        for level, timings in sorted(res["edits"].items()):
+            timings.sort()
+            print(
+                "%-11s x%-4d median %8.2f ms, max %8.2f ms"
+                % (level, len(timings), timings[len(timings) // 2] * 1000, timings[-1] * 1000)
+            )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,65 @@
+import io
+import os
+import py_compile
+import re
+import sys
+import tempfile
+from standalone import OUTPUT_PATH, TRANSFORMER_PATH, source_digest
+
+HEADER = '''# Сгенерировано build_standalone.py из syntax/syntax.lark и transformer.py.
+# Не редактировать вручную.
+'''
+
+FOOTER = '''
+
+SOURCE_SHA256 = %r
+
+
+def Fore_Parser(**kwargs):
+    kwargs.setdefault("transformer", ClassDeclarationsTransformer())
+    return Lark_StandAlone(**kwargs)
+'''
+
+_LARK_IMPORT = re.compile(r"^(from lark\b.*|import lark\b.*)$", re.M)
+
+
+def generate():
+    from lark.tools.standalone import gen_standalone
+    from parser_factory import build_parser
+
+    out = io.StringIO()
+    # Standalone-модуль не зависит от src/: лексер стандартный
+    gen_standalone(build_parser(transformer=False, cache=False, _plugins={}), out=out)
+
+    # Token и Transformer берутся из сгенерированного кода lark
+    with open(TRANSFORMER_PATH, "r", encoding="utf-8") as f:
+        transformer = _LARK_IMPORT.sub("", f.read())
+
+    return HEADER + out.getvalue() + "\n\n" + transformer + FOOTER % source_digest()
+
+
+def build(output=OUTPUT_PATH):
+    text = generate()
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(output), prefix=".tmp-", suffix=".py")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        # mkstemp создает файл с 0600; права как у обычного open() по umask
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(tmp, 0o666 & ~umask)
+        os.replace(tmp, output)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+    # Байткод собираем сразу: модуль большой, компиляция при импорте дорогая
+    py_compile.compile(output, doraise=True)
+    return output
+
+
+if __name__ == "__main__":
+    print(build(sys.argv[1] if len(sys.argv) > 1 else OUTPUT_PATH))
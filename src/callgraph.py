@@ -0,0 +1,506 @@
+import json
+import os
+import sys
+from array import array
+from collections import deque
+from symbols import INDEX_PATH, SymbolIndex, _format, extract_symbols, type_name
+
+# Граф вызовов и ссылок между символами SymbolIndex.
+#
+# Вершины - символы индекса в плотной нумерации 0..N-1 (ids[i] - id символа),
+# рёбра хранятся в CSR: out_offsets[i]..out_offsets[i+1] - срез out_targets
+# с вершинами, на которые ссылается i; обратный граф (in_*) - то же для
+# "кто ссылается на i". inexact[k] = 1, если ребро найдено только по имени
+# (тип объекта неизвестен, например внешний класс или выражение).
+
+GRAPH_PATH = os.path.join(os.path.dirname(INDEX_PATH), "callgraph.bin")
+GRAPH_MAGIC = b"FORECG1\n"
+
+_CALLER_KINDS = ("method", "constructor", "property")
+_MEMBER_KINDS = ("method", "property", "field", "const", "event", "enum_value", "constructor")
+_EXTERNAL = object()
+
+
+# === Ссылки из тел методов ===
+def _value(node):
+    if isinstance(node, dict) and node.get("_type") in ("variable", "word"):
+        return str(node["value"])
+    return None
+
+
+def _chain(node, segments, nested):
+    # a.B(x).C -> [("a", False), ("B", True), ("C", False)];
+    # аргументы и индексы уходят в nested для отдельного обхода
+    kind = node.get("_type") if isinstance(node, dict) else None
+    if kind == "member_access":
+        _chain(node["object"], segments, nested)
+        _chain(node["member"], segments, nested)
+    elif kind == "method_call":
+        _chain(node["method"], segments, nested)
+        if segments:
+            segments[-1] = (segments[-1][0], True)
+        nested.append(node["args"])
+    elif kind == "index_access":
+        _chain(node["object"], segments, nested)
+        nested.append(node["index"])
+    elif kind in ("variable", "word"):
+        segments.append((str(node["value"]), False))
+    else:
+        # Начало цепочки - выражение, его тип неизвестен
+        segments.append((None, False))
+        nested.append(node)
+
+
+def _references(node, out):
+    # out: [(вид, цепочка)], вид - call, member, new, inherited, ref
+    # (ref - одиночное имя: поле, константа или свойство своего класса)
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(node)
+            continue
+        if not isinstance(node, dict):
+            continue
+
+        kind = node.get("_type")
+        if kind in ("member_access", "method_call", "index_access"):
+            segments = []
+            nested = []
+            _chain(node, segments, nested)
+            if len(segments) > 1 or segments[0][1]:
+                out.append(("member" if len(segments) > 1 else "call", tuple(s[0] for s in segments)))
+            stack.extend(nested)
+        elif kind == "variable":
+            out.append(("ref", (str(node["value"]),)))
+        elif kind == "constructor_call":
+            segments = []
+            nested = []
+            _chain(node["constructor"], segments, nested)
+            out.append(("new", tuple(s[0] for s in segments)))
+            stack.extend(nested)
+        elif kind == "inherited_call":
+            segments = []
+            nested = []
+            _chain(node["expression"], segments, nested)
+            out.append(("inherited", tuple(s[0] for s in segments)))
+            stack.extend(nested)
+        else:
+            stack.extend(v for k, v in node.items() if k != "_type" and isinstance(v, (dict, list)))
+
+
+def _scope(decl):
+    # Локальные переменные и параметры: имя -> тип
+    scope = {}
+    for param in decl.get("parameters") or ():
+        scope[_value(param["name"]).lower()] = type_name(param["type"])
+    bodies = [decl.get("body")]
+    for accessor in ("get_body", "set_body"):
+        if decl.get(accessor):
+            bodies.append(decl[accessor]["body"])
+    for body in bodies:
+        if body and body.get("var_block"):
+            for var in body["var_block"]["items"]:
+                scope[_value(var["name"]).lower()] = type_name(var["type"])
+    return scope, bodies
+
+
+def _callers(tree):
+    # (kind, container, declaration) для всего, у чего есть тело
+    for item in tree.get("items", ()):
+        kind = item.get("_type")
+        if kind == "method_declaration":
+            yield "method", None, item
+        elif kind == "class_def" and item.get("class_body"):
+            name = _value(item["class_name"])
+            body = item["class_body"]
+            for decl in body["constructor_declarations"]:
+                yield "constructor", name, decl
+            for decl in body["method_declarations"]:
+                yield "method", name, decl
+            for decl in body["property_declarations"]:
+                yield "property", name, decl
+
+
+def extract_references(tree, docs=None):
+    # -> (символы, [(номер символа-вызывающего, scope, [(вид, цепочка)])]);
+    # docs - как в extract_symbols, чтобы индекс совпадал с symbols build
+    symbols = extract_symbols(tree, docs)
+    position = {
+        (s["kind"], s["container"], s["name"], s["line"], s["column"]): i
+        for i, s in enumerate(symbols)
+        if s["kind"] in _CALLER_KINDS
+    }
+    callers = []
+    for kind, container, decl in _callers(tree):
+        name = decl["name"]
+        token = name["value"]
+        key = (kind, container, str(token), getattr(token, "line", None), getattr(token, "column", None))
+        scope, bodies = _scope(decl)
+        refs = []
+        for body in bodies:
+            if body:
+                _references(body["statements"], refs)
+        if refs and key in position:
+            callers.append((position[key], scope, refs))
+    return symbols, callers
+
+
+# === Разрешение ссылок ===
+class _Resolver:
+    def __init__(self, index):
+        self.index = index
+        self._ancestors = {}
+
+    def classes(self, name):
+        return self.index.lookup(name, "class") + self.index.lookup(name, "interface")
+
+    def ancestors(self, name):
+        # Сам тип и все предки, в порядке поиска членов
+        key = name.lower()
+        if key not in self._ancestors:
+            self._ancestors[key] = ()  # защита от циклов наследования
+            result = [name]
+            seen = {key}
+            queue = deque([name])
+            while queue:
+                for cls in self.classes(queue.popleft()):
+                    for parent in cls.get("parents") or ():
+                        if parent and parent.lower() not in seen:
+                            seen.add(parent.lower())
+                            result.append(parent)
+                            queue.append(parent)
+            self._ancestors[key] = tuple(result)
+        return self._ancestors[key]
+
+    def member(self, container, name, kinds=_MEMBER_KINDS):
+        for cls in self.ancestors(container):
+            found = [s for s in self.index.lookup("%s.%s" % (cls, name)) if s["kind"] in kinds]
+            if found:
+                return found
+        return []
+
+    def by_name(self, name, kinds=_MEMBER_KINDS):
+        return [s for s in self.index.lookup(name) if s["kind"] in kinds]
+
+    def resolve(self, caller, scope, kind, chain):
+        # -> [(символ, точно)]
+        container = caller["container"]
+        result = []
+
+        if kind == "ref":
+            name = chain[0]
+            if container is None or name.lower() in scope:
+                return result
+            return [(s, True) for s in self.member(container, name) if s["kind"] != "constructor"]
+
+        if kind == "inherited":
+            name = chain[-1]
+            if name is None or container is None:
+                return result
+            for parent in self.ancestors(container)[1:]:
+                found = self.member(parent, name)
+                if found:
+                    return [(s, True) for s in found]
+            return result
+
+        # current - тип, в котором ищется следующий сегмент:
+        # None - неизвестен (поиск по имени), _EXTERNAL - тип вне индекса
+        current = None
+        for i, name in enumerate(chain):
+            if current is _EXTERNAL:
+                break
+            if name is None:
+                current = None
+                continue
+            lower = name.lower()
+            if i == 0:
+                if lower == "self" and container:
+                    current = container
+                    continue
+                if lower in scope:
+                    current = scope[lower]
+                    continue
+                if kind == "new":
+                    # New Type.Create - первый сегмент всегда тип
+                    current = name if self.classes(name) else _EXTERNAL
+                    if current is not _EXTERNAL and len(chain) == 1:
+                        result += [(s, True) for s in self.index.members(name, "constructor")]
+                    continue
+                found = self.member(container, name) if container else []
+                if not found:
+                    found = [s for s in self.by_name(name, ("method", "const", "delegate")) if s["container"] is None]
+                if found:
+                    result += [(s, True) for s in found]
+                    current = found[0].get("type")
+                    continue
+                if self.classes(name):
+                    current = name
+                    continue
+                result += [(s, False) for s in self.by_name(name)]
+                current = None
+                continue
+
+            if current is None:
+                result += [(s, False) for s in self.by_name(name)]
+                continue
+            found = self.member(current, name)
+            if found:
+                result += [(s, True) for s in found]
+                current = found[0].get("type")
+            else:
+                # Член внешнего типа (или внешнего предка)
+                current = _EXTERNAL
+        return result
+
+
+def _csr(count, sources, targets, flags):
+    # Сортировка подсчётом по источнику
+    offsets = array("I", [0]) * (count + 1)
+    for s in sources:
+        offsets[s + 1] += 1
+    for i in range(count):
+        offsets[i + 1] += offsets[i]
+    fill = array("I", offsets[:count])
+    out = array("I", [0]) * len(targets)
+    out_flags = bytearray(len(targets))
+    for s, t, f in zip(sources, targets, flags):
+        k = fill[s]
+        out[k] = t
+        out_flags[k] = f
+        fill[s] = k + 1
+    return offsets, out, out_flags
+
+
+class CallGraph:
+    def __init__(self, ids, out_offsets, out_targets, in_offsets, in_targets, out_inexact, in_inexact):
+        self.ids = ids
+        self.node = {sid: i for i, sid in enumerate(ids)}
+        self.out_offsets = out_offsets
+        self.out_targets = out_targets
+        self.in_offsets = in_offsets
+        self.in_targets = in_targets
+        self.out_inexact = out_inexact
+        self.in_inexact = in_inexact
+
+    @classmethod
+    def from_edges(cls, ids, edges):
+        # edges: {(источник, цель): точно} в плотной нумерации
+        sources = array("I", (s for s, _ in edges))
+        targets = array("I", (t for _, t in edges))
+        flags = bytes(0 if exact else 1 for exact in edges.values())
+        out = _csr(len(ids), sources, targets, flags)
+        inc = _csr(len(ids), targets, sources, flags)
+        return cls(array("I", ids), out[0], out[1], inc[0], inc[1], out[2], inc[2])
+
+    def __len__(self):
+        return len(self.out_targets)
+
+    def _neighbours(self, offsets, targets, inexact, sid, exact_only):
+        i = self.node.get(sid)
+        if i is None:
+            return []
+        start, end = offsets[i], offsets[i + 1]
+        if exact_only:
+            return [self.ids[targets[k]] for k in range(start, end) if not inexact[k]]
+        return [self.ids[t] for t in targets[start:end]]
+
+    def callees(self, sid, exact_only=False):
+        return self._neighbours(self.out_offsets, self.out_targets, self.out_inexact, sid, exact_only)
+
+    def callers(self, sid, exact_only=False):
+        return self._neighbours(self.in_offsets, self.in_targets, self.in_inexact, sid, exact_only)
+
+    def _closure(self, offsets, targets, inexact, sids, max_depth, exact_only):
+        # BFS по CSR; результат - id символов без стартовых
+        visited = bytearray(len(self.ids))
+        frontier = [self.node[s] for s in sids if s in self.node]
+        for i in frontier:
+            visited[i] = 1
+        result = []
+        depth = 0
+        while frontier and (max_depth is None or depth < max_depth):
+            depth += 1
+            next_frontier = []
+            for i in frontier:
+                for k in range(offsets[i], offsets[i + 1]):
+                    t = targets[k]
+                    if not visited[t] and not (exact_only and inexact[k]):
+                        visited[t] = 1
+                        next_frontier.append(t)
+            result += next_frontier
+            frontier = next_frontier
+        return [self.ids[i] for i in result]
+
+    def transitive_callers(self, sids, max_depth=None, exact_only=False):
+        return self._closure(self.in_offsets, self.in_targets, self.in_inexact, sids, max_depth, exact_only)
+
+    def transitive_callees(self, sids, max_depth=None, exact_only=False):
+        return self._closure(self.out_offsets, self.out_targets, self.out_inexact, sids, max_depth, exact_only)
+
+    # === Хранение ===
+    _ARRAYS = ("ids", "out_offsets", "out_targets", "in_offsets", "in_targets")
+
+    def save(self, path=GRAPH_PATH, index=None):
+        import tempfile
+
+        header = {name: len(getattr(self, name)) for name in self._ARRAYS}
+        header["byteorder"] = sys.byteorder
+        # Индекс, по id которого построен граф
+        header["index"] = index.digest() if index is not None else None
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=".tmp-")
+        with os.fdopen(fd, "wb") as f:
+            f.write(GRAPH_MAGIC)
+            f.write(json.dumps(header).encode("ascii") + b"\n")
+            for name in self._ARRAYS:
+                getattr(self, name).tofile(f)
+            f.write(self.out_inexact)
+            f.write(self.in_inexact)
+        os.replace(tmp, path)
+        return path
+
+    @classmethod
+    def load(cls, path=GRAPH_PATH, index=None):
+        # index - индекс, с которым будут читаться id; граф от другой его
+        # версии (модуль переиндексирован, id сменились) не загружается
+        with open(path, "rb") as f:
+            if f.readline() != GRAPH_MAGIC:
+                raise ValueError("%s is not a call graph file" % path)
+            header = json.loads(f.readline())
+            if index is not None and header.get("index") != index.digest():
+                raise ValueError("%s was built against another version of the symbol index" % path)
+            arrays = []
+            for name in cls._ARRAYS:
+                a = array("I")
+                a.fromfile(f, header[name])
+                if header["byteorder"] != sys.byteorder:
+                    a.byteswap()
+                arrays.append(a)
+            edges = header["out_targets"]
+            out_inexact = bytearray(f.read(edges))
+            in_inexact = bytearray(f.read(edges))
+        return cls(*arrays, out_inexact, in_inexact)
+
+
+def build_graph(index, references):
+    # references: {путь: [(номер символа в файле, scope, refs)]};
+    # символы файла уже добавлены в index в том же порядке
+    resolver = _Resolver(index)
+    ids = sorted(index.symbols)
+    node = {sid: i for i, sid in enumerate(ids)}
+    edges = {}
+    for path, callers in references.items():
+        file_ids = index.files[path]["ids"]
+        for position, scope, refs in callers:
+            caller = index.symbols[file_ids[position]]
+            source = node[caller["id"]]
+            for kind, chain in refs:
+                for target, exact in resolver.resolve(caller, scope, kind, chain):
+                    key = (source, node[target["id"]])
+                    edges[key] = edges.get(key, False) or exact
+    return CallGraph.from_edges(ids, edges)
+
+
+# === Построение по каталогу ===
+def _extract_file(job):
+    import hashlib
+    from batch import parse_source
+    from comments import doc_comments
+    from source import decode_bytes
+
+    path, rel = job
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        code = decode_bytes(data)
+        symbols, callers = extract_references(parse_source(code), doc_comments(code))
+        return rel, hashlib.sha256(data).hexdigest(), symbols, callers, None
+    except Exception as e:
+        return rel, None, None, None, "%s: %s" % (type(e).__name__, e)
+
+
+def build_repository(root, jobs=None, extensions=None):
+    # Полный проход: индекс символов и граф строятся из одного разбора
+    from concurrent.futures import ProcessPoolExecutor
+    from batch import DEFAULT_EXTENSIONS, _init_worker, find_sources
+
+    paths = find_sources(root, extensions or DEFAULT_EXTENSIONS)
+    work = [(p, os.path.relpath(p, root)) for p in paths]
+    index = SymbolIndex()
+    references = {}
+    errors = []
+    if work:
+        chunksize = max(1, len(work) // ((jobs or os.cpu_count() or 1) * 4))
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker) as pool:
+            for rel, digest, symbols, callers, error in pool.map(_extract_file, work, chunksize=chunksize):
+                if error is not None:
+                    errors.append({"path": rel, "error": error})
+                    continue
+                index.add_file(rel, symbols, digest)
+                references[rel] = callers
+    return index, build_graph(index, references), errors
+
+
+def _resolve_names(index, names):
+    sids = []
+    for name in names:
+        found = [s for s in index.lookup(name) if s["kind"] in _MEMBER_KINDS + ("class", "delegate")]
+        if not found:
+            print("unknown symbol: %s" % name, file=sys.stderr)
+        sids += [s["id"] for s in found]
+    return sids
+
+
+def main(argv=None):
+    import argparse
+    import time
+
+    ap = argparse.ArgumentParser(prog="callgraph")
+    ap.add_argument("--index", default=INDEX_PATH)
+    ap.add_argument("--graph", default=GRAPH_PATH)
+    sub = ap.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("build", help="parse every unit under root, write index and graph")
+    p.add_argument("root")
+    p.add_argument("-j", "--jobs", type=int, default=None)
+    for command in ("callers", "callees"):
+        p = sub.add_parser(command)
+        p.add_argument("names", nargs="+", help="Name or Class.Member")
+        p.add_argument("-t", "--transitive", action="store_true")
+        p.add_argument("--depth", type=int, default=None)
+        p.add_argument("--exact", action="store_true", help="skip edges resolved by name only")
+    args = ap.parse_args(argv)
+
+    if args.command == "build":
+        index, graph, errors = build_repository(args.root, args.jobs)
+        index.save(args.index)
+        graph.save(args.graph, index)
+        print("symbols: %d, edges: %d" % (len(index), len(graph)), file=sys.stderr)
+        for error in errors:
+            print("  %s: %s" % (error["path"], error["error"].splitlines()[0]), file=sys.stderr)
+        return 1 if errors else 0
+
+    index = SymbolIndex.load(args.index)
+    try:
+        graph = CallGraph.load(args.graph, index)
+    except ValueError as e:
+        print("%s; run callgraph build" % e, file=sys.stderr)
+        return 2
+    sids = _resolve_names(index, args.names)
+
+    t = time.perf_counter()
+    if args.transitive:
+        closure = graph.transitive_callers if args.command == "callers" else graph.transitive_callees
+        found = closure(sids, args.depth, args.exact)
+    else:
+        neighbours = graph.callers if args.command == "callers" else graph.callees
+        found = sorted({n for sid in sids for n in neighbours(sid, args.exact)})
+    elapsed = time.perf_counter() - t
+
+    for sid in found:
+        print(_format(index.symbols[sid]))
+    print("%d symbols in %.2f ms" % (len(found), elapsed * 1000), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
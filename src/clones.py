@@ -0,0 +1,311 @@
+import hashlib
+import json
+import sys
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from symbols import _position, _token
+
+# Поиск клонов тел методов.
+#
+# Тело нормализуется: идентификаторы (word/variable) и литералы
+# заменяются заглушками, ключевые слова и операторы остаются. Признаки
+# метода - отпечатки его поддеревьев (операторов и выражений) не меньше
+# MIN_SUBTREE узлов и пар соседних операторов, то есть переименованная
+# копия даёт то же множество признаков.
+#
+# По множеству признаков строится MinHash-подпись из SIGNATURE_SIZE слов
+# (one permutation hashing: один 64-битный хэш на признак, номер корзины -
+# его остаток, пустые корзины заполняются из соседних). Подписи считаются
+# в процессах пула по пачкам файлов и хранятся в одном array, дерево не
+# держится. LSH: подпись режется на BANDS полос; полосы обрабатываются по
+# одной, и каждый метод в корзине сравнивается с WINDOW предыдущими
+# методами корзины, так что число сравнений линейно по числу методов.
+# Цена: в корзине больше WINDOW+1 несхожих методов пара может не
+# сравниться в этой полосе (её найдёт другая полоса, где корзина меньше).
+# Пары с оценкой сходства >= порога сливаются в группы через union-find.
+#
+# Память линейна по числу методов, ограничена не она, а размер на метод:
+# подпись - SIGNATURE_SIZE слов в общем array, meta - кортеж без дерева;
+# при группировке в памяти корзины только одной полосы.
+
+SIGNATURE_SIZE = 64
+BANDS = 16
+ROWS = SIGNATURE_SIZE // BANDS
+# Сколько предыдущих методов корзины сравнивается с очередным
+WINDOW = 8
+
+DEFAULT_THRESHOLD = 0.8
+# Тела меньше этого числа узлов (геттеры, однострочники) не сравниваются
+DEFAULT_MIN_SIZE = 40
+MIN_SUBTREE = 3
+
+_IDENTIFIERS = {"word", "variable"}
+_MASK32 = (1 << 32) - 1
+
+
+def _h64(data):
+    return int.from_bytes(hashlib.blake2b(data.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+_ID = _h64("<id>")
+_LIT = _h64("<lit>")
+_NONE = _h64("<none>")
+
+
+def _fingerprint(value, features):
+    # -> (нормализованный хэш, число узлов); признаки копятся в features
+    if isinstance(value, dict):
+        kind = value.get("_type")
+        if kind in _IDENTIFIERS:
+            return _ID, 1
+        if kind == "literal":
+            return _LIT, 1
+        parts = [str(kind)]
+        size = 1
+        for key, item in value.items():
+            if key == "_type":
+                continue
+            h, n = _fingerprint(item, features)
+            parts.append("%s=%x" % (key, h))
+            size += n
+    elif isinstance(value, list):
+        parts = ["["]
+        size = 0
+        previous = None
+        for item in value:
+            h, n = _fingerprint(item, features)
+            parts.append("%x" % h)
+            size += n
+            if previous is not None and isinstance(item, dict):
+                features.add(_h64("%x>%x" % (previous, h)))
+            previous = h if isinstance(item, dict) else None
+        return _h64(",".join(parts)), size
+    elif value is None:
+        return _NONE, 0
+    else:
+        # Ключевые слова, операторы; регистр в Fore не важен
+        return _h64(value.lower() if isinstance(value, str) else repr(value)), 0
+    h = _h64(";".join(parts))
+    if size >= MIN_SUBTREE:
+        features.add(h)
+    return h, size
+
+
+def signature(features, size=SIGNATURE_SIZE):
+    # MinHash множества 64-битных признаков -> array("I") из size слов
+    bins = [None] * size
+    for h in features:
+        b = h % size
+        v = h // size
+        if bins[b] is None or v < bins[b]:
+            bins[b] = v
+    filled = [i for i, v in enumerate(bins) if v is not None]
+    if not filled:
+        return None
+    # Пустая корзина берёт значение ближайшей непустой справа (по кругу)
+    # со сдвигом на расстояние, чтобы заимствования различались
+    result = array("I")
+    nearest = filled[0] + size
+    for i in range(size - 1, -1, -1):
+        if bins[i] is not None:
+            nearest = i
+        v = bins[nearest % size]
+        result.append((v + (nearest - i) * 0x9E3779B1) & _MASK32)
+    result.reverse()
+    return result
+
+
+def similarity(a, b):
+    # Оценка коэффициента Жаккара по двум подписям
+    return sum(x == y for x, y in zip(a, b)) / len(a)
+
+
+def _methods(tree):
+    # -> [(имя, строка, тела)] - методы, конструкторы и свойства
+    result = []
+
+    def add(node, container):
+        name_node = node.get("name")
+        name = str(_token(name_node)) if name_node is not None else "?"
+        if container:
+            name = "%s.%s" % (container, name)
+        bodies = [node.get("body")]
+        for key in ("get_body", "set_body"):
+            if isinstance(node.get(key), dict):
+                bodies.append(node[key].get("body"))
+        bodies = [b.get("statements") for b in bodies if isinstance(b, dict) and b.get("statements")]
+        if bodies:
+            result.append((name, _position(name_node)[0], bodies))
+
+    for decl in tree.get("items", ()):
+        if decl.get("_type") == "method_declaration":
+            add(decl, None)
+        body = decl.get("class_body")
+        if isinstance(body, dict):
+            container = str(_token(decl.get("class_name")))
+            for key in ("method_declarations", "constructor_declarations", "property_declarations"):
+                for member in body.get(key) or ():
+                    add(member, container)
+    return result
+
+
+def method_signatures(tree, min_size=DEFAULT_MIN_SIZE):
+    # -> [(имя, строка, узлов, хэш тела, подпись)]
+    result = []
+    for name, line, bodies in _methods(tree):
+        features = set()
+        body_hash, size = _fingerprint(bodies, features)
+        if size < min_size:
+            continue
+        sig = signature(features)
+        if sig is not None:
+            result.append((name, line, size, body_hash, sig))
+    return result
+
+
+def _shard(job):
+    # Пачка файлов -> методы с подписями; ошибки разбора - отдельно
+    from batch import parse_source
+    from source import decode_bytes
+
+    paths, min_size = job
+    methods = []
+    errors = []
+    for path in paths:
+        try:
+            with open(path, "rb") as f:
+                tree = parse_source(decode_bytes(f.read()))
+        except Exception as e:
+            errors.append((path, "%s: %s" % (type(e).__name__, e)))
+            continue
+        for name, line, size, body_hash, sig in method_signatures(tree, min_size):
+            methods.append((path, name, line, size, body_hash, sig.tobytes()))
+    return methods, errors
+
+
+class CloneIndex:
+    def __init__(self):
+        # meta[i] = (путь, имя, строка, узлов, хэш тела); подписи подряд
+        self.meta = []
+        self.signatures = array("I")
+
+    def __len__(self):
+        return len(self.meta)
+
+    def add(self, path, name, line, size, body_hash, sig):
+        self.meta.append((path, name, line, size, body_hash))
+        if isinstance(sig, bytes):
+            self.signatures.frombytes(sig)
+        else:
+            self.signatures.extend(sig)
+
+    def signature(self, i):
+        return self.signatures[i * SIGNATURE_SIZE : (i + 1) * SIGNATURE_SIZE]
+
+    def build(self, root, jobs=None, extensions=None, min_size=DEFAULT_MIN_SIZE, shard_files=16):
+        from batch import DEFAULT_EXTENSIONS, _init_worker, find_sources
+
+        paths = find_sources(root, extensions or DEFAULT_EXTENSIONS)
+        shards = [(paths[i : i + shard_files], min_size) for i in range(0, len(paths), shard_files)]
+        errors = []
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker) as pool:
+            for methods, shard_errors in pool.map(_shard, shards):
+                for method in methods:
+                    self.add(*method)
+                errors.extend(shard_errors)
+        return errors
+
+    def groups(self, threshold=DEFAULT_THRESHOLD):
+        # -> [[номера методов]] - группы клонов, самые крупные первыми
+        n = len(self.meta)
+        parent = array("I", range(n))
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        sigs = self.signatures
+        for band in range(BANDS):
+            buckets = {}
+            offset = band * ROWS
+            for i in range(n):
+                start = i * SIGNATURE_SIZE + offset
+                buckets.setdefault(sigs[start : start + ROWS].tobytes(), []).append(i)
+            for members in buckets.values():
+                if len(members) < 2:
+                    continue
+                for k in range(1, len(members)):
+                    other = members[k]
+                    other_sig = self.signature(other)
+                    for previous in members[max(0, k - WINDOW) : k]:
+                        a, b = find(previous), find(other)
+                        if a != b and similarity(self.signature(previous), other_sig) >= threshold:
+                            parent[max(a, b)] = min(a, b)
+            del buckets
+
+        grouped = {}
+        for i in range(n):
+            grouped.setdefault(find(i), []).append(i)
+        result = [members for members in grouped.values() if len(members) > 1]
+        result.sort(key=lambda members: (-len(members), -self.meta[members[0]][3]))
+        return result
+
+    def report(self, threshold=DEFAULT_THRESHOLD):
+        # Группы для вывода: у каждого метода сходство с первым в группе
+        result = []
+        for members in self.groups(threshold):
+            first = self.signature(members[0])
+            first_hash = self.meta[members[0]][4]
+            methods = []
+            for i in members:
+                path, name, line, size, body_hash = self.meta[i]
+                methods.append(
+                    {
+                        "path": path,
+                        "name": name,
+                        "line": line,
+                        "size": size,
+                        "similarity": round(similarity(first, self.signature(i)), 3),
+                        "exact": body_hash == first_hash,
+                    }
+                )
+            result.append(methods)
+        return result
+
+
+def main(argv=None):
+    import argparse
+
+    ap = argparse.ArgumentParser(prog="clones")
+    ap.add_argument("root")
+    ap.add_argument("-j", "--jobs", type=int, default=None)
+    ap.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    ap.add_argument("--min-size", type=int, default=DEFAULT_MIN_SIZE, help="minimum body size in tree nodes")
+    ap.add_argument("--json", action="store_true", help="print clone groups as JSON")
+    args = ap.parse_args(argv)
+
+    index = CloneIndex()
+    errors = index.build(args.root, args.jobs, min_size=args.min_size)
+    for path, error in errors:
+        print("%s: %s" % (path, error.splitlines()[0]), file=sys.stderr)
+    report = index.report(args.threshold)
+    print("methods: %d, clone groups: %d" % (len(index), len(report)), file=sys.stderr)
+
+    if args.json:
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    else:
+        for n, group in enumerate(report, 1):
+            print("group %d (%d methods)" % (n, len(group)))
+            for m in group:
+                print(
+                    "  %s:%s: %s  size=%d similarity=%.2f%s"
+                    % (m["path"], m["line"], m["name"], m["size"], m["similarity"], " exact" if m["exact"] else "")
+                )
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+import re
+
+# Предварительный проход: комментарии -> пробелы.
+#
+# В грамматике комментарии (//, ///, /* */, { }) пропускаются через
+# %ignore, и регулярка { } с альтернацией на каждый символ медленно
+# перебирает длинные блоки. Здесь все комментарии находятся одной
+# регуляркой без возвратов, а их символы заменяются пробелами с
+# сохранением переводов строк. Длина текста и все смещения не меняются,
+# поэтому строки/столбцы токенов совпадают с исходником без карты позиций.
+#
+# Строковые литералы ("a""b", 'a''b') пропускаются целиком, чтобы // и {
+# внутри строк не считались комментариями.
+
+_SCAN = re.compile(
+    r"""(?P<string>"[^"]*(?:""[^"]*)*"|'[^']*(?:''[^']*)*')"""
+    r"|(?P<doc>///[^\n]*)"
+    r"|//[^\n]*"
+    r"|/\*[^*]*\*+(?:[^/*][^*]*\*+)*/"
+    r"|\{[^}]*\}"
+)
+_DOC_PREFIX = re.compile(r"^///\s?")
+_NONSPACE = re.compile(r"\S")
+
+
+def _blank(text):
+    return "\n".join(" " * len(line) for line in text.split("\n"))
+
+
+def strip_comments(code, start=0, end=None):
+    # Тот же текст той же длины, комментарии в [start, end) - пробелы
+    if end is None:
+        end = len(code)
+    parts = [code[:start]]
+    pos = start
+    for m in _SCAN.finditer(code, start, end):
+        if m.lastgroup == "string":
+            continue
+        parts.append(code[pos : m.start()])
+        parts.append(_blank(m.group()))
+        pos = m.end()
+    if pos == start:
+        return code
+    parts.append(code[pos:])
+    return "".join(parts)
+
+
+def doc_comments(code):
+    # XML-документация: {строка следующего объявления: текст блока ///}
+    docs = {}
+    block = []
+    block_end = 0
+    line, counted = 1, 0
+    for m in _SCAN.finditer(code):
+        if m.lastgroup != "doc":
+            continue
+        line_start = code.rfind("\n", 0, m.start()) + 1
+        if code[line_start : m.start()].strip():
+            # /// после кода на той же строке - не документация
+            continue
+        if block and code[block_end:line_start].strip():
+            block = []
+        block.append(_DOC_PREFIX.sub("", m.group()).rstrip())
+        block_end = m.end()
+        # Объявление - первая непустая строка после блока
+        following = _NONSPACE.search(code, block_end)
+        if following is None or code.startswith("///", following.start()):
+            continue
+        line += code.count("\n", counted, following.start())
+        counted = following.start()
+        docs[line] = "\n".join(block)
+        block = []
+    return docs
@@ -0,0 +1,335 @@
+import re
+import sys
+from symbols import _position, _token
+
+# Свёртка констант.
+#
+# Значения Const (модульных, классовых и локальных), элементов Enum и
+# значений по умолчанию параметров, полей и переменных вычисляются по их
+# деревьям выражений (simple_expression, term, factor, expression) один
+# раз на все модули. Ссылки на другие константы разрешаются по цепочке
+# областей: локальные Const метода -> Const класса -> Const всех модулей;
+# E.X и C.K - элемент перечисления и константа класса. Переменные, поля
+# и параметры тоже занимают имя в своей области и скрывают одноимённые
+# внешние Const.
+#
+# Значение каждого объявления считается один раз и запоминается в
+# ConstantFolder.values (id(узла) -> значение); объявление, до которого
+# дошли повторно во время его же вычисления, - цикл: оно и всё, что от
+# него зависит, константами не считаются. fold() кладёт результат в
+# узел под ключом "const_value"; если значение не известно при
+# компиляции (вызовы, поля, переменные), ключа нет. Null - это None.
+
+
+class _NotConstant:
+    __slots__ = ()
+
+    def __repr__(self):
+        return "NOT_CONSTANT"
+
+
+NOT_CONSTANT = _NotConstant()
+VALUE_KEY = "const_value"
+
+_INTEGER = re.compile(r"[-+]?\d+\Z")
+_DOUBLE = re.compile(r"[-+]?\d+\.\d+\Z")
+_CHAR = re.compile(r"#(\d+)\Z")
+_NAMES = ("variable", "word")
+
+
+def literal_value(text):
+    # Текст LITERAL -> значение. Литералы вида 10-4 (LITERAL_DOUBLE
+    # принимает любой символ между цифрами) не сворачиваются
+    text = str(text)
+    if text[:1] in ("'", '"'):
+        quote = text[0]
+        return text[1:-1].replace(quote * 2, quote)
+    lower = text.lower()
+    if lower == "true":
+        return True
+    if lower == "false":
+        return False
+    if lower == "null":
+        return None
+    if _INTEGER.match(text):
+        return int(text)
+    if _DOUBLE.match(text):
+        return float(text)
+    m = _CHAR.match(text)
+    if m:
+        return chr(int(m.group(1)))
+    return NOT_CONSTANT
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _same_kind(a, b):
+    if _is_number(a) and _is_number(b):
+        return True
+    return type(a) is type(b)
+
+
+def binary(op, a, b):
+    # Операция Fore над свёрнутыми значениями; NOT_CONSTANT, если
+    # результат зависит от неявных преобразований
+    op = str(op).lower()
+    if op == "+":
+        if _is_number(a) and _is_number(b) or isinstance(a, str) and isinstance(b, str):
+            return a + b
+    elif op in ("-", "*", "/"):
+        if _is_number(a) and _is_number(b):
+            if op == "-":
+                return a - b
+            if op == "*":
+                return a * b
+            if b != 0:
+                return a / b
+    elif op in ("div", "mod"):
+        if isinstance(a, int) and isinstance(b, int) and not isinstance(a, bool) and not isinstance(b, bool) and b:
+            # Деление с отсечением к нулю, остаток со знаком делимого
+            q = abs(a) // abs(b)
+            if (a < 0) != (b < 0):
+                q = -q
+            return q if op == "div" else a - b * q
+    elif op in ("and", "or"):
+        if isinstance(a, bool) and isinstance(b, bool):
+            return a and b if op == "and" else a or b
+        if isinstance(a, int) and isinstance(b, int) and not isinstance(a, bool) and not isinstance(b, bool):
+            return a & b if op == "and" else a | b
+    elif op in ("=", "<>"):
+        if _same_kind(a, b):
+            return (a == b) == (op == "=")
+    elif op in ("<", "<=", ">", ">="):
+        if _is_number(a) and _is_number(b) or isinstance(a, str) and isinstance(b, str):
+            return {"<": a < b, "<=": a <= b, ">": a > b, ">=": a >= b}[op]
+    return NOT_CONSTANT
+
+
+def unary(op, a):
+    op = str(op).lower()
+    if op == "not":
+        if isinstance(a, bool):
+            return not a
+        if isinstance(a, int):
+            return ~a
+    elif _is_number(a):
+        return -a if op == "-" else a
+    return NOT_CONSTANT
+
+
+def _name(node):
+    token = _token(node)
+    return str(token).lower() if token is not None else None
+
+
+class ConstantFolder:
+    def __init__(self):
+        # Области: имя в нижнем регистре -> узел объявления
+        self.globals = {}
+        self.classes = {}
+        self.enums = {}
+        # id(узла) -> (узел, выражение, цепочка областей)
+        self._expressions = {}
+        self.values = {}
+        self.cycles = []
+        self._active = set()
+        # Переменные, поля и параметры: имя в области есть, константы нет
+        self._shadows = set()
+
+    # === Сбор объявлений ===
+    def _declare(self, scope, node, expression, chain, constant=True):
+        scope.setdefault(_name(node.get("name")), node)
+        if not constant:
+            self._shadows.add(id(node))
+        if expression is not None:
+            self._expressions[id(node)] = (node, expression, chain)
+
+    def _add_enum(self, decl, chain):
+        members = self.enums.setdefault(_name(decl.get("name")), {})
+        for value in decl.get("values") or ():
+            self._declare(members, value, value.get("value"), (members,) + chain)
+
+    def _add_method(self, decl, chain):
+        local = {}
+        chain = (local,) + chain
+        bodies = [decl.get("body")]
+        for key in ("get_body", "set_body"):
+            if isinstance(decl.get(key), dict):
+                bodies.append(decl[key].get("body"))
+        for body in bodies:
+            if not isinstance(body, dict):
+                continue
+            const_block = body.get("const_block")
+            if isinstance(const_block, dict):
+                for item in const_block.get("items") or ():
+                    self._declare(local, item, item.get("value"), chain)
+            var_block = body.get("var_block")
+            if isinstance(var_block, dict):
+                for item in var_block.get("items") or ():
+                    self._declare(local, item, item.get("default_value"), chain, False)
+        for parameter in decl.get("parameters") or ():
+            self._declare(local, parameter, parameter.get("default"), chain, False)
+
+    def add_unit(self, tree):
+        # Модули можно добавлять в любом порядке: ссылки разрешаются в fold
+        chain = (self.globals,)
+        for decl in tree.get("items", ()):
+            kind = decl.get("_type")
+            if kind == "const_block":
+                for item in decl.get("items") or ():
+                    self._declare(self.globals, item, item.get("value"), chain)
+            elif kind == "enum_declaration":
+                self._add_enum(decl, chain)
+            elif kind == "method_declaration":
+                self._add_method(decl, chain)
+            elif kind == "class_def" and isinstance(decl.get("class_body"), dict):
+                body = decl["class_body"]
+                scope = self.classes.setdefault(_name(decl.get("class_name")), {})
+                class_chain = (scope,) + chain
+                for const in body.get("const_declarations") or ():
+                    item = const.get("declaration")
+                    self._declare(scope, item, item.get("value"), class_chain)
+                for enum in body.get("enum_declarations") or ():
+                    self._add_enum(enum, class_chain)
+                for field in body.get("field_declarations") or ():
+                    self._declare(scope, field, field.get("default"), class_chain, False)
+                for key in ("method_declarations", "constructor_declarations", "property_declarations"):
+                    for member in body.get(key) or ():
+                        self._add_method(member, class_chain)
+
+    # === Вычисление ===
+    def declaration_value(self, node):
+        key = id(node)
+        if key in self.values:
+            return self.values[key]
+        if key not in self._expressions:
+            return NOT_CONSTANT
+        if key in self._active:
+            self.cycles.append(node)
+            return NOT_CONSTANT
+        _, expression, chain = self._expressions[key]
+        self._active.add(key)
+        try:
+            value = self.evaluate(expression, chain)
+        finally:
+            self._active.discard(key)
+        self.values[key] = value
+        return value
+
+    def _resolve(self, name, chain):
+        for scope in chain:
+            node = scope.get(name)
+            if node is not None:
+                # Ближайшее объявление - переменная: внешняя Const скрыта
+                if id(node) in self._shadows:
+                    return NOT_CONSTANT
+                return self.declaration_value(node)
+        if name == "null":
+            return None
+        return NOT_CONSTANT
+
+    def evaluate(self, node, chain=None):
+        # Значение выражения в цепочке областей (по умолчанию - глобальной)
+        chain = chain or (self.globals,)
+        if isinstance(node, list):
+            # Инициализатор массива [a, b, c]
+            values = [self.evaluate(item, chain) for item in node]
+            return NOT_CONSTANT if NOT_CONSTANT in values else values
+        if not isinstance(node, dict):
+            return NOT_CONSTANT
+        kind = node.get("_type")
+        if kind == "literal":
+            return literal_value(node["value"])
+        if kind in _NAMES:
+            return self._resolve(_name(node), chain)
+        if kind in ("simple_expression", "term", "expression"):
+            left = self.evaluate(node.get("left"), chain)
+            if left is NOT_CONSTANT:
+                return NOT_CONSTANT
+            right = self.evaluate(node.get("right"), chain)
+            if right is NOT_CONSTANT:
+                return NOT_CONSTANT
+            return binary(node.get("op"), left, right)
+        if kind == "factor":
+            value = self.evaluate(node.get("expression"), chain)
+            return NOT_CONSTANT if value is NOT_CONSTANT else unary(node.get("op"), value)
+        if kind == "member_access":
+            owner, member = node.get("object"), node.get("member")
+            if not (isinstance(owner, dict) and owner.get("_type") in _NAMES):
+                return NOT_CONSTANT
+            if not (isinstance(member, dict) and member.get("_type") in _NAMES):
+                return NOT_CONSTANT
+            scope = self.enums.get(_name(owner))
+            if scope is None:
+                scope = self.classes.get(_name(owner))
+            if scope is None or _name(member) not in scope:
+                return NOT_CONSTANT
+            return self._resolve(_name(member), (scope,))
+        return NOT_CONSTANT
+
+    def fold(self):
+        # Все собранные объявления; -> число узлов со свёрнутым значением
+        folded = 0
+        for node, _, _ in list(self._expressions.values()):
+            value = self.declaration_value(node)
+            if value is not NOT_CONSTANT and isinstance(node, dict):
+                node[VALUE_KEY] = value
+                folded += 1
+        return folded
+
+
+def fold_units(trees):
+    folder = ConstantFolder()
+    for tree in trees:
+        folder.add_unit(tree)
+    folder.fold()
+    return folder
+
+
+def main(argv=None):
+    import argparse
+    import os
+    from batch import DEFAULT_EXTENSIONS, find_sources, parse_source
+    from source import read_source
+
+    ap = argparse.ArgumentParser(prog="constants")
+    ap.add_argument("paths", nargs="+", help="source files or directories")
+    args = ap.parse_args(argv)
+
+    folder = ConstantFolder()
+    units = []
+    status = 0
+    for root in args.paths:
+        paths = find_sources(root, DEFAULT_EXTENSIONS) if os.path.isdir(root) else [root]
+        for path in paths:
+            try:
+                tree = parse_source(read_source(path))
+            except Exception as e:
+                print("%s: %s: %s" % (path, type(e).__name__, str(e).splitlines()[0]), file=sys.stderr)
+                status = 1
+                continue
+            # Объявления модуля - отрезок _expressions (порядок вставки)
+            start = len(folder._expressions)
+            folder.add_unit(tree)
+            units.append((path, start, len(folder._expressions)))
+    folder.fold()
+
+    declarations = list(folder._expressions.values())
+    for path, start, end in units:
+        for node, _, _ in declarations[start:end]:
+            if node.get("_type") not in ("const_declaration", "enum_value"):
+                continue
+            value = node.get(VALUE_KEY, NOT_CONSTANT)
+            print(
+                "%s:%s: %s = %s"
+                % (path, _position(node.get("name"))[0], _token(node.get("name")), "?" if value is NOT_CONSTANT else repr(value))
+            )
+    for node in folder.cycles:
+        print("cycle: %s (line %s)" % (_token(node.get("name")), _position(node.get("name"))[0]), file=sys.stderr)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,317 @@
+import random
+import sys
+
+# Генератор синтетических модулей Fore по продукциям syntax.lark.
+# Идентификаторы строятся из префикса и номера (v1, f2, M3, C4), поэтому
+# не совпадают с ключевыми словами и не начинаются с "I" (INTERFACE_TYPE).
+
+DEFAULT_MIX = {
+    "assign": 6,
+    "call": 3,
+    "if": 2,
+    "select": 1,
+    "try": 1,
+    "for": 1,
+    "foreach": 1,
+    "while": 1,
+    "return": 1,
+}
+
+# Операторы, содержащие вложенные statement_list
+COMPOUND = ("if", "select", "try", "for", "foreach", "while")
+
+BASE_TYPES = ("Integer", "String", "Double", "Boolean", "Variant", "DateTime", "Int64")
+CLASS_TYPES = ("Object", "Hashtable", "ArrayList", "Exception")
+ADD_OPS = ("+", "-", "Or")
+MUL_OPS = ("*", "/", "Mod", "Div", "And")
+COMPARISON_OPS = ("=", "<>", "<", "<=", ">", ">=")
+
+
+class CorpusGenerator:
+    def __init__(self, seed=0, depth=3, expression_depth=2, mix=None, class_ratio=0.8, indent="\t"):
+        self.rnd = random.Random(seed)
+        self.depth = depth
+        self.expression_depth = expression_depth
+        self.mix = dict(mix or DEFAULT_MIX)
+        self.class_ratio = class_ratio
+        self.indent = indent
+        self._counter = 0
+
+        self._kinds = list(self.mix)
+        self._weights = [self.mix[k] for k in self._kinds]
+        self._simple = [k for k in self._kinds if k not in COMPOUND]
+        self._simple_weights = [self.mix[k] for k in self._simple] or None
+
+    def _name(self, prefix):
+        self._counter += 1
+        return "%s%d" % (prefix, self._counter)
+
+    # === Выражения ===
+    def literal(self):
+        r = self.rnd.random()
+        if r < 0.6:
+            return str(self.rnd.randint(0, 1000))
+        if r < 0.9:
+            return '"s%d"' % self.rnd.randint(0, 100)
+        return self.rnd.choice(("True", "False"))
+
+    def atom(self, names, depth):
+        r = self.rnd.random()
+        if r < 0.45:
+            return self.rnd.choice(names)
+        if depth <= 0 or r < 0.7:
+            return self.literal()
+        if r < 0.8:
+            return "(%s)" % self.expression(names, depth - 1)
+        if r < 0.9:
+            args = ", ".join(self.expression(names, depth - 1) for _ in range(self.rnd.randint(0, 2)))
+            return "%s.M%d(%s)" % (self.rnd.choice(names), self.rnd.randint(1, 50), args)
+        return "%s.f%d" % (self.rnd.choice(names), self.rnd.randint(1, 50))
+
+    def term(self, names, depth):
+        parts = [self.atom(names, depth)]
+        for _ in range(self.rnd.randint(0, 1)):
+            parts += [self.rnd.choice(MUL_OPS), self.atom(names, depth)]
+        return " ".join(parts)
+
+    def expression(self, names, depth=None):
+        depth = self.expression_depth if depth is None else depth
+        parts = [self.term(names, depth)]
+        for _ in range(self.rnd.randint(0, 1)):
+            parts += [self.rnd.choice(ADD_OPS), self.term(names, depth)]
+        return " ".join(parts)
+
+    def condition(self, names):
+        return "%s %s %s" % (
+            self.expression(names, 1),
+            self.rnd.choice(COMPARISON_OPS),
+            self.expression(names, 1),
+        )
+
+    # === Операторы ===
+    def statements(self, names, level, depth, count=None):
+        lines = []
+        for _ in range(count or self.rnd.randint(1, 3)):
+            lines += self.statement(names, level, depth)
+        return lines
+
+    def statement(self, names, level, depth):
+        pad = self.indent * level
+        # Чем глубже, тем реже составные операторы: размер блока не растёт
+        # экспоненциально с глубиной
+        if depth >= self.depth and not self._simple:
+            # В смеси только составные операторы: на пределе глубины всё
+            # равно нужен лист, иначе вложенность не кончится
+            kind = "assign"
+        elif self._simple and (depth >= self.depth or self.rnd.random() < 1 - 0.5**depth):
+            kind = self.rnd.choices(self._simple, self._simple_weights)[0]
+        else:
+            kind = self.rnd.choices(self._kinds, self._weights)[0]
+
+        if kind == "assign":
+            return [pad + "%s := %s;" % (self.rnd.choice(names), self.expression(names))]
+        if kind == "call":
+            args = ", ".join(self.expression(names, 1) for _ in range(self.rnd.randint(0, 3)))
+            return [pad + "%s.M%d(%s);" % (self.rnd.choice(names), self.rnd.randint(1, 50), args)]
+        if kind == "return":
+            return [pad + "Return %s;" % self.expression(names)]
+
+        inner = level + 1
+        nested = depth + 1
+        if kind == "if":
+            lines = [pad + "If %s Then" % self.condition(names)]
+            lines += self.statements(names, inner, nested)
+            for _ in range(self.rnd.randint(0, 2)):
+                lines.append(pad + "Elseif %s Then" % self.condition(names))
+                lines += self.statements(names, inner, nested)
+            if self.rnd.random() < 0.5:
+                lines.append(pad + "Else")
+                lines += self.statements(names, inner, nested)
+            lines.append(pad + "End If;")
+            return lines
+        if kind == "select":
+            lines = [pad + "Select Case %s" % self.rnd.choice(names)]
+            value = 0
+            for _ in range(self.rnd.randint(1, 4)):
+                if self.rnd.random() < 0.3:
+                    label = "%d To %d" % (value, value + 2)
+                    value += 3
+                else:
+                    label = ", ".join(str(value + i) for i in range(self.rnd.randint(1, 3)))
+                    value += 3
+                lines.append(pad + "Case %s:" % label)
+                lines += self.statements(names, inner, nested)
+            if self.rnd.random() < 0.5:
+                lines.append(pad + "Else")
+                lines += self.statements(names, inner, nested)
+            lines.append(pad + "End Select;")
+            return lines
+        if kind == "try":
+            lines = [pad + "Try"]
+            lines += self.statements(names, inner, nested)
+            if self.rnd.random() < 0.5:
+                lines.append(pad + "Except")
+                lines += self.statements(names, inner, nested)
+            else:
+                lines.append(pad + "Except On e: %s Do" % self.rnd.choice(CLASS_TYPES))
+                lines += self.statements(names, inner, nested)
+            if self.rnd.random() < 0.5:
+                lines.append(pad + "Finally")
+                lines += self.statements(names, inner, nested)
+            lines.append(pad + "End Try;")
+            return lines
+        if kind == "for":
+            lines = [pad + "For %s := 0 To %s Do" % (self.rnd.choice(names), self.expression(names, 1))]
+            lines += self.statements(names, inner, nested)
+            lines.append(pad + "End For;")
+            return lines
+        if kind == "foreach":
+            lines = [pad + "For Each %s In %s Do" % (self.rnd.choice(names), self.rnd.choice(names))]
+            lines += self.statements(names, inner, nested)
+            lines.append(pad + "End For;")
+            return lines
+        if kind == "while":
+            lines = [pad + "While %s Do" % self.condition(names)]
+            lines += self.statements(names, inner, nested)
+            lines.append(pad + "End While;")
+            return lines
+        raise ValueError("unknown statement kind %r" % kind)
+
+    # === Объявления ===
+    def type_name(self):
+        if self.rnd.random() < 0.8:
+            return self.rnd.choice(BASE_TYPES)
+        return self.rnd.choice(CLASS_TYPES)
+
+    def parameters(self):
+        names = [self._name("p") for _ in range(self.rnd.randint(0, 3))]
+        if not names:
+            return "", []
+        return "(%s)" % "; ".join("%s: %s" % (n, self.type_name()) for n in names), names
+
+    def method_body(self, names, level, statements):
+        pad = self.indent * level
+        locals_ = [self._name("v") for _ in range(self.rnd.randint(1, 4))]
+        lines = [pad + "Var"]
+        for name in locals_:
+            lines.append(pad + self.indent + "%s: %s;" % (name, self.type_name()))
+        lines.append(pad + "Begin")
+        lines += self.statements(names + locals_, level + 1, 0, statements)
+        lines.append(pad + "End")
+        return lines
+
+    def method(self, fields, level, statements):
+        pad = self.indent * level
+        name = self._name("M")
+        params, param_names = self.parameters()
+        if self.rnd.random() < 0.5:
+            header = "Public Function %s%s: %s;" % (name, params, self.type_name())
+            closing = "Function %s;" % name
+        else:
+            header = "Public Sub %s%s;" % (name, params)
+            closing = "Sub %s;" % name
+        lines = [pad + header]
+        lines += self.method_body(fields + param_names, level, statements)
+        lines[-1] += " " + closing
+        return lines
+
+    def constructor(self, fields, level, statements):
+        pad = self.indent * level
+        params, param_names = self.parameters()
+        lines = [pad + "Public Constructor Create%s;" % params]
+        lines += self.method_body(fields + param_names, level, statements)
+        lines[-1] += " Constructor Create;"
+        return lines
+
+    def property(self, fields, level):
+        pad = self.indent * level
+        name = self._name("P")
+        field = self.rnd.choice(fields)
+        return [
+            pad + "Public Property %s: %s" % (name, self.type_name()),
+            pad + self.indent + "Get Begin Return %s; End Get" % field,
+            pad + self.indent + "Set Begin %s := Value; End Set" % field,
+            pad + "End Property %s;" % name,
+        ]
+
+    def class_def(self, members, statements):
+        name = self._name("C")
+        fields = [self._name("f") for _ in range(self.rnd.randint(1, 5))]
+        lines = ["Public Class %s: Object" % name]
+        for field in fields:
+            lines.append(self.indent + "Private %s: %s;" % (field, self.type_name()))
+        lines += self.constructor(fields, 1, statements)
+        for _ in range(members):
+            if self.rnd.random() < 0.2:
+                lines += self.property(fields, 1)
+            else:
+                lines += self.method(fields, 1, statements)
+        lines.append("End Class %s;" % name)
+        return lines
+
+    def declaration(self, members=6, statements=6):
+        if self.rnd.random() < self.class_ratio:
+            return self.class_def(self.rnd.randint(1, members), statements)
+        return self.method(["g%d" % i for i in range(1, 4)], 0, statements)
+
+    def iter_lines(self, lines):
+        # Объявления целиком, пока не набрано не меньше lines строк
+        produced = 0
+        while produced < lines:
+            decl = self.declaration()
+            decl.append("")
+            produced += len(decl)
+            yield from decl
+
+
+def generate(lines=1000, **options):
+    return "\n".join(CorpusGenerator(**options).iter_lines(lines))
+
+
+def write_corpus(out, lines=1000, **options):
+    written = 0
+    for line in CorpusGenerator(**options).iter_lines(lines):
+        out.write(line + "\n")
+        written += 1
+    return written
+
+
+def parse_mix(text):
+    mix = {}
+    for item in text.split(","):
+        kind, _, weight = item.partition("=")
+        if kind.strip() not in DEFAULT_MIX:
+            raise ValueError("unknown statement kind %r" % kind)
+        mix[kind.strip()] = float(weight or 1)
+    return mix
+
+
+def main(argv=None):
+    import argparse
+
+    ap = argparse.ArgumentParser(prog="corpus")
+    ap.add_argument("-n", "--lines", type=int, default=100000)
+    ap.add_argument("-o", "--output", default="-")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--depth", type=int, default=3, help="max statement nesting")
+    ap.add_argument("--expression-depth", type=int, default=2)
+    ap.add_argument("--mix", type=parse_mix, default=None, help="e.g. assign=6,if=2,try=1")
+    ap.add_argument("--class-ratio", type=float, default=0.8)
+    args = ap.parse_args(argv)
+
+    options = {
+        "seed": args.seed,
+        "depth": args.depth,
+        "expression_depth": args.expression_depth,
+        "mix": args.mix,
+        "class_ratio": args.class_ratio,
+    }
+    if args.output == "-":
+        write_corpus(sys.stdout, args.lines, **options)
+    else:
+        with open(args.output, "w", encoding="utf-8") as f:
+            write_corpus(f, args.lines, **options)
+
+
+if __name__ == "__main__":
+    main()
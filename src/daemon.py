@@ -0,0 +1,247 @@
+import asyncio
+import json
+import os
+import socket
+import sys
+
+# Протокол: по одному JSON-объекту на строку в обе стороны.
+#   запрос:  {"id": 1, "source": "..."} или {"id": 1, "path": "..."}
+#   ответ:   {"id": 1, "ok": true, "tree": {...}}
+#            {"id": 1, "ok": false, "error": "UnexpectedToken", "message": "..."}
+# Запросы можно слать не дожидаясь ответов; ответы приходят по мере
+# готовности и сопоставляются по id.
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOCKET_PATH = os.environ.get(
+    "FORESTROYER_SOCKET",
+    os.path.join(os.environ.get("FORESTROYER_CACHE_DIR", os.path.join(ROOT_DIR, ".cache")), "forestroyer.sock"),
+)
+
+MAX_IN_FLIGHT = 64
+
+
+def handle_request(request):
+    # Выполняется в процессе пула; парсер там уже прогрет
+    from batch import _parse_to_json
+
+    try:
+        if "path" in request:
+            with open(request["path"], "rb") as f:
+                data = f.read()
+        else:
+            data = request["source"].encode("utf-8")
+        return '{"id": %s, "ok": true, "tree": %s}' % (
+            json.dumps(request.get("id")),
+            _parse_to_json(data),
+        )
+    except Exception as e:
+        return json.dumps(
+            {
+                "id": request.get("id"),
+                "ok": False,
+                "error": type(e).__name__,
+                "message": str(e),
+            },
+            ensure_ascii=False,
+        )
+
+
+def _claim_socket(path):
+    # Файл сокета удаляется, только если на нём никто не слушает
+    # (остался от упавшего демона)
+    if not os.path.exists(path):
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except ConnectionRefusedError:
+        os.unlink(path)
+        return
+    except FileNotFoundError:
+        return
+    finally:
+        probe.close()
+    raise FileExistsError("another daemon is listening on %s" % path)
+
+
+class Daemon:
+    def __init__(self, path=SOCKET_PATH, workers=None):
+        self.path = path
+        self.workers = workers
+        self.pool = None
+        self.server = None
+
+    def _new_pool(self):
+        from concurrent.futures import ProcessPoolExecutor
+        from batch import _init_worker
+
+        return ProcessPoolExecutor(max_workers=self.workers or os.cpu_count() or 1, initializer=_init_worker)
+
+    async def _respond(self, request, writer, lock, slots):
+        from concurrent.futures.process import BrokenProcessPool
+
+        loop = asyncio.get_running_loop()
+        pool = self.pool
+        try:
+            response = await loop.run_in_executor(pool, handle_request, request)
+        except Exception as e:
+            # Процесс пула упал (BrokenProcessPool) и т.п. - клиент получает
+            # ошибку, а не ждёт ответа вечно
+            response = json.dumps(
+                {"id": request.get("id"), "ok": False, "error": type(e).__name__, "message": str(e)},
+                ensure_ascii=False,
+            )
+            if isinstance(e, BrokenProcessPool) and self.pool is pool:
+                print("forestroyer daemon: worker pool broken, restarting", file=sys.stderr)
+                self.pool = self._new_pool()
+                pool.shutdown(wait=False, cancel_futures=True)
+        finally:
+            slots.release()
+        async with lock:
+            writer.write(response.encode("utf-8") + b"\n")
+            await writer.drain()
+
+    async def _serve_client(self, reader, writer):
+        lock = asyncio.Lock()
+        slots = asyncio.Semaphore(MAX_IN_FLIGHT)
+        pending = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        # [1, 2] и т.п.: handle_request ждёт объект
+                        raise ValueError("request must be a JSON object")
+                except ValueError as e:
+                    async with lock:
+                        writer.write(
+                            json.dumps({"id": None, "ok": False, "error": "BadRequest", "message": str(e)}).encode()
+                            + b"\n"
+                        )
+                    continue
+
+                await slots.acquire()
+                task = asyncio.ensure_future(self._respond(request, writer, lock, slots))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+        finally:
+            writer.close()
+
+    async def serve(self):
+        _claim_socket(self.path)
+        workers = self.workers or os.cpu_count() or 1
+        self.pool = self._new_pool()
+        # Прогреваем все процессы пула до приёма соединений
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(
+            *[
+                loop.run_in_executor(self.pool, handle_request, {"source": ""})
+                for _ in range(workers)
+            ]
+        )
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.server = await asyncio.start_unix_server(self._serve_client, path=self.path, limit=1 << 30)
+        print("forestroyer daemon listening on %s" % self.path, file=sys.stderr)
+
+        try:
+            async with self.server:
+                await self.server.serve_forever()
+        finally:
+            self.pool.shutdown(cancel_futures=True)
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+
+def serve(path=SOCKET_PATH, workers=None):
+    try:
+        asyncio.run(Daemon(path, workers).serve())
+    except FileExistsError as e:
+        print("forestroyer daemon: %s" % e, file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+class Client:
+    def __init__(self, path=SOCKET_PATH):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(path)
+        self.file = self.sock.makefile("rwb")
+        self._next_id = 0
+
+    def send(self, source=None, path=None):
+        self._next_id += 1
+        request = {"id": self._next_id}
+        if path is not None:
+            request["path"] = os.path.abspath(path)
+        else:
+            request["source"] = source
+        self.file.write(json.dumps(request, ensure_ascii=False).encode("utf-8") + b"\n")
+        return self._next_id
+
+    def receive(self):
+        self.file.flush()
+        line = self.file.readline()
+        if not line:
+            raise ConnectionError("daemon closed the connection")
+        return json.loads(line)
+
+    def parse_many(self, paths):
+        # Все запросы уходят сразу, ответы собираются в исходном порядке
+        ids = {self.send(path=p): p for p in paths}
+        self.file.flush()
+        results = {}
+        while len(results) < len(ids):
+            response = self.receive()
+            results[response["id"]] = response
+        return [(ids[i], results[i]) for i in ids]
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main(argv=None):
+    import argparse
+
+    ap = argparse.ArgumentParser(prog="forestroyer-daemon")
+    ap.add_argument("--socket", default=SOCKET_PATH)
+    sub = ap.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("serve")
+    p.add_argument("-j", "--jobs", type=int, default=None)
+    p = sub.add_parser("parse")
+    p.add_argument("paths", nargs="+")
+    args = ap.parse_args(argv)
+
+    if args.command == "serve":
+        return serve(args.socket, args.jobs)
+
+    failed = 0
+    with Client(args.socket) as client:
+        for path, response in client.parse_many(args.paths):
+            if response["ok"]:
+                sys.stdout.write(json.dumps({"path": path, "tree": response["tree"]}, ensure_ascii=False) + "\n")
+            else:
+                failed += 1
+                print("%s: %s: %s" % (path, response["error"], response["message"]), file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
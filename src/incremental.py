@@ -0,0 +1,175 @@
+from bisect import bisect_left
+from lark import Token
+from lark.exceptions import UnexpectedInput
+from parser_factory import get_parser
+from splitter import shift_positions, split_declarations, split_members
+
+START_RULES = ["unit", "method_declaration", "constructor", "property_declaration"]
+
+# Вид члена класса -> (правило грамматики, список в class_body)
+MEMBER_RULES = {
+    "sub": ("method_declaration", "method_declarations"),
+    "function": ("method_declaration", "method_declarations"),
+    "constructor": ("constructor", "constructor_declarations"),
+    "property": ("property_declaration", "property_declarations"),
+}
+
+
+def _line_col(code, pos):
+    line_start = code.rfind("\n", 0, pos) + 1
+    return code.count("\n", 0, pos), pos - line_start
+
+
+def _shift_tail(value, pos_from, line, line_delta, col_delta, pos_delta, seen):
+    # Сдвигает токены, стоявшие в старом тексте не раньше pos_from.
+    # Колонки меняются только у токенов на строке конца правки.
+    if isinstance(value, Token):
+        if id(value) in seen or value.start_pos is None or value.start_pos < pos_from:
+            return
+        seen.add(id(value))
+        if value.line == line:
+            value.column += col_delta
+        if value.end_line == line and value.end_column is not None:
+            value.end_column += col_delta
+        value.line += line_delta
+        if value.end_line is not None:
+            value.end_line += line_delta
+        value.start_pos += pos_delta
+        if value.end_pos is not None:
+            value.end_pos += pos_delta
+    elif isinstance(value, dict):
+        for item in value.values():
+            _shift_tail(item, pos_from, line, line_delta, col_delta, pos_delta, seen)
+    elif isinstance(value, list):
+        for item in value:
+            _shift_tail(item, pos_from, line, line_delta, col_delta, pos_delta, seen)
+
+
+class IncrementalParser:
+    def __init__(self, code, parser=None):
+        self.parser = parser or get_parser(start=START_RULES)
+        self.code = code
+        self.tree = None
+        self.ends = []
+        self._members = {}
+        self.reparse()
+
+    def reparse(self, code=None):
+        code = self.code if code is None else code
+        tree = self.parser.parse(code, "unit")
+        ends = split_declarations(code)
+        if len(ends) != len(tree["items"]):
+            raise ValueError("declaration boundaries do not match the parsed unit")
+
+        self.code, self.tree, self.ends = code, tree, ends
+        self._members = {}
+        return "full"
+
+    def span(self, index):
+        start = self.ends[index - 1] if index else 0
+        end = self.ends[index] if index + 1 < len(self.ends) else len(self.code)
+        return start, end
+
+    def members(self, index):
+        # Члены класса, смещения относительно начала объявления
+        if index not in self._members:
+            start, end = self.span(index)
+            self._members[index] = [
+                (kind, s - start, e - start) for kind, s, e in split_members(self.code, start, end)
+            ]
+        return self._members[index]
+
+    def _find(self, start, end):
+        if not self.ends:
+            return None
+        index = min(bisect_left(self.ends, end), len(self.ends) - 1)
+        s, e = self.span(index)
+        return index if s <= start and end <= e else None
+
+    def _parse_at(self, text, rule, offset, code):
+        node = self.parser.parse(text, rule)
+        line, col = _line_col(code, offset)
+        shift_positions(node, line, col, offset)
+        return node
+
+    def _reparse_member(self, index, start, end, new_code, delta):
+        node = self.tree["items"][index]
+        if node.get("_type") != "class_def" or "class_body" not in node:
+            return None
+
+        decl_start, _ = self.span(index)
+        positions = {}
+        for kind, s, e in self.members(index):
+            rule_field = MEMBER_RULES.get(kind)
+            if rule_field is not None:
+                positions[rule_field[1]] = positions.get(rule_field[1], -1) + 1
+            if not (decl_start + s <= start and end <= decl_start + e):
+                continue
+            if rule_field is None:
+                return None
+
+            rule, field = rule_field
+            text = new_code[decl_start + s : decl_start + e + delta]
+            member = self._parse_at(text, rule, decl_start + s, new_code)
+            return field, positions[field], member
+        return None
+
+    def edit(self, start, end, text):
+        # Заменяет code[start:end] на text. Возвращает уровень перепарсинга:
+        # "member", "declaration" или "full".
+        old_code = self.code
+        new_code = old_code[:start] + text + old_code[end:]
+        delta = len(text) - (end - start)
+
+        index = self._find(start, end)
+        if index is None:
+            return self.reparse(new_code)
+
+        old_line, old_col = _line_col(old_code, end)
+        new_line, new_col = _line_col(new_code, start + len(text))
+        tail = (end, old_line + 1, new_line - old_line, new_col - old_col, delta)
+
+        # Откат на уровень выше только при синтаксической ошибке в куске;
+        # прочие исключения - ошибки в коде, их не прячем
+        try:
+            replaced = self._reparse_member(index, start, end, new_code, delta)
+        except UnexpectedInput:
+            replaced = None
+
+        if replaced is not None:
+            field, position, member = replaced
+            body = self.tree["items"][index]["class_body"]
+            body[field][position] = None
+            _shift_tail(self.tree["items"][index], *tail, seen=set())
+            body[field][position] = member
+            level = "member"
+        else:
+            decl_start, decl_end = self.span(index)
+            chunk = new_code[decl_start : decl_end + delta]
+            try:
+                ends = split_declarations(chunk)
+            except ValueError:
+                # splitter не нашел границ объявления в новом тексте
+                ends = []
+            try:
+                items = self.parser.parse(chunk, "unit")["items"] if len(ends) == 1 else []
+            except UnexpectedInput:
+                items = []
+            if len(items) != 1:
+                return self.reparse(new_code)
+
+            line, col = _line_col(new_code, decl_start)
+            shift_positions(items[0], line, col, decl_start)
+            self.tree["items"][index] = items[0]
+            level = "declaration"
+
+        seen = set()
+        for item in self.tree["items"][index + 1 :]:
+            _shift_tail(item, *tail, seen=seen)
+
+        for i in range(index, len(self.ends)):
+            self.ends[i] += delta
+        self._members.pop(index, None)
+        self.code = new_code
+        return level
+
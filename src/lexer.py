@@ -0,0 +1,123 @@
+import re
+from lark.exceptions import UnexpectedCharacters, UnexpectedToken
+from lark.lexer import ContextualLexer, Token
+from lark.utils import TextSlice
+from comments import strip_comments
+
+# Быстрый путь контекстного лексера для слов и пробелов.
+#
+# В syntax.lark около 70 ключевых слов - отдельные регулярки "..."i, и
+# для каждого слова сканер lark перебирает их альтернацию. Здесь слово
+# выделяется одной регуляркой и классифицируется по таблице
+# {состояние лексера: {слово в нижнем регистре: тип терминала}}.
+# Таблица заполняется лениво самим сканером lark, поэтому приоритеты
+# (CALLABLE.5, ELSEIF.2), INTERFACE_TYPE и выбор между WORD/VARIABLE/
+# CLASS_TYPE в каждом состоянии остаются в точности прежними.
+#
+# Всё, что не слово и не пробел (операторы, литералы, комментарии),
+# а также слова, которые сканер режет на части ("Elsewhere" -> ELSE + ...),
+# идёт через обычный next_token.
+#
+# Комментарии заранее заменяются пробелами (comments.py), так что
+# %ignore-регулярки комментариев в сканере не срабатывают.
+
+_WORD = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+_WS = re.compile(r"[ \t\f\r\n]+")
+
+# Тип слова не определяется таблицей - каждый раз через сканер
+_SLOW = object()
+
+
+class KeywordLexer(ContextualLexer):
+    def __init__(self, conf, states, always_accept=()):
+        super().__init__(conf, states, always_accept)
+        # Одна таблица на каждый уникальный подлексер (у состояний с
+        # одинаковым набором терминалов он общий)
+        tables = {}
+        self.tables = {state: tables.setdefault(id(lexer), {}) for state, lexer in self.lexers.items()}
+        # Пробелы пропускаются здесь, только если WS и есть %ignore WS
+        self.skip_ws = "WS" in conf.ignore
+        self._stripped = None
+
+    def _classify(self, lexer, word):
+        # Слово целиком одним терминалом и независимо от регистра -
+        # иначе медленный путь
+        results = [lexer.match(TextSlice(v, 0, len(v)), 0) for v in (word, word.lower(), word.upper())]
+        if len({(r[1], len(r[0])) if r else None for r in results}) != 1:
+            return _SLOW
+        res = results[0]
+        if res is None or len(res[0]) != len(word):
+            return _SLOW
+        return res[1]
+
+    def lex(self, lexer_state, parser_state):
+        text_slice = lexer_state.text
+        text = text_slice.text
+        if text is not self._stripped:
+            # Повторный lex по тому же состоянию (recovery.py) не чистит заново
+            text = strip_comments(text, text_slice.start, text_slice.end)
+            if text is not text_slice.text:
+                text_slice = lexer_state.text = TextSlice(text, text_slice.start, text_slice.end)
+            self._stripped = text
+        end = text_slice.end
+        line_ctr = lexer_state.line_ctr
+        lexers = self.lexers
+        tables = self.tables
+        word_match = _WORD.match
+        ws_match = _WS.match if self.skip_ws else None
+
+        while True:
+            pos = line_ctr.char_pos
+            if pos >= end:
+                return
+
+            if ws_match is not None:
+                m = ws_match(text, pos, end)
+                if m is not None:
+                    line_ctr.feed(m.group(), True)
+                    continue
+
+            m = word_match(text, pos, end)
+            if m is not None:
+                state = parser_state.position
+                word = m.group()
+                table = tables[state]
+                key = word.lower()
+                type_ = table.get(key)
+                if type_ is None:
+                    type_ = table[key] = self._classify(lexers[state], word)
+                # Слово, продолжающееся не-ASCII буквой, отдаём сканеру
+                if type_ is not _SLOW and (m.end() >= end or text[m.end()] < "\x80"):
+                    lexer = lexers[state]
+                    t = Token(type_, word, pos, line_ctr.line, line_ctr.column)
+                    line_ctr.feed(word, False)
+                    t.end_line = line_ctr.line
+                    t.end_column = line_ctr.column
+                    t.end_pos = line_ctr.char_pos
+                    callback = lexer.callback.get(type_)
+                    if callback is not None:
+                        t = callback(t)
+                    lexer_state.last_token = t
+                    yield t
+                    continue
+
+            lexer = lexers[parser_state.position]
+            try:
+                yield lexer.next_token(lexer_state, parser_state)
+            except EOFError:
+                return
+            except UnexpectedCharacters as e:
+                # Как в ContextualLexer.lex: символ может быть допустим
+                # в другом контексте - тогда это UnexpectedToken
+                try:
+                    last_token = lexer_state.last_token
+                    token = self.root_lexer.next_token(lexer_state, parser_state)
+                    raise UnexpectedToken(
+                        token,
+                        e.allowed,
+                        state=parser_state,
+                        token_history=[last_token],
+                        terminals_by_name=self.root_lexer.terminals_by_name,
+                    )
+                except UnexpectedCharacters:
+                    raise e
@@ -1,28 +1,183 @@
+import argparse
 import json
-from lark import Lark
-from transformer import ClassDeclarationsTransformer
+import os
+import sys
 
-grammar = ""
-code = ""
-with open("./syntax/syntax.lark", "r", encoding="utf-8") as file:
-    grammar = file.read()
 
-with open("./examples/code.txt", "r", encoding="utf-8") as file:
-    code = file.read()
+def _build_tree(args, code):
+    # Весь unit целиком: для двоичного формата и режимов, которые не
+    # умеют отдавать объявления по одному
+    if args.standalone:
+        from standalone import parse
 
-parser = Lark(
-    grammar,
-    start="unit",
-    parser="lalr",
-    debug=True,
-    transformer=ClassDeclarationsTransformer(),
-    maybe_placeholders=True
-)
+        return parse(code)
+    if args.spans:
+        from spans import parse_with_spans
 
-tree = parser.parse(code, "unit")
-print(tree)
+        # Позиции - отдельным файлом: по одной [line, column, start_pos,
+        # end_line, end_column, end_pos] на dict-узел в прямом порядке обхода
+        tree, spans = parse_with_spans(code)
+        with open(args.spans, "w", encoding="utf-8") as out:
+            json.dump(spans.flatten(tree), out)
+        return tree
+    if args.skim:
+        from skim import parse_skim
 
-with open("trees/test.json", "w+") as f:
-    json.dump(tree, f, ensure_ascii=False)
+        return parse_skim(code)
+    if args.jobs and args.jobs > 1:
+        from splitter import parse_parallel_file
 
-# TODO WITH WHILE """ NullPriority
\ No newline at end of file
+        return parse_parallel_file(args.source, jobs=args.jobs, encoding=args.encoding)
+    from parser_factory import get_parser
+
+    return get_parser().parse(code)
+
+
+def parse_file(args):
+    from source import read_source
+
+    parallel = args.jobs and args.jobs > 1
+    code = None if parallel else read_source(args.source, args.encoding)
+
+    if args.format == "binary":
+        # Двоичный формат пишется целым деревом (ast_binary.py)
+        from ast_binary import dump
+
+        dump(_build_tree(args, code), args.output)
+        return
+
+    from streaming import JsonWriter, iter_declarations
+
+    if parallel or args.standalone or args.spans or args.skim:
+        items = _build_tree(args, code)["items"]
+    else:
+        # Обычный разбор - потоком, объявления не копятся в памяти
+        items = iter_declarations(code)
+
+    with open(args.output, "w+", encoding="utf-8") as f:
+        writer = JsonWriter(f, args.format)
+        writer.begin()
+        for node in items:
+            if args.print:
+                print(node)
+            writer.write(node)
+        writer.end()
+
+
+def parse_dir(args):
+    from batch import parse_dir as run
+    from parser_factory import CACHE_DIR
+
+    if args.cache_dir is None:
+        args.cache_dir = os.path.join(CACHE_DIR, "ast")
+
+    options = {
+        "jobs": args.jobs,
+        "extensions": tuple(e if e.startswith(".") else "." + e for e in args.ext.split(",")),
+    }
+    if args.recover:
+        options["recover"] = True
+    if args.cache:
+        options["cache_dir"] = args.cache_dir
+        options["cache_max_bytes"] = args.cache_max_mb << 20
+
+    if args.stream == "-":
+        report = run(args.root, stream=sys.stdout, **options)
+    elif args.stream:
+        with open(args.stream, "w", encoding="utf-8") as stream:
+            report = run(args.root, stream=stream, **options)
+    else:
+        report = run(args.root, out_dir=args.out, **options)
+
+    if args.cache:
+        from batch import prune_cache
+
+        prune_cache(args.cache_dir, options["cache_max_bytes"])
+
+    if args.errors:
+        with open(args.errors, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(
+        "parsed: %d, failed: %d" % (report["parsed"], report["failed"]),
+        file=sys.stderr,
+    )
+    if args.recover:
+        print(
+            "recovered: %d, diagnostics: %d" % (report["recovered"], len(report["diagnostics"])),
+            file=sys.stderr,
+        )
+    if args.cache:
+        print(
+            "cache hits: %d, misses: %d" % (report["cache_hits"], report["cache_misses"]),
+            file=sys.stderr,
+        )
+    for error in report["errors"]:
+        print("  %s: %s: %s" % (error["path"], error["error"], error["message"].splitlines()[0] if error["message"] else ""), file=sys.stderr)
+
+    return 1 if report["failed"] else 0
+
+
+def serve(args):
+    from daemon import SOCKET_PATH, serve as run
+
+    return run(args.socket or SOCKET_PATH, args.jobs)
+
+
+COMMANDS = ("parse", "parse-dir", "serve", "-h", "--help")
+
+
+def build_arg_parser():
+    ap = argparse.ArgumentParser(prog="forestroyer")
+    sub = ap.add_subparsers(dest="command")
+
+    p = sub.add_parser("parse", help="parse a single unit")
+    p.add_argument("source", nargs="?", default="./examples/code.txt")
+    p.add_argument("-o", "--output", default="trees/test.json")
+    p.add_argument("--format", choices=["json", "ndjson", "binary"], default="json")
+    p.add_argument("--print", action="store_true", help="echo each declaration to stdout")
+    p.add_argument("-j", "--jobs", type=int, default=None, help="parse top-level declarations in parallel")
+    p.add_argument("--standalone", action="store_true", help="use the generated parser module")
+    p.add_argument("--encoding", default=None, help="source encoding (default: detect BOM / UTF-8 / cp1251)")
+    p.add_argument("--spans", help="also write node positions as JSON (pre-order, one row per node)")
+    p.add_argument("--skim", action="store_true", help="declarations only: method bodies are not parsed")
+    p.set_defaults(func=parse_file)
+
+    p = sub.add_parser("parse-dir", help="parse every unit under a directory")
+    p.add_argument("root")
+    p.add_argument("-o", "--out", default="trees", help="directory for per-unit JSON files")
+    p.add_argument("--stream", help="write one NDJSON stream instead ('-' for stdout)")
+    p.add_argument("--errors", help="write the per-file error report as JSON")
+    p.add_argument("-j", "--jobs", type=int, default=None)
+    p.add_argument("--ext", default=".txt,.fore", help="comma-separated source extensions")
+    p.add_argument("--cache", action="store_true", help="reuse cached results for unchanged units")
+    p.add_argument("--recover", action="store_true", help="skip broken statements/declarations instead of failing the unit")
+    p.add_argument("--cache-dir", default=None)
+    p.add_argument("--cache-max-mb", type=int, default=1024)
+    p.set_defaults(func=parse_dir)
+
+    p = sub.add_parser("serve", help="run the parse daemon on a Unix socket")
+    p.add_argument("--socket", default=None)
+    p.add_argument("-j", "--jobs", type=int, default=None)
+    p.set_defaults(func=serve)
+
+    return ap
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or argv[0] not in COMMANDS:
+        argv = ["parse"] + argv
+
+    ap = build_arg_parser()
+    args = ap.parse_args(argv)
+    if args.command == "parse" and args.jobs is not None and (args.standalone or args.spans or args.skim):
+        ap.error("--jobs cannot be combined with --standalone, --spans or --skim")
+
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+# TODO WITH WHILE """ NullPriority
@@ -0,0 +1,431 @@
+import hashlib
+import json
+import os
+import sys
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from difflib import SequenceMatcher
+from lark import Token
+from symbols import _position, _token
+
+# Merkle-хэши поддеревьев и структурный diff.
+#
+# Хэш узла (dict/list) - blake2b от его ключей, скаляров и хэшей дочерних
+# узлов; позиции токенов в хэш не входят, поэтому сдвиг кода без правок
+# хэш не меняет. Хэши считаются одним проходом снизу вверх и лежат в
+# таблице id(узла) -> digest, дерево не меняется.
+#
+# Для сравнения версий из дерева строится outline - хэши объявлений,
+# членов классов и операторов тел (по одному на оператор верхнего уровня
+# тела). diff сравнивает outline сверху вниз и не спускается в
+# поддеревья с равными хэшами; снимок каталога хранит outline и sha256
+# каждого модуля, так что неизменённые модули отсекаются по sha256, а
+# перепарсиваются при обновлении снимка только изменённые.
+
+SNAPSHOT_FORMAT = 1
+DIGEST_SIZE = 16
+
+_DECLARATION_KINDS = {
+    "class_def": "class",
+    "interface_def": "interface",
+    "method_declaration": "method",
+    "enum_declaration": "enum",
+    "const_block": "const",
+    "delegate_declaration": "delegate",
+}
+
+# Список class_body -> вид члена
+_CLASS_MEMBERS = (
+    ("field_declarations", "field"),
+    ("property_declarations", "property"),
+    ("method_declarations", "method"),
+    ("constructor_declarations", "constructor"),
+    ("const_declarations", "const"),
+    ("event_declarations", "event"),
+    ("enum_declarations", "enum"),
+)
+_INTERFACE_MEMBERS = (
+    ("interface_property_declarations", "property"),
+    ("interface_method_declarations", "method"),
+)
+
+
+# === Хэши ===
+def _scalar(value):
+    if value is None:
+        return b"n"
+    if value is True:
+        return b"t"
+    if value is False:
+        return b"f"
+    if isinstance(value, str):
+        data = value.encode("utf-8")
+        return b"s%d:" % len(data) + data
+    if isinstance(value, int):
+        return b"i%d:" % value
+    raise TypeError("unsupported value in tree: %r" % (value,))
+
+
+def node_hash(value, table=None):
+    # digest узла; table - {id(узла): digest} для всех dict/list поддерева
+    if isinstance(value, dict):
+        parts = [b"d"]
+        for key, item in value.items():
+            parts.append(key.encode("utf-8") + b"=")
+            if isinstance(item, (dict, list)):
+                parts.append(b"h" + node_hash(item, table))
+            else:
+                parts.append(_scalar(item))
+    elif isinstance(value, list):
+        parts = [b"l"]
+        for item in value:
+            if isinstance(item, (dict, list)):
+                parts.append(b"h" + node_hash(item, table))
+            else:
+                parts.append(_scalar(item))
+    else:
+        return hashlib.blake2b(_scalar(value), digest_size=DIGEST_SIZE).digest()
+    digest = hashlib.blake2b(b"".join(parts), digest_size=DIGEST_SIZE).digest()
+    if table is not None:
+        table[id(value)] = digest
+    return digest
+
+
+def hash_tree(tree):
+    # {id(узла): digest} - таблица действительна, пока жив tree
+    table = {}
+    node_hash(tree, table)
+    return table
+
+
+# === Outline ===
+def _name_node(node):
+    for key in ("class_name", "interface_name", "name"):
+        if node.get(key) is not None:
+            return node[key]
+    declaration = node.get("declaration")
+    if isinstance(declaration, dict):
+        return declaration.get("name")
+    return None
+
+
+def _first_line(value):
+    # Строка первого токена поддерева
+    if isinstance(value, Token):
+        return value.line
+    if isinstance(value, dict):
+        value = list(value.values())
+    if isinstance(value, list):
+        for item in value:
+            line = _first_line(item)
+            if line is not None:
+                return line
+    return None
+
+
+def _entry(node, kind, table):
+    name_node = _name_node(node)
+    name = str(_token(name_node)) if name_node is not None else None
+    line = _position(name_node)[0] if name_node is not None else _first_line(node)
+    return {"kind": kind, "name": name, "line": line, "hash": table[id(node)].hex()}
+
+
+def _statements(node, table):
+    # [[hash, тип, строка]] операторов всех тел члена по порядку
+    bodies = [node.get("body")]
+    for key in ("get_body", "set_body"):
+        accessor = node.get(key)
+        if isinstance(accessor, dict):
+            bodies.append(accessor.get("body"))
+    result = []
+    for body in bodies:
+        if not isinstance(body, dict):
+            continue
+        for statement in body.get("statements") or ():
+            if isinstance(statement, (dict, list)):
+                kind = statement.get("_type") if isinstance(statement, dict) else "list"
+                result.append([table[id(statement)].hex(), kind, _first_line(statement)])
+            elif statement is not None:
+                result.append([node_hash(statement).hex(), "token", _first_line(statement)])
+    return result
+
+
+def outline(tree):
+    table = hash_tree(tree)
+    items = []
+    for decl in tree.get("items", ()):
+        kind = _DECLARATION_KINDS.get(decl.get("_type"), decl.get("_type"))
+        entry = _entry(decl, kind, table)
+        if kind == "method":
+            entry["statements"] = _statements(decl, table)
+        if isinstance(decl.get("class_body"), dict):
+            body, lists = decl["class_body"], _CLASS_MEMBERS
+        elif isinstance(decl.get("interface_body"), dict):
+            body, lists = decl["interface_body"], _INTERFACE_MEMBERS
+        else:
+            body = None
+        if body is not None:
+            entry["members"] = []
+            for key, member_kind in lists:
+                for member in body.get(key) or ():
+                    member_entry = _entry(member, member_kind, table)
+                    statements = _statements(member, table)
+                    if statements:
+                        member_entry["statements"] = statements
+                    entry["members"].append(member_entry)
+        items.append(entry)
+    return {"hash": table[id(tree)].hex(), "items": items}
+
+
+# === Diff ===
+def _change(changes, path, change, entry, container):
+    changes.append(
+        {
+            "path": path,
+            "change": change,
+            "kind": entry["kind"],
+            "name": entry["name"],
+            "container": container,
+            "line": entry["line"],
+        }
+    )
+
+
+def _diff_statements(old, new, path, container, changes):
+    matcher = SequenceMatcher(None, [s[0] for s in old], [s[0] for s in new], autojunk=False)
+    for op, i1, i2, j1, j2 in matcher.get_opcodes():
+        if op == "equal":
+            continue
+        paired = min(i2 - i1, j2 - j1) if op == "replace" else 0
+        for k in range(paired):
+            changes.append(
+                {"path": path, "change": "changed", "kind": "statement", "name": new[j1 + k][1],
+                 "container": container, "line": new[j1 + k][2]}
+            )
+        for s in new[j1 + paired : j2]:
+            changes.append(
+                {"path": path, "change": "added", "kind": "statement", "name": s[1], "container": container, "line": s[2]}
+            )
+        for s in old[i1 + paired : i2]:
+            changes.append(
+                {"path": path, "change": "removed", "kind": "statement", "name": s[1], "container": container, "line": s[2]}
+            )
+
+
+def _key(entry):
+    # Имена в Fore регистронезависимы
+    return entry["kind"], entry["name"].lower() if entry["name"] else None
+
+
+def _diff_entries(old, new, path, container, changes):
+    # Сопоставление по (вид, имя); перегрузки с одним именем - по порядку
+    pool = {}
+    for entry in old:
+        pool.setdefault(_key(entry), deque()).append(entry)
+
+    for entry in new:
+        candidates = pool.get(_key(entry))
+        if not candidates:
+            _change(changes, path, "added", entry, container)
+            continue
+        previous = candidates.popleft()
+        if previous["hash"] == entry["hash"]:
+            continue
+        _change(changes, path, "changed", entry, container)
+        name = entry["name"] if container is None else "%s.%s" % (container, entry["name"])
+        if "members" in entry or "members" in previous:
+            _diff_entries(previous.get("members", []), entry.get("members", []), path, name, changes)
+        if "statements" in entry or "statements" in previous:
+            _diff_statements(previous.get("statements", []), entry.get("statements", []), path, name, changes)
+
+    for candidates in pool.values():
+        for entry in candidates:
+            _change(changes, path, "removed", entry, container)
+
+
+def diff_outlines(old, new, path=None):
+    changes = []
+    if old["hash"] != new["hash"]:
+        _diff_entries(old["items"], new["items"], path, None, changes)
+    return changes
+
+
+def diff_trees(old, new, path=None):
+    return diff_outlines(outline(old), outline(new), path)
+
+
+# === Снимки каталога ===
+def new_snapshot():
+    from ast_cache import transformer_version
+
+    return {"format": SNAPSHOT_FORMAT, "transformer": transformer_version(), "files": {}}
+
+
+def load_snapshot(path):
+    # Снимок как записан, вместе с версией трансформера: diff_snapshots
+    # сверяет версии, update_snapshot сбрасывает устаревший снимок
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return new_snapshot()
+    if not isinstance(data, dict) or data.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError("%s is not a snapshot of format %d" % (path, SNAPSHOT_FORMAT))
+    return data
+
+
+def save_snapshot(snapshot, path):
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".json")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, ensure_ascii=False)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    return path
+
+
+def _outline_file(job):
+    from batch import parse_source
+    from source import decode_bytes
+
+    path, rel = job
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        return rel, hashlib.sha256(data).hexdigest(), outline(parse_source(decode_bytes(data))), None
+    except Exception as e:
+        return rel, None, None, "%s: %s" % (type(e).__name__, e)
+
+
+def update_snapshot(snapshot, root, jobs=None, extensions=None):
+    # Как symbols.update_index: перепарсиваются только модули с новым sha256.
+    # Снимок другой версии трансформера собирается заново (хэши несравнимы)
+    from ast_cache import _file_digest, transformer_version
+    from batch import DEFAULT_EXTENSIONS, _init_worker, find_sources
+
+    if snapshot.get("transformer") != transformer_version():
+        snapshot.update(new_snapshot())
+    files = snapshot["files"]
+    paths = find_sources(root, extensions or DEFAULT_EXTENSIONS)
+    seen = set()
+    work = []
+    for path in paths:
+        rel = os.path.relpath(path, root)
+        seen.add(rel)
+        entry = files.get(rel)
+        if entry is None or entry["digest"] != _file_digest(path):
+            work.append((path, rel))
+
+    report = {"updated": 0, "removed": 0, "unchanged": len(paths) - len(work), "errors": []}
+    for rel in [p for p in files if p not in seen]:
+        del files[rel]
+        report["removed"] += 1
+
+    if work:
+        chunksize = max(1, len(work) // ((jobs or os.cpu_count() or 1) * 4))
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker) as pool:
+            for rel, digest, result, error in pool.map(_outline_file, work, chunksize=chunksize):
+                if error is not None:
+                    report["errors"].append({"path": rel, "error": error})
+                    files.pop(rel, None)
+                    continue
+                files[rel] = {"digest": digest, "outline": result}
+                report["updated"] += 1
+    return report
+
+
+def diff_snapshots(old, new):
+    if old.get("transformer") != new.get("transformer"):
+        raise ValueError("snapshots were built by different transformer versions")
+    changes = []
+    old_files, new_files = old["files"], new["files"]
+    for path in sorted(set(old_files) | set(new_files)):
+        before, after = old_files.get(path), new_files.get(path)
+        if before is None:
+            changes.append({"path": path, "change": "added", "kind": "file", "name": path, "container": None, "line": None})
+        elif after is None:
+            changes.append({"path": path, "change": "removed", "kind": "file", "name": path, "container": None, "line": None})
+        elif before["digest"] != after["digest"]:
+            changes.extend(diff_outlines(before["outline"], after["outline"], path))
+    return changes
+
+
+def _format(change):
+    name = change["name"] if change["container"] is None else "%s.%s" % (change["container"], change["name"])
+    if change["kind"] == "statement":
+        name = "%s in %s" % (change["name"], change["container"])
+    return "%s:%s: %s %s %s" % (change["path"], change["line"] or "?", change["change"], change["kind"], name)
+
+
+def main(argv=None):
+    import argparse
+
+    ap = argparse.ArgumentParser(prog="merkle")
+    sub = ap.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("snapshot", help="build (or refresh) a hash snapshot of every unit under root")
+    p.add_argument("root")
+    p.add_argument("-o", "--output", required=True)
+    p.add_argument("-j", "--jobs", type=int, default=None)
+    p = sub.add_parser("diff", help="structural diff of two snapshots, directories or source files")
+    p.add_argument("old")
+    p.add_argument("new")
+    p.add_argument("-j", "--jobs", type=int, default=None)
+    p.add_argument("--json", action="store_true", help="print changes as JSON")
+    args = ap.parse_args(argv)
+
+    if args.command == "snapshot":
+        snapshot = load_snapshot(args.output)
+        report = update_snapshot(snapshot, args.root, args.jobs)
+        save_snapshot(snapshot, args.output)
+        print(
+            "updated: %d, unchanged: %d, removed: %d" % (report["updated"], report["unchanged"], report["removed"]),
+            file=sys.stderr,
+        )
+        for error in report["errors"]:
+            print("  %s: %s" % (error["path"], error["error"].splitlines()[0]), file=sys.stderr)
+        return 1 if report["errors"] else 0
+
+    sides = []
+    try:
+        for path in (args.old, args.new):
+            if os.path.isdir(path):
+                snapshot = new_snapshot()
+                update_snapshot(snapshot, path, args.jobs)
+                sides.append(snapshot)
+            elif path.endswith(".json"):
+                sides.append(load_snapshot(path))
+            else:
+                sides.append(None)
+        changes = None if None in sides else diff_snapshots(*sides)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    if changes is None:
+        # Два модуля напрямую
+        _, _, old, error = _outline_file((args.old, args.old))
+        _, _, new, error = (None, None, None, error) if error else _outline_file((args.new, args.new))
+        if error is not None:
+            print(error, file=sys.stderr)
+            return 2
+        changes = diff_outlines(old, new, args.new)
+
+    if args.json:
+        json.dump(changes, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    else:
+        for change in changes:
+            print(_format(change))
+    return 1 if changes else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
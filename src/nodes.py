@@ -0,0 +1,273 @@
+import json
+import keyword
+import sys
+from dataclasses import make_dataclass, field
+from lark import Token
+from transformer import ClassDeclarationsTransformer
+
+
+class _Missing:
+    # Ключ отсутствовал в исходном dict (например, class_def без class_body)
+    __slots__ = ()
+
+    def __repr__(self):
+        return "MISSING"
+
+
+MISSING = _Missing()
+
+_RESERVED = ("get", "keys", "to_dict")
+
+NODE_CLASSES = {}
+UNTAGGED_CLASSES = {}
+
+
+class Node:
+    __slots__ = ()
+
+    _type = None
+    _tag_key = "_type"
+    _keys = ()
+    _attrs = ()
+
+    # Доступ как к dict, чтобы существующий код продолжал работать
+    def __getitem__(self, key):
+        if key not in self._keys:
+            raise KeyError(key)
+        if key == self._tag_key and self._type is not None:
+            return self._type
+        value = getattr(self, _attr_name(key))
+        if value is MISSING:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        return self.get(key, MISSING) is not MISSING
+
+    def keys(self):
+        return [k for k in self._keys if k in self]
+
+    def to_dict(self):
+        items = {}
+        for key, attr in zip(self._keys, self._attrs):
+            if attr is None:
+                items[key] = self._type
+                continue
+            value = getattr(self, attr)
+            if value is not MISSING:
+                items[key] = to_plain(value)
+        return items
+
+
+def _attr_name(key):
+    # Ключи-ключевые слова (from, else) и имена методов Node (get) получают "_"
+    if keyword.iskeyword(key) or key in _RESERVED:
+        return key + "_"
+    return key
+
+
+def _node(name, tag, keys, tag_key="_type"):
+    keys = tuple(keys.split())
+    attrs = tuple(None if k == tag_key and tag is not None else _attr_name(k) for k in keys)
+    fields = [(a, object, field(default=MISSING)) for a in attrs if a is not None]
+
+    cls = make_dataclass(
+        name,
+        fields,
+        bases=(Node,),
+        namespace={"_type": tag, "_tag_key": tag_key, "_keys": keys, "_attrs": attrs},
+        slots=True,
+        repr=True,
+        eq=True,
+    )
+    cls.__module__ = __name__
+
+    if tag is not None:
+        NODE_CLASSES[tag] = cls
+    else:
+        UNTAGGED_CLASSES[frozenset(keys)] = cls
+    return cls
+
+
+# === Объявления ===
+Unit = _node("Unit", "unit", "_type items")
+ClassDef = _node("ClassDef", "class_def", "_type access_modifier class_name parents class_body")
+ClassBody = _node(
+    "ClassBody",
+    "class_body",
+    "field_declarations property_declarations method_declarations "
+    "constructor_declarations const_declarations event_declarations enum_declarations _type",
+)
+ClassConstDeclaration = _node(
+    "ClassConstDeclaration", "class_const_declaration", "_type access_modifier declaration"
+)
+Constructor = _node("Constructor", "constructor", "_type access_modifier name parameters body")
+Parameter = _node("Parameter", "parameter", "_type var paramarray name type default")
+FieldDeclaration = _node(
+    "FieldDeclaration", "field_declaration", "_type access_modifier shared name field_type default"
+)
+PropertyDeclaration = _node(
+    "PropertyDeclaration",
+    "property_declaration",
+    "_type access_modifier shared name parameters return_type get_body set_body",
+)
+MethodDeclaration = _node(
+    "MethodDeclaration",
+    "method_declaration",
+    "_type access_modifier shared callable name parameters return_type body",
+)
+MethodBody = _node("MethodBody", "method_body", "_type const_block var_block statements")
+ConstBlock = _node("ConstBlock", "const_block", "_type access_modifier items")
+ConstDeclaration = _node("ConstDeclaration", "const_declaration", "_type name value")
+VarBlock = _node("VarBlock", "var_block", "_type access_modifier items")
+VariableDeclaration = _node(
+    "VariableDeclaration", "variable_declaration", "_type name type default_value"
+)
+PropertyGet = _node("PropertyGet", "property_get", "_type body")
+PropertySet = _node("PropertySet", "property_set", "_type body")
+InterfaceDef = _node(
+    "InterfaceDef", "interface_def", "_type access_modifier interface_name parent interface_body"
+)
+InterfaceBody = _node(
+    "InterfaceBody",
+    "interface_body",
+    "interface_property_declarations interface_method_declarations _type",
+)
+InterfaceMethodDeclaration = _node(
+    "InterfaceMethodDeclaration",
+    "interface_method_declaration",
+    "_type access_modifier callable name parameters return_type",
+)
+InterfacePropertyDeclaration = _node(
+    "InterfacePropertyDeclaration",
+    "interface_property_declaration",
+    "_type access_modifier name parameters return_type get set",
+)
+DelegateDeclaration = _node(
+    "DelegateDeclaration", "delegate_declaration", "_type access_modifier name parameters return_type"
+)
+EventDeclaration = _node(
+    "EventDeclaration", "event_declaration", "_type access_modifier name delegate_type"
+)
+EnumDeclaration = _node("EnumDeclaration", "enum_declaration", "_type access_modifier name values")
+EnumValue = _node("EnumValue", "enum_value", "_type name value")
+
+# === Операторы ===
+IfStatement = _node(
+    "IfStatement", "if_statement", "_type condition statements elseif else_statements"
+)
+ElseIf = _node("ElseIf", None, "condition statements")
+AssignmentStatement = _node("AssignmentStatement", "assignment_statement", "_type left right")
+ReturnStatement = _node("ReturnStatement", "return_statement", "_type expression")
+ForEachStatement = _node(
+    "ForEachStatement", "for_each_statement", "_type element list statements"
+)
+ForStatement = _node("ForStatement", "for_statement", "_type start end step statements")
+BreakStatement = _node("BreakStatement", "break_statement", "_type")
+ContinueStatement = _node("ContinueStatement", "continue_statement", "_type")
+RaiseStatement = _node("RaiseStatement", "raise_statement", "_type expression")
+DisposeStatement = _node("DisposeStatement", "dispose_statement", "_type expression")
+SelectBlock = _node("SelectBlock", "select_block", "_type select_var cases else")
+SelectCase = _node("SelectCase", None, "case statements")
+LovRangeExpression = _node("LovRangeExpression", "lov_range_expression", "_type from to")
+TryBlock = _node("TryBlock", "try_block", "_type statements excepts else finally")
+ExceptHandler = _node("ExceptHandler", None, "name exception_type statements")
+WhileStatement = _node("WhileStatement", "while_statement", "_type condition statements")
+WithStatement = _node("WithStatement", "with_statement", "_type variable expression statements")
+RepeatStatement = _node("RepeatStatement", "repeat_statement", "_type statements condition")
+
+# === Выражения ===
+Expression = _node("Expression", "expression", "_type left op right")
+SimpleExpression = _node("SimpleExpression", "simple_expression", "_type op left right")
+Term = _node("Term", "term", "_type op left right")
+Factor = _node("Factor", "factor", "_type op expression")
+Ternary = _node("Ternary", "ternary", "type condition true_expr false_expr", tag_key="type")
+TypeCast = _node("TypeCast", "type_cast", "_type expression as_type")
+TypeCheck = _node("TypeCheck", "type_check", "_type type")
+MethodCall = _node("MethodCall", "method_call", "_type method args")
+ConstructorCall = _node("ConstructorCall", "constructor_call", "_type constructor")
+InheritedCall = _node("InheritedCall", "inherited_call", "_type expression")
+MemberAccess = _node("MemberAccess", "member_access", "_type object member")
+IndexAccess = _node("IndexAccess", "index_access", "_type object index")
+
+# === Терминалы и типы ===
+Variable = _node("Variable", "variable", "_type value")
+Word = _node("Word", "word", "_type value")
+Literal = _node("Literal", "literal", "_type value")
+ClassType = _node("ClassType", "class", "_type value")
+InterfaceType = _node("InterfaceType", "interface", "_type value")
+Type = _node("Type", "type", "_type value")
+TypeArray = _node("TypeArray", "type_array", "_type type size")
+
+
+def _node_class(d):
+    tag = d.get("_type")
+    if tag is None and "_type" not in d:
+        tag = d.get("type") if isinstance(d.get("type"), str) else None
+    cls = NODE_CLASSES.get(tag)
+    if cls is None:
+        cls = UNTAGGED_CLASSES.get(frozenset(d))
+    if cls is None:
+        raise ValueError("unknown node shape: %r" % (sorted(d),))
+    return cls
+
+
+def to_node(value):
+    # dict -> Node (поверхностно: уже готовые узлы не обходятся повторно)
+    if isinstance(value, Node) or value is None:
+        return value
+    if type(value) is Token:
+        # Идентификаторы, модификаторы и операторы многократно повторяются
+        return sys.intern(str(value))
+    if isinstance(value, list):
+        for i, item in enumerate(value):
+            if not isinstance(item, Node):
+                value[i] = to_node(item)
+        return value
+    if isinstance(value, dict):
+        cls = _node_class(value)
+        node = cls()
+        for key, attr in zip(cls._keys, cls._attrs):
+            if attr is not None and key in value:
+                setattr(node, attr, to_node(value[key]))
+        return node
+    return value
+
+
+def to_plain(value):
+    if isinstance(value, Node):
+        return value.to_dict()
+    if isinstance(value, list):
+        return [to_plain(item) for item in value]
+    return value
+
+
+def dumps(tree, **kwargs):
+    kwargs.setdefault("ensure_ascii", False)
+    return json.dumps(to_plain(tree), **kwargs)
+
+
+class CompactTransformer(ClassDeclarationsTransformer):
+    # Те же правила, что у ClassDeclarationsTransformer, но каждый результат
+    # сразу превращается в слотовый узел
+    node_types = (dict, Node)
+
+
+def _compact(method):
+    def callback(self, arg):
+        return to_node(method(self, arg))
+
+    callback.__name__ = method.__name__
+    callback.__qualname__ = "CompactTransformer." + method.__name__
+    return callback
+
+
+for _name, _method in list(vars(ClassDeclarationsTransformer).items()):
+    if not _name.startswith("_") and callable(_method):
+        setattr(CompactTransformer, _name, _compact(_method))
@@ -0,0 +1,78 @@
+import hashlib
+import os
+from lark import Lark
+from lexer import KeywordLexer
+from transformer import ClassDeclarationsTransformer
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GRAMMAR_PATH = os.path.join(ROOT_DIR, "syntax", "syntax.lark")
+CACHE_DIR = os.environ.get("FORESTROYER_CACHE_DIR", os.path.join(ROOT_DIR, ".cache"))
+
+DEFAULT_OPTIONS = {
+    "start": "unit",
+    "parser": "lalr",
+    "maybe_placeholders": True,
+    # Контекстный лексер с таблицей ключевых слов (lexer.py)
+    "_plugins": {"ContextualLexer": KeywordLexer},
+}
+
+_grammar = None
+_parsers = {}
+
+
+def read_grammar(path=GRAMMAR_PATH):
+    global _grammar
+
+    if path != GRAMMAR_PATH:
+        with open(path, "r", encoding="utf-8") as file:
+            return file.read()
+
+    if _grammar is None:
+        with open(path, "r", encoding="utf-8") as file:
+            _grammar = file.read()
+
+    return _grammar
+
+
+def parser_key(grammar, options):
+    # Ключ кэша: текст грамматики + опции, влияющие на построение таблиц
+    digest = hashlib.sha256(grammar.encode("utf-8"))
+    for name in sorted(options):
+        digest.update(("%s=%r;" % (name, options[name])).encode("utf-8"))
+    return digest.hexdigest()[:24]
+
+
+def cache_path(grammar, options, cache_dir=CACHE_DIR):
+    return os.path.join(cache_dir, "parser-%s.lark" % parser_key(grammar, options))
+
+
+def build_parser(
+    transformer=None, grammar=None, cache=True, cache_dir=CACHE_DIR, **options
+):
+    # transformer=False - парсер без трансформера (возвращает lark.Tree)
+    if transformer is None:
+        transformer = ClassDeclarationsTransformer()
+    if grammar is None:
+        grammar = read_grammar()
+
+    opts = dict(DEFAULT_OPTIONS)
+    opts.update(options)
+
+    if cache:
+        os.makedirs(cache_dir, exist_ok=True)
+        opts["cache"] = cache_path(grammar, opts, cache_dir)
+
+    return Lark(grammar, transformer=transformer or None, **opts)
+
+
+def get_parser(transformer=None, cache=True, **options):
+    # Один экземпляр парсера на процесс для каждого набора опций
+    key = (
+        type(transformer).__name__ if transformer is not None else None,
+        cache,
+        tuple(sorted((name, repr(value)) for name, value in options.items())),
+    )
+    if key not in _parsers:
+        _parsers[key] = build_parser(transformer=transformer, cache=cache, **options)
+
+    return _parsers[key]
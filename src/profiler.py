@@ -0,0 +1,192 @@
+import sys
+import time
+
+# Профилирование колбэков трансформера по правилам грамматики.
+#
+# Подключается явно: RuleProfiler().instrument(transformer) подменяет
+# колбэки правил и терминалов на экземпляре, класс трансформера не меняется.
+#
+# Два режима:
+#   embedded - трансформер встроен в LALR (как в get_parser), колбэки
+#              вызываются при свёртке и не вложены друг в друга, поэтому
+#              self == cumulative, а стеки плоские;
+#   tree     - парсер строит lark.Tree, трансформер обходит его (transform),
+#              время поддерева и стеки для flamegraph полные.
+#
+# Память - чистый прирост sys.getallocatedblocks(): сколько блоков
+# осталось занято после колбэка (результат и всё, что он удерживает).
+
+_CALLS, _CUMULATIVE, _SELF, _BLOCKS = range(4)
+
+
+class RuleProfiler:
+    def __init__(self):
+        self.stats = {}  # правило -> [calls, cumulative, self, blocks]
+        self.stacks = {}  # "unit;class_def;class_body" -> self-время
+        self._stack = []  # [имя, начало, время детей, блоки в начале, блоки детей, ждёт колбэк]
+
+    def clear(self):
+        self.stats.clear()
+        self.stacks.clear()
+
+    # === Кадры ===
+    def _enter(self, name, subtree=False):
+        frame = [name, 0.0, 0.0, sys.getallocatedblocks(), 0, subtree]
+        self._stack.append(frame)
+        frame[1] = time.perf_counter()
+        return frame
+
+    def _exit(self, frame):
+        elapsed = time.perf_counter() - frame[1]
+        blocks = sys.getallocatedblocks() - frame[3]
+        stack = self._stack
+        path = ";".join(f[0] for f in stack)
+        stack.pop()
+
+        name = frame[0]
+        stats = self.stats.get(name)
+        if stats is None:
+            stats = self.stats[name] = [0, 0.0, 0.0, 0]
+        own = elapsed - frame[2]
+        stats[_CALLS] += 1
+        # Рекурсивные правила (expression в expression) не считаются дважды
+        if not any(f[0] == name for f in stack):
+            stats[_CUMULATIVE] += elapsed
+        stats[_SELF] += own
+        stats[_BLOCKS] += blocks - frame[4]
+        self.stacks[path] = self.stacks.get(path, 0.0) + own
+
+        if stack:
+            stack[-1][2] += elapsed
+            stack[-1][4] += blocks
+
+    # === Подключение ===
+    def _wrap_callback(self, name, f):
+        def callback(arg):
+            stack = self._stack
+            if stack and stack[-1][5] and stack[-1][0] == name:
+                # Колбэк узла, чьё поддерево уже меряет _transform_tree
+                stack[-1][5] = False
+                return f(arg)
+            frame = self._enter(name)
+            try:
+                return f(arg)
+            finally:
+                self._exit(frame)
+
+        callback.__name__ = name
+        return callback
+
+    def _wrap_transform_tree(self, f):
+        def transform_tree(tree):
+            frame = self._enter(tree.data, True)
+            try:
+                return f(tree)
+            finally:
+                self._exit(frame)
+
+        return transform_tree
+
+    def instrument(self, transformer):
+        # Колбэки подменяются до построения парсера: LALR и лексер
+        # забирают их через getattr при создании Lark
+        for name in dir(type(transformer)):
+            if name.startswith("_") or name in ("transform",):
+                continue
+            attr = getattr(transformer, name)
+            if callable(attr) and not isinstance(attr, type):
+                setattr(transformer, name, self._wrap_callback(name, attr))
+        transformer._transform_tree = self._wrap_transform_tree(transformer._transform_tree)
+        return transformer
+
+    # === Отчёты ===
+    def rows(self, sort="self"):
+        key = {"calls": _CALLS, "cumulative": _CUMULATIVE, "self": _SELF, "blocks": _BLOCKS}[sort]
+        return sorted(self.stats.items(), key=lambda item: item[1][key], reverse=True)
+
+    def table(self, sort="self", limit=None):
+        rows = self.rows(sort)[:limit]
+        total = sum(s[_SELF] for s in self.stats.values()) or 1.0
+        lines = [
+            "%-32s %10s %12s %12s %7s %10s %10s"
+            % ("rule", "calls", "cumul ms", "self ms", "self %", "us/call", "blocks")
+        ]
+        for name, (calls, cumulative, own, blocks) in rows:
+            lines.append(
+                "%-32s %10d %12.2f %12.2f %6.1f%% %10.2f %10d"
+                % (name, calls, cumulative * 1000, own * 1000, own / total * 100, own / calls * 1e6, blocks)
+            )
+        return "\n".join(lines)
+
+    def write_folded(self, out):
+        # Формат folded stacks (flamegraph.pl, speedscope, inferno):
+        # "unit;class_def;class_body 1234", вес - self-время в микросекундах
+        for path, own in sorted(self.stacks.items()):
+            weight = int(round(own * 1e6))
+            if weight:
+                out.write("%s %d\n" % (path, weight))
+
+    def to_dict(self):
+        return {
+            name: {"calls": s[_CALLS], "cumulative": s[_CUMULATIVE], "self": s[_SELF], "blocks": s[_BLOCKS]}
+            for name, s in self.stats.items()
+        }
+
+
+def profile_parse(code, mode="embedded", transformer=None, profiler=None):
+    # Возвращает (результат разбора, профайлер)
+    from parser_factory import build_parser
+    from transformer import ClassDeclarationsTransformer
+
+    profiler = profiler or RuleProfiler()
+    transformer = profiler.instrument(transformer or ClassDeclarationsTransformer())
+
+    if mode == "embedded":
+        # Отдельный экземпляр парсера: get_parser хранит неинструментированный
+        parser = build_parser(transformer=transformer)
+        return parser.parse(code), profiler
+    if mode == "tree":
+        from parser_factory import get_parser
+
+        tree = get_parser(False).parse(code)
+        return transformer.transform(tree), profiler
+    raise ValueError("unknown profiling mode %r" % mode)
+
+
+def main(argv=None):
+    import argparse
+    import json
+    from source import read_source
+
+    ap = argparse.ArgumentParser(prog="profiler")
+    ap.add_argument("source")
+    ap.add_argument("--mode", choices=["embedded", "tree"], default="embedded")
+    ap.add_argument("--sort", choices=["self", "cumulative", "calls", "blocks"], default="self")
+    ap.add_argument("-n", "--limit", type=int, default=None)
+    ap.add_argument("--folded", help="write folded stacks for flamegraph.pl / speedscope")
+    ap.add_argument("--json", help="write per-rule stats as JSON")
+    ap.add_argument("--compact", action="store_true", help="profile CompactTransformer")
+    args = ap.parse_args(argv)
+
+    code = read_source(args.source)
+
+    transformer = None
+    if args.compact:
+        from nodes import CompactTransformer
+
+        transformer = CompactTransformer()
+
+    _, profiler = profile_parse(code, args.mode, transformer)
+    print(profiler.table(args.sort, args.limit))
+
+    if args.folded:
+        with open(args.folded, "w", encoding="utf-8") as f:
+            profiler.write_folded(f)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(profiler.to_dict(), f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,423 @@
+import bisect
+import functools
+import json
+import re
+import sys
+
+# Селекторы над деревом трансформера в духе CSS.
+#
+#   try_block[!finally]                    - try без Finally
+#   for_each_statement[list:method_call]   - For Each по результату вызова
+#   class_def method_declaration[name=Create]
+#   if_statement > return_statement        - Return прямо в ветке If
+#   method_declaration:has(try_block), constructor[access_modifier^=Pub]
+#
+# Шаг: тип узла (_type) или *, затем предикаты:
+#   [field]         поле есть и непустое       [!field]      поле пустое
+#   [field:type]    в поле узел этого типа (или список с таким узлом)
+#   [field op v]    op: = != ^= $= *= ~= (regex); сравнение без учёта регистра
+#                   v - имя, строка в кавычках или число
+#   :has(selector)  среди потомков есть узел, подходящий под selector
+#   :has(> selector) то же среди прямых потомков
+# Поле может быть путём: [name.value=Create]. Комбинаторы: пробел - потомок,
+# > - прямой потомок. Словари без _type (ветки Elseif, Case, обработчики
+# Except) прозрачны: их содержимое считается содержимым ближайшего узла.
+
+
+def node_type(node):
+    t = node.get("_type")
+    if t is None and node.get("type") == "ternary":
+        return "ternary"
+    return t
+
+
+class NodeIndex:
+    # Узлы в порядке обхода в глубину; поддерево узла i - позиции
+    # i..end[i]-1, поэтому "j - потомок i" проверяется за O(1)
+    def __init__(self):
+        self.nodes = []
+        self.types = []
+        self.parent = []
+        self.end = []
+        self.by_type = {}
+        self.unit_starts = []  # позиция корня каждого модуля
+        self.unit_paths = []
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def add(self, tree, path=None):
+        self.unit_starts.append(len(self.nodes))
+        self.unit_paths.append(path)
+        nodes, types, parent, end, by_type = self.nodes, self.types, self.parent, self.end, self.by_type
+
+        # Итеративный обход: (значение, родитель); маркер None закрывает узел
+        stack = [(tree, -1)]
+        while stack:
+            value, up = stack.pop()
+            if value is None:
+                end[up] = len(nodes)
+                continue
+            if isinstance(value, list):
+                stack.extend((v, up) for v in reversed(value) if isinstance(v, (dict, list)))
+                continue
+
+            t = node_type(value)
+            if t is None:
+                children = [v for v in value.values() if isinstance(v, (dict, list))]
+                stack.extend((v, up) for v in reversed(children))
+                continue
+
+            pos = len(nodes)
+            nodes.append(value)
+            types.append(t)
+            parent.append(up)
+            end.append(0)
+            ids = by_type.get(t)
+            if ids is None:
+                ids = by_type[t] = []
+            ids.append(pos)
+
+            stack.append((None, pos))
+            children = [v for k, v in value.items() if k != "_type" and isinstance(v, (dict, list))]
+            stack.extend((v, pos) for v in reversed(children))
+        return self
+
+    def path_of(self, pos):
+        i = bisect.bisect_right(self.unit_starts, pos) - 1
+        return self.unit_paths[i] if i >= 0 else None
+
+    def is_descendant(self, pos, ancestor):
+        return ancestor < pos < self.end[ancestor]
+
+
+# === Разбор селектора ===
+_TOKEN = re.compile(
+    r"""\s*(?:
+        (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+      | (?P<number>[-+]?\d+(?:\.\d+)?)
+      | (?P<op>\^=|\$=|\*=|~=|!=|=)
+      | (?P<name>[^\W\d][\w.]*|\*)
+      | (?P<punct>:has\(|[\[\]>,():!])
+    )""",
+    re.X,
+)
+
+
+# \" \' \\ внутри строки селектора; остальной текст (в т.ч. кириллица) как есть
+_ESCAPE = re.compile(r"\\([\"'\\])")
+
+
+class QueryError(ValueError):
+    pass
+
+
+def _tokenize(text):
+    tokens = []
+    pos = 0
+    brackets = 0
+    text = text.strip()
+    while pos < len(text):
+        m = _TOKEN.match(text, pos)
+        if not m:
+            raise QueryError("unexpected %r at %d in %r" % (text[pos], pos, text))
+        value = m.group(m.lastgroup)
+        # Пробел между шагами (не внутри [...]) - комбинатор "потомок"
+        spaced = m.start(m.lastgroup) > pos
+        if spaced and not brackets and tokens and value not in (">", ",", ")", "["):
+            if tokens[-1] not in (">", ",", ":has("):
+                tokens.append(" ")
+        if value == "[":
+            brackets += 1
+        elif value == "]":
+            brackets -= 1
+        if m.lastgroup == "string":
+            value = ("str", _ESCAPE.sub(r"\1", value[1:-1]))
+        elif m.lastgroup == "number":
+            # Сравнивается как текст: [value=1] совпадает с литералом 1
+            value = ("num", value)
+        tokens.append(value)
+        pos = m.end()
+    return tokens
+
+
+class _Parser:
+    def __init__(self, text):
+        self.text = text
+        self.tokens = _tokenize(text)
+        self.i = 0
+
+    def peek(self):
+        return self.tokens[self.i] if self.i < len(self.tokens) else None
+
+    def take(self, expected=None):
+        token = self.peek()
+        if token is None or (expected is not None and token != expected):
+            raise QueryError("expected %r in %r" % (expected or "token", self.text))
+        self.i += 1
+        return token
+
+    def query(self):
+        selectors = [self.selector()]
+        while self.peek() == ",":
+            self.take()
+            selectors.append(self.selector())
+        return selectors
+
+    def selector(self):
+        # [(комбинатор, шаг)], комбинатор первого шага - None
+        steps = [(None, self.step())]
+        while self.peek() in (" ", ">"):
+            combinator = self.take()
+            if combinator == " " and self.peek() == ">":
+                combinator = self.take()
+            steps.append((combinator, self.step()))
+        return steps
+
+    def value(self):
+        token = self.take()
+        if isinstance(token, tuple):
+            return token[1]
+        return token
+
+    def step(self):
+        name = self.take()
+        if not isinstance(name, str) or not (name == "*" or re.match(r"[A-Za-z_]", name)):
+            raise QueryError("expected node type in %r" % self.text)
+        predicates = []
+        while self.peek() in ("[", ":has("):
+            if self.take() == ":has(":
+                # :has(> x) - x среди прямых потомков
+                child = self.peek() == ">"
+                if child:
+                    self.take()
+                predicates.append(("has", self.query(), child))
+                self.take(")")
+                continue
+            negate = self.peek() == "!"
+            if negate:
+                self.take()
+            field = self.take().split(".")
+            token = self.peek()
+            if token == "]":
+                predicates.append(("empty" if negate else "present", field))
+            elif token == ":":
+                self.take()
+                predicates.append(("type", field, self.take()))
+            elif token in ("=", "!=", "^=", "$=", "*=", "~="):
+                op = self.take()
+                predicates.append(("compare", field, op, self.value()))
+            else:
+                raise QueryError("bad predicate in %r" % self.text)
+            self.take("]")
+        return None if name == "*" else name, predicates
+
+
+# === Вычисление ===
+def _resolve(node, field):
+    value = node
+    for key in field:
+        if isinstance(value, dict):
+            value = value.get(key)
+        else:
+            return None
+    return value
+
+
+def _texts(value):
+    # Все строковые значения: токены, {"value": ...}, элементы списков
+    if value is None:
+        return
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        yield from _texts(value.get("value"))
+    elif isinstance(value, list):
+        for item in value:
+            yield from _texts(item)
+    elif isinstance(value, (int, float, bool)):
+        yield str(value)
+
+
+def _compare(op, argument):
+    expected = argument.lower()
+    if op == "=":
+        return lambda s: s.lower() == expected
+    if op == "!=":
+        return lambda s: s.lower() != expected
+    if op == "^=":
+        return lambda s: s.lower().startswith(expected)
+    if op == "$=":
+        return lambda s: s.lower().endswith(expected)
+    if op == "*=":
+        return lambda s: expected in s.lower()
+    try:
+        pattern = re.compile(argument, re.I)
+    except re.error as e:
+        raise QueryError("bad regex %r: %s" % (argument, e))
+    return lambda s: pattern.search(s) is not None
+
+
+def _predicate(predicate):
+    kind = predicate[0]
+    if kind == "present":
+        field = predicate[1]
+        return lambda index, pos: bool(_resolve(index.nodes[pos], field))
+    if kind == "empty":
+        field = predicate[1]
+        return lambda index, pos: not _resolve(index.nodes[pos], field)
+    if kind == "type":
+        field, wanted = predicate[1], predicate[2]
+
+        def check(index, pos):
+            value = _resolve(index.nodes[pos], field)
+            values = value if isinstance(value, list) else [value]
+            return any(isinstance(v, dict) and node_type(v) == wanted for v in values)
+
+        return check
+    if kind == "compare":
+        field, op, argument = predicate[1], predicate[2], predicate[3]
+        test = _compare(op, argument)
+        if op == "!=":
+            return lambda index, pos: all(test(s) for s in _texts(_resolve(index.nodes[pos], field)))
+        return lambda index, pos: any(test(s) for s in _texts(_resolve(index.nodes[pos], field)))
+    if kind == "has":
+        inner = Query(predicate[1])
+        child = predicate[2]
+
+        def has(index, pos):
+            # Кандидаты inner лежат в by_type, поддерево - отрезок позиций
+            return inner._any_in_range(index, pos + 1, index.end[pos], pos if child else None)
+
+        return has
+    raise QueryError("unknown predicate %r" % (kind,))
+
+
+class _Step:
+    def __init__(self, combinator, step):
+        self.combinator = combinator
+        self.type, predicates = step
+        self.checks = [_predicate(p) for p in predicates]
+
+    def matches(self, index, pos):
+        if self.type is not None and index.types[pos] != self.type:
+            return False
+        for check in self.checks:
+            if not check(index, pos):
+                return False
+        return True
+
+
+class Query:
+    def __init__(self, selectors, text=None):
+        self.text = text
+        self.selectors = [[_Step(c, s) for c, s in selector] for selector in selectors]
+
+    def _candidates(self, index, selector, lo=0, hi=None):
+        last = selector[-1]
+        hi = len(index) if hi is None else hi
+        if last.type is None:
+            return range(lo, hi)
+        positions = index.by_type.get(last.type, ())
+        return positions[bisect.bisect_left(positions, lo) : bisect.bisect_left(positions, hi)]
+
+    def _match_up(self, index, selector, i, pos):
+        # Справа налево: шаг i совпал с pos, ищем предков для шагов 0..i-1
+        if i == 0:
+            return True
+        step = selector[i - 1]
+        combinator = selector[i].combinator
+        up = index.parent[pos]
+        while up >= 0:
+            if step.matches(index, up) and self._match_up(index, selector, i - 1, up):
+                return True
+            if combinator == ">":
+                return False
+            up = index.parent[up]
+        return False
+
+    def _matching(self, index, selector, lo=0, hi=None):
+        last = len(selector) - 1
+        for pos in self._candidates(index, selector, lo, hi):
+            if selector[last].matches(index, pos) and self._match_up(index, selector, last, pos):
+                yield pos
+
+    def _any_in_range(self, index, lo, hi, parent=None):
+        for selector in self.selectors:
+            for pos in self._matching(index, selector, lo, hi):
+                if parent is None or index.parent[pos] == parent:
+                    return True
+        return False
+
+    def positions(self, index):
+        if len(self.selectors) == 1:
+            return list(self._matching(index, self.selectors[0]))
+        found = set()
+        for selector in self.selectors:
+            found.update(self._matching(index, selector))
+        return sorted(found)
+
+    def select(self, index):
+        return [index.nodes[pos] for pos in self.positions(index)]
+
+    def count(self, index):
+        return len(self.positions(index))
+
+
+@functools.lru_cache(maxsize=256)
+def compile_query(text):
+    # Скомпилированные запросы переиспользуются между вызовами
+    return Query(_Parser(text).query(), text)
+
+
+def select(tree_or_index, text):
+    index = tree_or_index if isinstance(tree_or_index, NodeIndex) else NodeIndex().add(tree_or_index)
+    return compile_query(text).select(index)
+
+
+def main(argv=None):
+    import argparse
+    import os
+
+    ap = argparse.ArgumentParser(prog="query")
+    ap.add_argument("query")
+    ap.add_argument("paths", nargs="+", help="source files or directories")
+    ap.add_argument("-q", "--also", action="append", default=[], help="additional selector, same index")
+    ap.add_argument("-j", "--jobs", type=int, default=None)
+    ap.add_argument("-c", "--count", action="store_true", help="print match counts only")
+    args = ap.parse_args(argv)
+
+    try:
+        queries = [compile_query(q) for q in [args.query] + args.also]
+    except QueryError as e:
+        print("query: %s" % e, file=sys.stderr)
+        return 2
+
+    from batch import find_sources, iter_parse_dir, parse_source
+    from source import read_source
+
+    index = NodeIndex()
+    for path in args.paths:
+        if os.path.isdir(path):
+            for rel, text, _, error, _ in iter_parse_dir(path, jobs=args.jobs):
+                if error is not None:
+                    print("%s: %s: %s" % (rel, error["error"], error["message"].splitlines()[0]), file=sys.stderr)
+                else:
+                    index.add(json.loads(text), os.path.join(path, rel))
+        else:
+            index.add(parse_source(read_source(path)), path)
+
+    for query in queries:
+        positions = query.positions(index)
+        if args.count:
+            print("%d\t%s" % (len(positions), query.text))
+            continue
+        for pos in positions:
+            sys.stdout.write(
+                json.dumps({"path": index.path_of(pos), "node": index.nodes[pos]}, ensure_ascii=False) + "\n"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
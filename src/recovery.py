@@ -0,0 +1,270 @@
+from lark.exceptions import UnexpectedCharacters, UnexpectedToken
+from lark.lexer import Token
+from lark.parsers.lalr_analysis import Shift
+from lark.tree import Tree
+from parser_factory import get_parser
+from splitter import BLOCK_DECLARATIONS, BLOCK_MEMBERS, MODIFIERS, _tokens
+
+# Разбор с восстановлением после синтаксических ошибок.
+#
+# Один проход интерактивным LALR-парсером lark. По ходу разбора снимаются
+# контрольные точки (копии стеков состояний и значений):
+#   - после ;, если парсер может закончить unit - граница объявления
+#     верхнего уровня;
+#   - после заголовка класса и после ;, за которой может начаться член
+#     класса - граница члена;
+#   - после остальных ; и после токенов, за которыми может начаться
+#     оператор (Begin, Then, Else, Do, ...) - граница оператора.
+# При ошибке парсер откатывается к последней точке оператора и пропускает
+# текст до ; после ошибки (уровень оператора). Если эта ; уже закрывает
+# член класса - откат к началу члена и пропуск до его End Sub Имя;
+# (уровень члена), а если само объявление - откат к началу объявления
+# верхнего уровня и пропуск до его End Class Имя; (уровень объявления).
+#
+# Списки, которые lark накапливает для правил с * и +, растут на месте
+# (ChildFilterLALR), поэтому в контрольной точке запоминается их длина.
+
+
+# Терминалы, допустимые в начале оператора и члена класса: по ним
+# узнаются состояния внутри statement_list и тела класса/интерфейса
+# (после модификаторов и типов CALLABLE тоже в lookahead LALR, поэтому
+# граница члена - только после ;)
+_STATEMENT_START = "RETURN"
+_MEMBER_START = "CALLABLE"
+_MEMBER_TOKENS = {"PUBLIC", "PRIVATE", "PROTECTED", "FRIEND", "SHARED", "CALLABLE", "CONSTRUCTOR", "PROPERTY", "EVENT", "_CONST", "ENUM"}
+
+
+def _declaration_end(code, start, blocks=BLOCK_DECLARATIONS):
+    # Конец объявления, начинающегося с start (позиция после завершающей ;),
+    # по тем же правилам, что splitter; blocks - блочные объявления уровня
+    kind = None
+    closed = False
+    previous = None
+    depth = 0
+    for word, _, end in _tokens(code, start):
+        if kind is None:
+            if word in MODIFIERS:
+                continue
+            if word == ";":
+                return end
+            kind = word
+            continue
+
+        closing = blocks.get(kind)
+        if closing is not None:
+            if previous == "end" and word in closing:
+                closed = True
+            previous = word
+            if closed and word == ";":
+                return end
+        elif word == ";" and depth <= 0:
+            return end
+        elif kind == "delegate" and word in "()":
+            # ; внутри списка параметров делегата
+            depth += 1 if word == "(" else -1
+    return len(code)
+
+
+def _declaration_kind(code, start):
+    for word, _, _ in _tokens(code, start):
+        if word not in MODIFIERS:
+            return word
+    return None
+
+
+def _statement_end(code, pos):
+    # Позиция после первой ; начиная с pos
+    for word, _, end in _tokens(code, pos):
+        if word == ";":
+            return end
+    return len(code)
+
+
+class _Checkpoint:
+    __slots__ = ("states", "values", "sizes", "pos")
+
+    def __init__(self, parser_state, pos):
+        self.states = list(parser_state.state_stack)
+        self.values = list(parser_state.value_stack)
+        self.sizes = [len(v.children) if isinstance(v, Tree) else len(v) if isinstance(v, list) else None for v in self.values]
+        self.pos = pos
+
+    def restore(self, parser_state):
+        parser_state.state_stack[:] = self.states
+        parser_state.value_stack[:] = self.values
+        for value, size in zip(self.values, self.sizes):
+            if size is not None:
+                del (value.children if isinstance(value, Tree) else value)[size:]
+
+
+def _accepts_end(parser_state):
+    # Может ли парсер сейчас закончить unit: свёртки по $END без колбэков
+    states = parser_state.parse_conf.states
+    end_state = parser_state.parse_conf.end_state
+    stack = list(parser_state.state_stack)
+    while True:
+        action = states[stack[-1]].get("$END")
+        if action is None:
+            return False
+        action, arg = action
+        if action is Shift:
+            return arg == end_state
+        size = len(arg.expansion)
+        if size:
+            del stack[-size:]
+        _, state = states[stack[-1]][arg.origin.name]
+        if state == end_state:
+            return True
+        stack.append(state)
+
+
+def _diagnostic(e, code):
+    if isinstance(e, UnexpectedCharacters):
+        pos = e.pos_in_stream
+        message = "unexpected character %r" % code[pos : pos + 1]
+    elif e.token.type == "$END":
+        pos = len(code)
+        message = "unexpected end of input"
+    else:
+        pos = e.token.start_pos
+        message = "unexpected %s %r" % (e.token.type, str(e.token))
+    line = code.count("\n", 0, pos) + 1
+    column = pos - code.rfind("\n", 0, pos)
+    return {"error": type(e).__name__, "message": message, "line": line, "column": column, "pos": pos}
+
+
+class RecoveringParse:
+    def __init__(self, code, parser=None):
+        self.code = code
+        self.parser = parser or get_parser()
+        self.diagnostics = []
+
+    def _seek(self, pos):
+        # Перевод лексера на позицию pos (вперёд или назад)
+        line_ctr = self.lexer_state.line_ctr
+        text = self.lexer_state.text.text
+        if pos < line_ctr.char_pos:
+            line_ctr.char_pos = 0
+            line_ctr.line = 1
+            line_ctr.column = 1
+            line_ctr.line_start_pos = 0
+        line_ctr.feed(text[line_ctr.char_pos : pos])
+
+    def _ends(self):
+        # Границы текущего объявления и члена класса - лениво, после ошибки
+        if self.declaration_end is None:
+            self.declaration_end = _declaration_end(self.code, self.top.pos)
+        if self.member is not None and self.member_end is None:
+            # В интерфейсе у методов нет тела - член до ближайшей ;
+            blocks = {} if _declaration_kind(self.code, self.top.pos) == "interface" else BLOCK_MEMBERS
+            self.member_end = min(_declaration_end(self.code, self.member.pos, blocks), self.declaration_end)
+        return self.member_end if self.member is not None else self.declaration_end
+
+    def _recover(self, e):
+        error = _diagnostic(e, self.code)
+        # Ошибки подряд без новой контрольной точки - одна диагностика,
+        # пропуск растёт до следующей ;
+        diagnostic = self.streak
+        if diagnostic is None:
+            diagnostic = error
+            self.diagnostics.append(diagnostic)
+
+        bound = self._ends()
+        resume = _statement_end(self.code, error["pos"])
+        if self.statement is not None and resume < bound:
+            self.statement.restore(self.parser_state)
+            self.streak = diagnostic
+            diagnostic["recovery"] = "statement"
+        elif self.member is not None and self.member_end < self.declaration_end:
+            # Член класса выбрасывается целиком
+            resume = self.member_end
+            self.member.restore(self.parser_state)
+            self.member.pos = resume
+            self.member_end = None
+            self.statement = None
+            self.streak = None
+            diagnostic["recovery"] = "member"
+        else:
+            # Объявление выбрасывается целиком, разбор продолжается со следующего
+            resume = self.declaration_end
+            self.top.restore(self.parser_state)
+            self.top.pos = resume
+            self.declaration_end = None
+            self.member = self.member_end = None
+            self.statement = None
+            self.streak = None
+            diagnostic["recovery"] = "declaration"
+        diagnostic["resume"] = resume
+        self._seek(resume)
+
+    def _feed(self, tokens):
+        parser_state = self.parser_state
+        state_stack = parser_state.state_stack
+        states = parser_state.parse_conf.states
+        for token in tokens:
+            if self.header and token.type in _MEMBER_TOKENS:
+                # Первый член класса: точка до него, сразу после заголовка
+                self.header = False
+                self.member = _Checkpoint(parser_state, token.start_pos)
+                self.member_end = None
+            parser_state.feed_token(token)
+            if token.type in ("CLASS", "INTERFACE", "END"):
+                self.header = token.type != "END" and self.member is None
+            actions = states[state_stack[-1]]
+            if token.type == "_SEMICOLON":
+                if _accepts_end(parser_state):
+                    self.top = _Checkpoint(parser_state, token.end_pos)
+                    self.declaration_end = None
+                    self.member = self.member_end = None
+                    self.statement = None
+                    self.streak = None
+                    continue
+                if self.member is not None:
+                    closed = self.member_end is not None and token.end_pos >= self.member_end
+                    closed = closed and _MEMBER_START not in actions
+                else:
+                    closed = self.declaration_end is not None and token.end_pos >= self.declaration_end
+                if closed:
+                    # Объявление закончилось в тексте, но не в парсере
+                    # (восстановление на уровне оператора сбило вложенность)
+                    raise UnexpectedToken(token, {"$END"}, state=parser_state)
+            if token.type == "_SEMICOLON" and _MEMBER_START in actions:
+                self.member = _Checkpoint(parser_state, token.end_pos)
+                self.member_end = None
+                self.statement = None
+            elif token.type == "_SEMICOLON" or _STATEMENT_START in actions:
+                self.statement = _Checkpoint(parser_state, token.end_pos)
+            else:
+                continue
+            self.streak = None
+
+    def run(self):
+        interactive = self.parser.parse_interactive(self.code, "unit")
+        self.parser_state = interactive.parser_state
+        self.lexer_state = interactive.lexer_thread.state
+        self.top = _Checkpoint(self.parser_state, 0)
+        self.declaration_end = None
+        self.member = self.member_end = None
+        self.header = False
+        self.statement = None
+        self.streak = None
+
+        tokens = interactive.lexer_thread.lex(self.parser_state)
+        while True:
+            try:
+                self._feed(tokens)
+                end = Token("$END", "", len(self.code))
+                return self.parser_state.feed_token(end, True)
+            except (UnexpectedCharacters, UnexpectedToken) as e:
+                self._recover(e)
+                # Ошибка из лексера или на $END закрывает генератор токенов
+                tokens = interactive.lexer_thread.lex(self.parser_state)
+
+
+def parse_recovering(code, parser=None):
+    # -> (unit, диагностики). unit - как у parser.parse(code, "unit"), но
+    # без объявлений, которые не удалось разобрать.
+    # Диагностика: {"error", "message", "line", "column", "pos",
+    #               "recovery": "statement" | "member" | "declaration", "resume"}
+    session = RecoveringParse(code, parser)
+    return session.run(), session.diagnostics
@@ -0,0 +1,95 @@
+import re
+from comments import _blank
+from parser_factory import get_parser
+from splitter import shift_positions
+from transformer import ClassDeclarationsTransformer
+
+# Разбор только объявлений: тела методов не разбираются.
+#
+# Одна регулярка (строки и комментарии пропускаются) находит тела:
+# Begin на нулевой глубине открывает тело, вложенные Begin
+# (составные операторы) углубляют, End закрывает, если за ним не стоит
+# слово блочного оператора (End If, End For, ...). Операторы между Begin
+# и End заменяются пробелами с сохранением переводов строк, как
+# комментарии в comments.py, поэтому смещения и строки токенов остаются
+# прежними, а парсер видит пустой statement_list.
+#
+# В дереве у method_body statements = None и body_span = [начало, конец] -
+# смещения операторов в исходнике; expand_body разбирает их по запросу.
+# Const/Var перед Begin разбираются как обычно.
+
+_STATEMENT_BLOCKS = {"if", "for", "while", "with", "try", "select"}
+
+# Begin/End и (просмотром вперёд) слово после End; строки, комментарии и
+# имена членов после точки (r.End, r. /* */ Begin) - целиком, чтобы
+# пропустить Begin/End внутри них
+_SCAN = re.compile(
+    r"""(?P<skip>//[^\n]*|/\*.*?\*/|\{[^}]*\}|"[^"]*(?:""[^"]*)*"|'[^']*(?:''[^']*)*'"""
+    r"|\.(?:\s+|//[^\n]*|/\*.*?\*/|\{[^}]*\})*[A-Za-z_][A-Za-z0-9_]*)"
+    r"|\b(?P<word>begin|end)\b"
+    r"(?=(?:\s+|//[^\n]*|/\*.*?\*/|\{[^}]*\})*(?P<next>[A-Za-z_][A-Za-z0-9_]*))?",
+    re.I | re.S,
+)
+
+SKIM_START = ["unit", "statement_list"]
+
+
+def body_extents(code):
+    # [(начало, конец)] - от конца Begin тела до начала его End
+    extents = []
+    depth = 0
+    start = None
+    for m in _SCAN.finditer(code):
+        word = m.group("word")
+        if word is None:
+            continue
+        if len(word) == 5:
+            if depth == 0:
+                start = m.end("word")
+            depth += 1
+        elif depth:
+            following = m.group("next")
+            if following is None or following.lower() not in _STATEMENT_BLOCKS:
+                depth -= 1
+                if depth == 0:
+                    extents.append((start, m.start()))
+    return extents
+
+
+def skim_code(code):
+    parts = []
+    pos = 0
+    for start, end in body_extents(code):
+        parts.append(code[pos:start])
+        parts.append(_blank(code[start:end]))
+        pos = end
+    if not parts:
+        return code
+    parts.append(code[pos:])
+    return "".join(parts)
+
+
+class SkimTransformer(ClassDeclarationsTransformer):
+    def method_body(self, children):
+        node = super().method_body(children)
+        # ... BEGIN statement_list END
+        node["statements"] = None
+        node["body_span"] = [children[-3].end_pos, children[-1].start_pos]
+        return node
+
+
+def parse_skim(code, parser=None):
+    # unit с сигнатурами без операторов
+    return (parser or get_parser(SkimTransformer())).parse(skim_code(code))
+
+
+def expand_body(code, body, parser=None):
+    # Разбирает операторы тела из skim-дерева и кладёт их в body["statements"]
+    start, end = body["body_span"]
+    parser = parser or get_parser(start=SKIM_START)
+    statements = parser.parse(code[start:end], "statement_list")
+    line = code.count("\n", 0, start)
+    column = start - (code.rfind("\n", 0, start) + 1)
+    shift_positions(statements, line, column, start)
+    body["statements"] = statements
+    return statements
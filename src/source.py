@@ -0,0 +1,123 @@
+import codecs
+import mmap
+import os
+
+# Загрузка исходников: mmap + кодировка по началу файла.
+#
+# Выгрузки Fore бывают в UTF-8 (с BOM и без), cp1251 и UTF-16 с BOM.
+# Кодировка определяется по первым PREFIX_BYTES: BOM, затем нули через
+# байт (UTF-16 без BOM), затем проверка, что префикс - корректный UTF-8;
+# иначе cp1251. Файл не читается в bytes: декодер, хэш и сканер границ
+# объявлений (splitter) работают прямо по отображению.
+
+PREFIX_BYTES = 1 << 16
+DEFAULT_ENCODING = "cp1251"
+
+# BOM -> кодек без BOM; UTF-32 раньше UTF-16 (общий префикс FF FE)
+BOMS = (
+    (codecs.BOM_UTF32_LE, "utf-32-le"),
+    (codecs.BOM_UTF32_BE, "utf-32-be"),
+    (codecs.BOM_UTF8, "utf-8"),
+    (codecs.BOM_UTF16_LE, "utf-16-le"),
+    (codecs.BOM_UTF16_BE, "utf-16-be"),
+)
+
+# ASCII-символы - те же байты: границы объявлений ищутся по байтам
+ASCII_COMPATIBLE = {"utf-8", "cp1251", "ascii"}
+
+_UTF8_CONTINUATION = bytes(range(0x80, 0xC0))
+
+
+def detect_encoding(prefix, default=DEFAULT_ENCODING):
+    # -> (кодек, длина BOM)
+    prefix = bytes(prefix)
+    for bom, encoding in BOMS:
+        if prefix.startswith(bom):
+            return encoding, len(bom)
+
+    sample = prefix[:4096]
+    if sample and sample.count(0) * 4 > len(sample):
+        return ("utf-16-be" if sample[0::2].count(0) > sample[1::2].count(0) else "utf-16-le"), 0
+
+    try:
+        # final=False: префикс может оборваться посреди символа
+        codecs.getincrementaldecoder("utf-8")().decode(prefix, final=False)
+    except UnicodeDecodeError:
+        return default, 0
+    return "utf-8", 0
+
+
+def _decode(data, start, end, encoding, detected):
+    view = memoryview(data)[start:end]
+    try:
+        return str(view, encoding)
+    except UnicodeDecodeError:
+        # Корректный UTF-8 только в начале файла - значит, не UTF-8
+        if not detected or encoding != "utf-8":
+            raise
+        return str(view, DEFAULT_ENCODING)
+    finally:
+        view.release()
+
+
+def decode_bytes(data, encoding=None):
+    # bytes/mmap целиком -> str
+    if encoding is not None:
+        return _decode(data, 0, len(data), encoding, False)
+    encoding, bom = detect_encoding(data[:PREFIX_BYTES])
+    return _decode(data, bom, len(data), encoding, True)
+
+
+class Source:
+    def __init__(self, path, encoding=None):
+        self.path = path
+        with open(path, "rb") as f:
+            # Пустой файл отобразить нельзя
+            size = os.fstat(f.fileno()).st_size
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+        self.detected = encoding is None
+        if encoding is None:
+            self.encoding, self.bom = detect_encoding(self.data[:PREFIX_BYTES])
+        else:
+            # Явная кодировка: BOM пропускается, только если он её
+            self.encoding = codecs.lookup(encoding).name
+            self.bom = next((len(b) for b, e in BOMS if e == self.encoding and self.data[: len(b)] == b), 0)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+
+    def decode(self, start=None, end=None):
+        # Байтовый диапазон -> str, по умолчанию весь файл без BOM
+        start = self.bom if start is None else max(start, self.bom)
+        end = len(self.data) if end is None else end
+        return _decode(self.data, start, end, self.encoding, self.detected)
+
+    def text(self):
+        return self.decode()
+
+    def count_chars(self, start, end):
+        # Символов в байтовом диапазоне без декодирования
+        if self.encoding == "utf-8":
+            return len(self.data[start:end].translate(None, _UTF8_CONTINUATION))
+        if self.encoding in ASCII_COMPATIBLE:
+            return end - start
+        return len(self.decode(start, end))
+
+    def count_lines(self, start, end):
+        return self.data[start:end].count(b"\n")
+
+
+def read_source(path, encoding=None):
+    with Source(path, encoding) as source:
+        return source.text()
@@ -0,0 +1,256 @@
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from lark import Token
+
+# Позиции узлов дерева трансформера.
+#
+# propagate_positions в lark заполняет meta только у lark.Tree, а
+# трансформер строит dict. Здесь колбэки трансформера оборачиваются (как
+# в profiler.py), и у каждого построенного узла запоминается диапазон:
+# от начала первого дочернего элемента с позицией до конца последнего.
+# Дочерние элементы - токены и уже построенные узлы, так что диапазон
+# считается за один просмотр children без обхода поддерева.
+#
+# Узлы не получают новых ключей: позиции лежат в SpanTable - плоском
+# array по 2 смещения на узел; строки и столбцы восстанавливаются по
+# таблице начал строк только при запросе. Во время разбора номер узла
+# ищется по словарю id(узла) -> номер, после разбора (freeze) словарь
+# заменяется отсортированным array("Q") id в порядке data, и поиск идёт
+# двоичным поиском: на узел остаются 24 байта вместо записи словаря с
+# двумя int.
+#
+# Отфильтрованные грамматикой токены (_SEMICOLON и т.п.) в children не
+# попадают, поэтому завершающая ; в диапазон объявления не входит. Узлы,
+# которые трансформер дополняет позже (слияние нескольких Const/Var в
+# method_body), сохраняют диапазон первого блока.
+
+_NEWLINE = re.compile("\n")
+
+Span = namedtuple("Span", "line column start_pos end_line end_column end_pos")
+
+_SCALARS = (str, int, float, type(None))
+
+
+class SpanTable:
+    def __init__(self, code=None):
+        # code - разобранный текст: строки и столбцы считаются по нему
+        # при запросе, в таблице только смещения
+        self.code = code
+        self.slots = {}
+        # id узлов по возрастанию после freeze(), иначе None
+        self.ids = None
+        self.data = array("q")
+        # Узлы удерживаются, чтобы их id не достались новым объектам
+        self._nodes = []
+        self._lines = None
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def __contains__(self, node):
+        return self._slot(node) is not None
+
+    def clear(self):
+        self.slots = {}
+        self.ids = None
+        del self.data[:]
+        del self._nodes[:]
+
+    def _slot(self, node):
+        if self.slots is not None:
+            return self.slots.get(id(node))
+        key = id(node)
+        i = bisect_left(self.ids, key)
+        return i if i < len(self.ids) and self.ids[i] == key else None
+
+    def freeze(self):
+        # Словарь -> отсортированные id; data и _nodes переупорядочиваются
+        # так же
+        if self.slots is None:
+            return
+        order = sorted(range(len(self._nodes)), key=lambda i: id(self._nodes[i]))
+        data = array("q")
+        for i in order:
+            data.append(self.data[2 * i])
+            data.append(self.data[2 * i + 1])
+        self._nodes = [self._nodes[i] for i in order]
+        self.ids = array("Q", map(id, self._nodes))
+        self.data = data
+        self.slots = None
+
+    def _thaw(self):
+        if self.slots is None:
+            self.slots = {key: i for i, key in enumerate(self.ids)}
+            self.ids = None
+
+    def add(self, node, start, end):
+        self._thaw()
+        self.slots[id(node)] = len(self._nodes)
+        self._nodes.append(node)
+        self.data.append(start)
+        self.data.append(end)
+
+    def offsets(self, node):
+        # -> (start_pos, end_pos) или None
+        if isinstance(node, Token):
+            # Модификатор доступа и другие токены в значениях узлов
+            return None if node.start_pos is None else (node.start_pos, node.end_pos)
+        slot = self._slot(node)
+        if slot is None:
+            # Безымянные узлы внутри правила (ветки ElseIf, Case, Except)
+            # своего колбэка не имеют - диапазон по их значениям
+            if not isinstance(node, dict):
+                return None
+            values = list(node.values())
+            start = self._start(values)
+            return None if start is None else (start, self._end(values))
+        return self.data[2 * slot], self.data[2 * slot + 1]
+
+    def _line_col(self, pos):
+        if self._lines is None:
+            self._lines = array("q", [0])
+            self._lines.extend(m.end() for m in _NEWLINE.finditer(self.code))
+        line = bisect_right(self._lines, pos)
+        return line, pos - self._lines[line - 1] + 1
+
+    def get(self, node):
+        # Span в нумерации lark: строки и столбцы с 1, end_* - после токена
+        offsets = self.offsets(node)
+        if offsets is None:
+            return None
+        start, end = offsets
+        return Span(*self._line_col(start), start, *self._line_col(end), end)
+
+    def _start(self, values):
+        # Смещение начала первого элемента с позицией
+        for value in values:
+            if isinstance(value, Token):
+                if value.start_pos is not None:
+                    return value.start_pos
+                continue
+            if isinstance(value, _SCALARS):
+                continue
+            slot = self._slot(value)
+            if slot is not None:
+                return self.data[2 * slot]
+            # Узел, собранный внутри колбэка, или список правила с *
+            if isinstance(value, dict):
+                value = list(value.values())
+            if isinstance(value, (list, tuple)):
+                pos = self._start(value)
+                if pos is not None:
+                    return pos
+        return None
+
+    def _end(self, values):
+        # Смещение конца последнего элемента с позицией
+        for value in reversed(values):
+            if isinstance(value, Token):
+                if value.end_pos is not None:
+                    return value.end_pos
+                continue
+            if isinstance(value, _SCALARS):
+                continue
+            slot = self._slot(value)
+            if slot is not None:
+                return self.data[2 * slot + 1]
+            if isinstance(value, dict):
+                value = list(value.values())
+            if isinstance(value, (list, tuple)):
+                pos = self._end(value)
+                if pos is not None:
+                    return pos
+        return None
+
+    def record(self, node, children):
+        if isinstance(node, list):
+            # Правила, возвращающие несколько узлов (event_declaration,
+            # поля через запятую): у новых узлов - диапазон всего правила.
+            # Сам список узлом не считается
+            items = [item for item in node if isinstance(item, dict) and self._slot(item) is None]
+            if not items:
+                return
+        elif isinstance(node, _SCALARS) or self._slot(node) is not None:
+            return
+        else:
+            items = (node,)
+        start = self._start(children)
+        if start is None:
+            return
+        end = self._end(children)
+        for item in items:
+            self.add(item, start, end)
+
+    def flatten(self, tree):
+        # Позиции dict-узлов в прямом порядке обхода дерева (ключи - в
+        # порядке вставки) - для JSON рядом с деревом
+        result = []
+        stack = [tree]
+        while stack:
+            value = stack.pop()
+            if isinstance(value, dict):
+                span = self.get(value)
+                result.append(list(span) if span is not None else None)
+                stack.extend(reversed(list(value.values())))
+            elif isinstance(value, list):
+                stack.extend(reversed(value))
+        return result
+
+
+class SpanRecorder:
+    def __init__(self, table=None):
+        self.table = SpanTable() if table is None else table
+
+    def _wrap_rule(self, f):
+        def callback(children):
+            result = f(children)
+            self.table.record(result, children)
+            return result
+
+        callback.__name__ = f.__name__
+        return callback
+
+    def instrument(self, transformer):
+        # Как RuleProfiler.instrument: до построения парсера, на экземпляре.
+        # Колбэки терминалов (VARIABLE, LITERAL, ...) не оборачиваются:
+        # диапазон такого узла - его токен, SpanTable находит его по значениям
+        for name in dir(type(transformer)):
+            if name.startswith("_") or name in ("transform",) or name.isupper():
+                continue
+            attr = getattr(transformer, name)
+            if callable(attr) and not isinstance(attr, type):
+                setattr(transformer, name, self._wrap_rule(attr))
+        return transformer
+
+
+_recorders = {}
+
+
+def get_span_parser(transformer=None):
+    # Отдельный парсер с инструментированным трансформером, один на процесс
+    # для каждого класса трансформера; get_parser остаётся без накладных
+    # расходов на позиции
+    from parser_factory import build_parser
+    from transformer import ClassDeclarationsTransformer
+
+    transformer = transformer or ClassDeclarationsTransformer()
+    key = type(transformer).__name__
+    if key not in _recorders:
+        recorder = SpanRecorder()
+        parser = build_parser(transformer=recorder.instrument(transformer))
+        _recorders[key] = (parser, recorder)
+    return _recorders[key]
+
+
+def parse_with_spans(code, transformer=None):
+    # -> (дерево, SpanTable). Таблица своя у каждого вызова
+    parser, recorder = get_span_parser(transformer)
+    table = recorder.table = SpanTable(code)
+    try:
+        tree = parser.parse(code)
+    finally:
+        recorder.table = None
+    table.freeze()
+    return tree, table
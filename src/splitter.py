@@ -0,0 +1,357 @@
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from lark import Token
+
+_SCAN = re.compile(
+    r"""
+    (?P<comment>//[^\n]*|/\*.*?\*/|\{.*?\})
+    |(?P<string>"(?:""|[^"])*"|'(?:''|[^'])*')
+    |(?P<word>[A-Za-z_][A-Za-z0-9_]*)
+    |(?P<punct>[;(),:])
+    """,
+    re.S | re.X,
+)
+# То же по байтам (mmap-исходник в ASCII-совместимой кодировке)
+_SCAN_BYTES = re.compile(_SCAN.pattern.encode("ascii"), re.S | re.X)
+
+MODIFIERS = {"public", "private", "protected", "friend", "shared"}
+
+# Ключевое слово объявления -> слово после End, закрывающее его
+BLOCK_DECLARATIONS = {
+    "class": ("class",),
+    "interface": ("interface",),
+    "enum": ("enum",),
+    "sub": ("sub", "function"),
+    "function": ("sub", "function"),
+}
+DECLARATION_KEYWORDS = set(BLOCK_DECLARATIONS) | {"const", "delegate"}
+
+
+# Члены класса, заканчивающиеся на End <слово> Имя;
+BLOCK_MEMBERS = {
+    "sub": ("sub", "function"),
+    "function": ("sub", "function"),
+    "constructor": ("constructor",),
+    "property": ("property",),
+    "enum": ("enum",),
+}
+
+
+def _tokens(code, start=0, end=None):
+    # Только слова и ; ( ) , : вне строк и комментариев: (слово, начало, конец).
+    # code - str или bytes/mmap; для байтов смещения тоже в байтах
+    end = len(code) if end is None else end
+    if isinstance(code, str):
+        for m in _SCAN.finditer(code, start, end):
+            kind = m.lastgroup
+            if kind == "word":
+                yield m.group().lower(), m.start(), m.end()
+            elif kind == "punct":
+                yield m.group(), m.start(), m.end()
+        return
+    for m in _SCAN_BYTES.finditer(code, start, end):
+        kind = m.lastgroup
+        if kind == "word":
+            yield m.group().decode("ascii").lower(), m.start(), m.end()
+        elif kind == "punct":
+            yield m.group().decode("ascii"), m.start(), m.end()
+
+
+def split_declarations(code):
+    # Границы объявлений верхнего уровня: список смещений конца каждого
+    # объявления (позиция сразу после завершающей ;)
+    ends = []
+    tokens = list(_tokens(code))
+    n = len(tokens)
+    i = 0
+
+    while i < n:
+        word = tokens[i][0]
+        i += 1
+        if word in MODIFIERS:
+            continue
+        if word not in DECLARATION_KEYWORDS:
+            raise ValueError("unexpected %r at top level" % word)
+
+        if word in BLOCK_DECLARATIONS:
+            closing = BLOCK_DECLARATIONS[word]
+            while i < n:
+                if tokens[i][0] == "end" and i + 1 < n and tokens[i + 1][0] in closing:
+                    i += 2
+                    break
+                i += 1
+            while i < n and tokens[i][0] != ";":
+                i += 1
+            if i >= n:
+                raise ValueError("unterminated %s declaration" % word)
+            ends.append(tokens[i][2])
+            i += 1
+
+        elif word == "delegate":
+            depth = 0
+            while i < n and not (tokens[i][0] == ";" and depth == 0):
+                if tokens[i][0] == "(":
+                    depth += 1
+                elif tokens[i][0] == ")":
+                    depth -= 1
+                i += 1
+            if i >= n:
+                raise ValueError("unterminated delegate declaration")
+            ends.append(tokens[i][2])
+            i += 1
+
+        else:
+            # Const-блок тянется до начала следующего объявления
+            end = None
+            while i < n:
+                if tokens[i][0] == ";":
+                    end = tokens[i][2]
+                    nxt = tokens[i + 1][0] if i + 1 < n else None
+                    if nxt is None or nxt in MODIFIERS or nxt in DECLARATION_KEYWORDS:
+                        i += 1
+                        break
+                i += 1
+            if end is None:
+                raise ValueError("unterminated const block")
+            ends.append(end)
+
+    return ends
+
+
+def split_members(code, start, end):
+    # Члены класса в code[start:end]: список (ключевое слово, начало, конец).
+    # Поля получают вид "field", константы - "const", события - "event".
+    tokens = list(_tokens(code, start, end))
+    n = len(tokens)
+    members = []
+
+    # Заголовок: [модификаторы] Class Имя : Тип (, Тип)*
+    i = 0
+    while i < n and tokens[i][0] != "class":
+        i += 1
+    i += 2
+    if i < n and tokens[i][0] == ":":
+        i += 2
+        while i < n and tokens[i][0] == ",":
+            i += 2
+
+    while i < n:
+        first = i
+        while i < n and tokens[i][0] in MODIFIERS:
+            i += 1
+        if i >= n:
+            break
+        word = tokens[i][0]
+        if word == "end":
+            break
+
+        if word in BLOCK_MEMBERS:
+            closing = BLOCK_MEMBERS[word]
+            i += 1
+            while i < n:
+                if tokens[i][0] == "end" and i + 1 < n and tokens[i + 1][0] in closing:
+                    i += 2
+                    break
+                i += 1
+            kind = word
+        else:
+            kind = word if word in ("const", "event") else "field"
+
+        while i < n and tokens[i][0] != ";":
+            i += 1
+        if i >= n:
+            raise ValueError("unterminated class member")
+        members.append((kind, tokens[first][1], tokens[i][2]))
+        i += 1
+
+    return members
+
+
+def make_shards(code, ends, shards):
+    # Склеивает соседние объявления в примерно равные по размеру куски
+    if not ends:
+        return [(0, len(code))]
+
+    target = max(len(code) // max(shards, 1), 1)
+    result = []
+    start = 0
+    for end in ends:
+        if end - start >= target:
+            result.append((start, end))
+            start = end
+    if start < ends[-1] or not result:
+        result.append((start, ends[-1]))
+
+    # Хвост после последнего объявления (комментарии, пробелы)
+    last_start, _ = result[-1]
+    result[-1] = (last_start, len(code))
+    return result
+
+
+def shift_positions(value, line_offset, column_offset, pos_offset, seen=None):
+    # Переводит позиции токенов из координат куска в координаты модуля.
+    # Один токен может встречаться в дереве несколько раз (общий тип
+    # у нескольких параметров), поэтому сдвигаем каждый ровно один раз.
+    if seen is None:
+        seen = set()
+    if isinstance(value, Token):
+        if id(value) in seen:
+            return
+        seen.add(id(value))
+        if value.line == 1 and value.column is not None:
+            value.column += column_offset
+        if value.end_line == 1 and value.end_column is not None:
+            value.end_column += column_offset
+        if value.line is not None:
+            value.line += line_offset
+        if value.end_line is not None:
+            value.end_line += line_offset
+        if value.start_pos is not None:
+            value.start_pos += pos_offset
+        if value.end_pos is not None:
+            value.end_pos += pos_offset
+    elif isinstance(value, dict):
+        for item in value.values():
+            shift_positions(item, line_offset, column_offset, pos_offset, seen)
+    elif isinstance(value, list):
+        for item in value:
+            shift_positions(item, line_offset, column_offset, pos_offset, seen)
+
+
+def _parse_shard(job):
+    from batch import parse_source
+
+    text, line_offset, column_offset, pos_offset = job
+    tree = parse_source(text)
+    if line_offset or column_offset or pos_offset:
+        shift_positions(tree["items"], line_offset, column_offset, pos_offset)
+    return tree["items"]
+
+
+def shard_jobs(code, shards):
+    jobs = []
+    line_offset = 0
+    prev = 0
+    for start, end in make_shards(code, split_declarations(code), shards):
+        line_offset += code.count("\n", prev, start)
+        prev = start
+        line_start = code.rfind("\n", 0, start) + 1
+        jobs.append((code[start:end], line_offset, start - line_start, start))
+    return jobs
+
+
+def _parse_mapped_shard(job):
+    # Кусок файла декодируется в воркере из его собственного mmap
+    from source import Source
+
+    path, encoding, start, end, line_offset, column_offset, pos_offset = job
+    with Source(path, encoding) as source:
+        text = source.decode(start, end)
+    return _parse_shard((text, line_offset, column_offset, pos_offset))
+
+
+def shard_file_jobs(source, shards):
+    # Границы ищутся по байтам отображения, смещения строк/столбцов/позиций
+    # пересчитываются в символы декодированного текста (без BOM)
+    data = source.data
+    jobs = []
+    line_offset = 0
+    pos_offset = 0
+    prev = source.bom
+    for start, end in make_shards(data, split_declarations(data), shards):
+        start = max(start, source.bom)
+        line_offset += source.count_lines(prev, start)
+        pos_offset += source.count_chars(prev, start)
+        line_start = max(data.rfind(b"\n", 0, start) + 1, source.bom)
+        column_offset = source.count_chars(line_start, start)
+        jobs.append((source.path, source.encoding, start, end, line_offset, column_offset, pos_offset))
+        prev = start
+    return jobs
+
+
+def _pack(value, memo):
+    # Token при pickle теряет end_line/end_column/end_pos, поэтому из
+    # воркера токены уходят кортежами со всеми полями (кортежей в дереве
+    # больше нет). memo сохраняет общие токены общими
+    if isinstance(value, Token):
+        packed = memo.get(id(value))
+        if packed is None:
+            packed = memo[id(value)] = (
+                value.type,
+                str(value),
+                value.start_pos,
+                value.line,
+                value.column,
+                value.end_line,
+                value.end_column,
+                value.end_pos,
+            )
+        return packed
+    if isinstance(value, dict):
+        return {k: _pack(v, memo) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_pack(v, memo) for v in value]
+    return value
+
+
+def _unpack(value, memo):
+    if isinstance(value, tuple):
+        token = memo.get(id(value))
+        if token is None:
+            token = memo[id(value)] = Token(*value)
+        return token
+    if isinstance(value, dict):
+        return {k: _unpack(v, memo) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_unpack(v, memo) for v in value]
+    return value
+
+
+def _parse_packed(job):
+    parse, job = job
+    return _pack(parse(job), {})
+
+
+def _map_shards(parse, work, workers, pool):
+    from batch import _init_worker
+
+    items = []
+    if pool is None and (workers == 1 or len(work) == 1):
+        results = map(parse, work)
+    else:
+        work = [(parse, job) for job in work]
+        if pool is not None:
+            results = pool.map(_parse_packed, work)
+        else:
+            pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+            with pool:
+                results = list(pool.map(_parse_packed, work))
+        results = (_unpack(shard, {}) for shard in results)
+
+    for shard in results:
+        items.extend(shard)
+
+    return {"_type": "unit", "items": items}
+
+
+def parse_parallel(code, jobs=None, pool=None):
+    workers = jobs or os.cpu_count() or 1
+    return _map_shards(_parse_shard, shard_jobs(code, workers * 4), workers, pool)
+
+
+def parse_parallel_file(path, jobs=None, pool=None, encoding=None):
+    # Как parse_parallel, но воркерам уходят байтовые диапазоны файла,
+    # а не копии текста
+    from source import ASCII_COMPATIBLE, Source
+
+    workers = jobs or os.cpu_count() or 1
+    with Source(path, encoding) as source:
+        if source.encoding in ASCII_COMPATIBLE:
+            try:
+                return _map_shards(_parse_mapped_shard, shard_file_jobs(source, workers * 4), workers, pool)
+            except UnicodeDecodeError:
+                # UTF-8 по префиксу, но не дальше - декодируем целиком
+                pass
+        code = source.text()
+    return parse_parallel(code, jobs, pool)
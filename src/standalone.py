@@ -0,0 +1,64 @@
+import hashlib
+import importlib
+import os
+import sys
+
+# Загрузка собранного парсера (build_standalone.py) без импорта пакета lark
+# и без анализа грамматики.
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+GRAMMAR_PATH = os.path.join(SRC_DIR, "..", "syntax", "syntax.lark")
+TRANSFORMER_PATH = os.path.join(SRC_DIR, "transformer.py")
+MODULE_NAME = "_fore_parser"
+OUTPUT_PATH = os.path.join(SRC_DIR, MODULE_NAME + ".py")
+
+_parser = None
+
+
+def source_digest():
+    # Собранный модуль устаревает при правке грамматики или трансформера
+    digest = hashlib.sha256()
+    for path in (GRAMMAR_PATH, TRANSFORMER_PATH):
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def load_module(check=True, rebuild=True):
+    try:
+        module = importlib.import_module(MODULE_NAME)
+    except ImportError:
+        module = None
+
+    if module is not None and (not check or module.SOURCE_SHA256 == source_digest()):
+        return module
+    if not rebuild:
+        raise ImportError("%s is missing or stale, run build_standalone.py" % MODULE_NAME)
+
+    from build_standalone import build
+
+    build()
+    if module is None:
+        return importlib.import_module(MODULE_NAME)
+    return importlib.reload(module)
+
+
+def get_parser(check=True):
+    global _parser
+    if _parser is None:
+        _parser = load_module(check).Fore_Parser()
+    return _parser
+
+
+def parse(code, check=True):
+    # Комментарии - тем же проходом, что в KeywordLexer (comments.py)
+    from comments import strip_comments
+
+    return get_parser(check).parse(strip_comments(code), "unit")
+
+
+if __name__ == "__main__":
+    import json
+
+    with open(sys.argv[1], "r", encoding="utf-8") as file:
+        json.dump(parse(file.read()), sys.stdout, ensure_ascii=False)
@@ -0,0 +1,96 @@
+import json
+from parser_factory import get_parser
+from transformer import ClassDeclarationsTransformer, UNIT_ITEM_TYPES
+
+
+class StreamingTransformer(ClassDeclarationsTransformer):
+    # Объявления верхнего уровня отдаются в sink сразу после свёртки
+    # и не накапливаются в unit, поэтому память ограничена размером
+    # одного объявления.
+    sink = None
+    value_stack = None
+
+    def _emit(self, node):
+        # На верхнем уровне под свёрнутым правилом в стеке LALR лежит
+        # не больше одного значения - аккумулятор списка unit
+        if self.sink is None or self.value_stack is None or len(self.value_stack) > 1:
+            return node
+        self.sink(node)
+        return None
+
+    def class_def(self, children):
+        return self._emit(super().class_def(children))
+
+    def method_declaration(self, children):
+        return self._emit(super().method_declaration(children))
+
+    def interface_def(self, children):
+        return self._emit(super().interface_def(children))
+
+    def enum_declaration(self, children):
+        return self._emit(super().enum_declaration(children))
+
+    def const_block(self, children):
+        return self._emit(super().const_block(children))
+
+    def delegate_declaration(self, children):
+        return self._emit(super().delegate_declaration(children))
+
+
+def iter_declarations(code, parser=None):
+    # Генератор объявлений верхнего уровня в порядке их появления в модуле
+    parser = parser or get_parser(StreamingTransformer())
+    transformer = parser.options.transformer
+    ready = []
+
+    ip = parser.parse_interactive(code, start="unit")
+    transformer.value_stack = ip.parser_state.value_stack
+    transformer.sink = ready.append
+    try:
+        for _ in ip.iter_parse():
+            if ready:
+                yield from ready
+                ready.clear()
+        ip.feed_eof()
+        yield from ready
+    finally:
+        transformer.sink = None
+        transformer.value_stack = None
+
+
+class JsonWriter:
+    # format="json" - тот же документ, что json.dump(unit),
+    # format="ndjson" - по одному объявлению на строку
+    def __init__(self, out, format="json"):
+        self.out = out
+        self.format = format
+        self.count = 0
+
+    def begin(self):
+        if self.format == "json":
+            self.out.write('{"_type": "unit", "items": [')
+
+    def write(self, node):
+        if node.get("_type") not in UNIT_ITEM_TYPES:
+            return
+        text = json.dumps(node, ensure_ascii=False)
+        if self.format == "json":
+            self.out.write(", " + text if self.count else text)
+        else:
+            self.out.write(text + "\n")
+        self.count += 1
+
+    def end(self):
+        if self.format == "json":
+            self.out.write("]}")
+
+
+def stream_unit(code, out, format="json", echo=None, parser=None):
+    writer = JsonWriter(out, format)
+    writer.begin()
+    for node in iter_declarations(code, parser):
+        if echo is not None:
+            echo(node)
+        writer.write(node)
+    writer.end()
+    return writer.count
@@ -0,0 +1,469 @@
+import bisect
+import hashlib
+import json
+import os
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from comments import doc_comments
+from parser_factory import CACHE_DIR
+from source import decode_bytes
+
+# Индекс символов по результату ClassDeclarationsTransformer.
+#
+# Символ - словарь:
+#   {"id", "kind", "name", "container", "access", "shared", "type",
+#    "parents", "path", "line", "column", "doc"}
+# kind: class, interface, method, constructor, property, field, enum,
+#       enum_value, const, delegate, event.
+# container - имя объемлющего класса/интерфейса/перечисления или None.
+# doc - текст блока /// перед объявлением (comments.doc_comments).
+# Имена в Fore регистронезависимы, поэтому ключи индексов в нижнем регистре.
+
+INDEX_PATH = os.path.join(CACHE_DIR, "symbols.json")
+INDEX_FORMAT = 3
+
+# === Извлечение символов из дерева ===
+def _token(node):
+    # {"_type": "word"/"variable", "value": token} -> token
+    while isinstance(node, dict):
+        node = node.get("value")
+    return node
+
+
+def _position(node):
+    token = _token(node)
+    return getattr(token, "line", None), getattr(token, "column", None)
+
+
+def type_name(node):
+    if node is None:
+        return None
+    if isinstance(node, dict):
+        if node.get("_type") == "type_array":
+            inner = type_name(node.get("type"))
+            return "Array Of %s" % inner if inner else "Array"
+        return type_name(node.get("value"))
+    return str(node)
+
+
+def _symbol(kind, name_node, container=None, access=None, **extra):
+    line, column = _position(name_node)
+    symbol = {
+        "kind": kind,
+        "name": str(_token(name_node)),
+        "container": container,
+        "access": access,
+        "line": line,
+        "column": column,
+    }
+    symbol.update(extra)
+    return symbol
+
+
+def _callable(kind, decl, container):
+    return _symbol(
+        kind,
+        decl["name"],
+        container,
+        decl.get("access_modifier"),
+        shared=decl.get("shared") is not None,
+        type=type_name(decl.get("return_type")),
+    )
+
+
+def _enum(decl, container, out):
+    out.append(_symbol("enum", decl["name"], container, decl.get("access_modifier")))
+    name = str(_token(decl["name"]))
+    for value in decl.get("values") or ():
+        out.append(_symbol("enum_value", value["name"], name))
+
+
+def _consts(items, container, access, out):
+    for const in items or ():
+        out.append(_symbol("const", const["name"], container, access))
+
+
+def _class(decl, out):
+    name = str(_token(decl["class_name"]))
+    out.append(
+        _symbol(
+            "class",
+            decl["class_name"],
+            None,
+            decl.get("access_modifier"),
+            parents=[type_name(t) for t in decl.get("parents") or ()],
+        )
+    )
+    body = decl.get("class_body")
+    if body is None:
+        return
+
+    for field in body["field_declarations"]:
+        out.append(
+            _symbol(
+                "field",
+                field["name"],
+                name,
+                field.get("access_modifier"),
+                shared=field.get("shared") is not None,
+                type=type_name(field.get("field_type")),
+            )
+        )
+    for ctor in body["constructor_declarations"]:
+        out.append(_symbol("constructor", ctor["name"], name, ctor.get("access_modifier")))
+    for method in body["method_declarations"]:
+        out.append(_callable("method", method, name))
+    for prop in body["property_declarations"]:
+        out.append(_callable("property", prop, name))
+    for const in body["const_declarations"]:
+        _consts([const["declaration"]], name, const.get("access_modifier"), out)
+    for event in body["event_declarations"]:
+        out.append(
+            _symbol(
+                "event", event["name"], name, event.get("access_modifier"), type=type_name(event.get("delegate_type"))
+            )
+        )
+    for enum in body["enum_declarations"]:
+        _enum(enum, name, out)
+
+
+def _interface(decl, out):
+    name = str(_token(decl["interface_name"]))
+    parent = type_name(decl.get("parent"))
+    out.append(
+        _symbol("interface", decl["interface_name"], None, decl.get("access_modifier"), parents=[parent] if parent else [])
+    )
+    body = decl.get("interface_body")
+    if body is None:
+        return
+    for method in body["interface_method_declarations"]:
+        out.append(_callable("method", method, name))
+    for prop in body["interface_property_declarations"]:
+        out.append(_callable("property", prop, name))
+
+
+def extract_symbols(tree, docs=None):
+    out = []
+    for item in tree.get("items", ()):
+        kind = item.get("_type")
+        if kind == "class_def":
+            _class(item, out)
+        elif kind == "interface_def":
+            _interface(item, out)
+        elif kind == "method_declaration":
+            out.append(_callable("method", item, None))
+        elif kind == "enum_declaration":
+            _enum(item, None, out)
+        elif kind == "const_block":
+            _consts(item.get("items"), None, item.get("access_modifier"), out)
+        elif kind == "delegate_declaration":
+            out.append(_callable("delegate", item, None))
+    if docs:
+        for symbol in out:
+            doc = docs.get(symbol["line"])
+            if doc is not None:
+                symbol["doc"] = doc
+    return out
+
+
+# === Индекс ===
+class SymbolIndex:
+    def __init__(self):
+        self.symbols = {}  # id -> символ
+        self.files = {}  # путь -> {"digest": ..., "ids": [...]}
+        self._next_id = 1
+        self._by_name = {}  # имя -> [id]
+        self._by_qualname = {}  # "класс.член" -> [id]
+        self._by_parent = {}  # базовый класс/интерфейс -> [id]
+        self._by_container = {}  # класс/интерфейс/перечисление -> [id] членов
+        self._names = []  # различные имена для поиска по префиксу
+        self._names_sorted = True  # _names сортируется один раз перед поиском
+
+    def __len__(self):
+        return len(self.symbols)
+
+    @staticmethod
+    def _qualname(symbol):
+        if symbol["container"]:
+            return ("%s.%s" % (symbol["container"], symbol["name"])).lower()
+        return symbol["name"].lower()
+
+    def _add(self, symbol):
+        # id сохраняется между save/load, на него ссылается граф вызовов
+        sid = symbol.get("id") or self._next_id
+        self._next_id = max(self._next_id, sid + 1)
+        symbol["id"] = sid
+        self.symbols[sid] = symbol
+
+        name = symbol["name"].lower()
+        ids = self._by_name.get(name)
+        if ids is None:
+            ids = self._by_name[name] = []
+            self._names.append(name)
+            self._names_sorted = False
+        ids.append(sid)
+        self._by_qualname.setdefault(self._qualname(symbol), []).append(sid)
+        if symbol["container"]:
+            self._by_container.setdefault(symbol["container"].lower(), []).append(sid)
+        for parent in symbol.get("parents") or ():
+            self._by_parent.setdefault(parent.lower(), []).append(sid)
+        return sid
+
+    def _sorted_names(self):
+        if not self._names_sorted:
+            self._names.sort()
+            self._names_sorted = True
+        return self._names
+
+    @staticmethod
+    def _discard(index, key, sid):
+        ids = index.get(key)
+        if ids is None:
+            return False
+        ids.remove(sid)
+        if not ids:
+            del index[key]
+            return True
+        return False
+
+    def _remove(self, sid):
+        symbol = self.symbols.pop(sid)
+        name = symbol["name"].lower()
+        if self._discard(self._by_name, name, sid):
+            names = self._sorted_names()
+            del names[bisect.bisect_left(names, name)]
+        self._discard(self._by_qualname, self._qualname(symbol), sid)
+        if symbol["container"]:
+            self._discard(self._by_container, symbol["container"].lower(), sid)
+        for parent in symbol.get("parents") or ():
+            self._discard(self._by_parent, parent.lower(), sid)
+
+    # === Обновление ===
+    def add_file(self, path, symbols, digest=None):
+        # Повторное добавление пути заменяет его символы
+        self.remove_file(path)
+        ids = []
+        for symbol in symbols:
+            symbol["path"] = path
+            ids.append(self._add(symbol))
+        self.files[path] = {"digest": digest, "ids": ids}
+        return ids
+
+    def add_tree(self, path, tree, digest=None, docs=None):
+        return self.add_file(path, extract_symbols(tree, docs), digest)
+
+    def remove_file(self, path):
+        entry = self.files.pop(path, None)
+        if entry is None:
+            return False
+        for sid in entry["ids"]:
+            self._remove(sid)
+        return True
+
+    def reindex_file(self, path, code=None, parser=None):
+        # Перепарсить один модуль и заменить его символы. Символам тела
+        # методов не нужны - разбор без них (skim.py)
+        from skim import parse_skim
+
+        if code is None:
+            with open(path, "rb") as f:
+                data = f.read()
+        else:
+            data = code.encode("utf-8")
+        code = decode_bytes(data)
+        tree = parse_skim(code, parser)
+        return self.add_tree(path, tree, hashlib.sha256(data).hexdigest(), doc_comments(code))
+
+    # === Запросы ===
+    def _select(self, ids, kind):
+        if ids is None:
+            return []
+        if kind is None:
+            return [self.symbols[i] for i in ids]
+        return [self.symbols[i] for i in ids if self.symbols[i]["kind"] == kind]
+
+    def lookup(self, name, kind=None):
+        # "Create" - все символы с этим именем, "C1.Create" - член класса
+        key = name.lower()
+        if "." in key:
+            return self._select(self._by_qualname.get(key), kind)
+        return self._select(self._by_name.get(key), kind)
+
+    def prefix(self, prefix, kind=None, limit=None):
+        prefix = prefix.lower()
+        names = self._sorted_names()
+        result = []
+        i = bisect.bisect_left(names, prefix)
+        while i < len(names) and names[i].startswith(prefix):
+            result += self._select(self._by_name[names[i]], kind)
+            if limit is not None and len(result) >= limit:
+                return result[:limit]
+            i += 1
+        return result
+
+    def implementers(self, type_name):
+        # Классы и интерфейсы, у которых type_name в списке предков
+        return self._select(self._by_parent.get(type_name.lower()), None)
+
+    def members(self, container, kind=None):
+        return self._select(self._by_container.get(container.lower()), kind)
+
+    def in_file(self, path):
+        entry = self.files.get(path)
+        return [self.symbols[i] for i in entry["ids"]] if entry else []
+
+    def digest(self):
+        # Отпечаток модулей и id их символов: граф вызовов (callgraph.py)
+        # хранит его и не загружается к индексу, где id уже другие
+        h = hashlib.sha256()
+        for path in sorted(self.files):
+            entry = self.files[path]
+            h.update(json.dumps([path, entry["digest"], entry["ids"]]).encode("utf-8"))
+        return h.hexdigest()
+
+    # === Хранение ===
+    def to_dict(self):
+        from ast_cache import transformer_version
+
+        files = {}
+        for path, entry in self.files.items():
+            symbols = []
+            for sid in entry["ids"]:
+                symbol = dict(self.symbols[sid])
+                del symbol["path"]
+                symbols.append(symbol)
+            files[path] = {"digest": entry["digest"], "symbols": symbols}
+        return {"format": INDEX_FORMAT, "transformer": transformer_version(), "files": files}
+
+    def save(self, path=INDEX_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=".tmp-", suffix=".json")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False)
+        os.replace(tmp, path)
+        return path
+
+    @classmethod
+    def load(cls, path=INDEX_PATH):
+        # Индекс от другой версии трансформера считается пустым
+        from ast_cache import transformer_version
+
+        index = cls()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return index
+        if data.get("format") != INDEX_FORMAT or data.get("transformer") != transformer_version():
+            return index
+        for file_path, entry in data["files"].items():
+            index.add_file(file_path, entry["symbols"], entry["digest"])
+        return index
+
+
+# === Индексация каталога ===
+def _index_file(job):
+    from skim import parse_skim
+
+    path, rel = job
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        code = decode_bytes(data)
+        return rel, digest, extract_symbols(parse_skim(code), doc_comments(code)), None
+    except Exception as e:
+        return rel, None, None, "%s: %s" % (type(e).__name__, e)
+
+
+def update_index(index, root, jobs=None, extensions=None):
+    # Переиндексирует только изменившиеся модули и удаляет пропавшие.
+    # Пути в индексе относительны root.
+    from ast_cache import _file_digest
+    from batch import DEFAULT_EXTENSIONS, find_sources
+
+    paths = find_sources(root, extensions or DEFAULT_EXTENSIONS)
+    seen = set()
+    work = []
+    for path in paths:
+        rel = os.path.relpath(path, root)
+        seen.add(rel)
+        entry = index.files.get(rel)
+        if entry is None or entry["digest"] != _file_digest(path):
+            work.append((path, rel))
+
+    report = {"indexed": 0, "removed": 0, "unchanged": len(paths) - len(work), "errors": []}
+    for rel in [p for p in index.files if p not in seen]:
+        index.remove_file(rel)
+        report["removed"] += 1
+
+    if work:
+        chunksize = max(1, len(work) // ((jobs or os.cpu_count() or 1) * 4))
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            for rel, digest, symbols, error in pool.map(_index_file, work, chunksize=chunksize):
+                if error is not None:
+                    # Символы последней удачной версии остаются в индексе
+                    report["errors"].append({"path": rel, "error": error})
+                    continue
+                index.add_file(rel, symbols, digest)
+                report["indexed"] += 1
+    return report
+
+
+def _format(symbol):
+    name = "%s.%s" % (symbol["container"], symbol["name"]) if symbol["container"] else symbol["name"]
+    return "%s:%s:%s: %s %s%s" % (
+        symbol["path"],
+        symbol["line"] or "?",
+        symbol["column"] or "?",
+        symbol["kind"],
+        name,
+        " (%s)" % ", ".join(symbol["parents"]) if symbol.get("parents") else "",
+    )
+
+
+def main(argv=None):
+    import argparse
+
+    ap = argparse.ArgumentParser(prog="symbols")
+    ap.add_argument("--index", default=INDEX_PATH)
+    sub = ap.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("build", help="index (or refresh) every unit under root")
+    p.add_argument("root")
+    p.add_argument("-j", "--jobs", type=int, default=None)
+    p = sub.add_parser("find", help="look up a name or Class.member")
+    p.add_argument("name")
+    p.add_argument("--kind")
+    p.add_argument("--prefix", action="store_true")
+    p = sub.add_parser("implementers", help="classes deriving from a type")
+    p.add_argument("type")
+    args = ap.parse_args(argv)
+
+    index = SymbolIndex.load(args.index)
+    if args.command == "build":
+        report = update_index(index, args.root, args.jobs)
+        index.save(args.index)
+        print(
+            "indexed: %d, unchanged: %d, removed: %d, symbols: %d"
+            % (report["indexed"], report["unchanged"], report["removed"], len(index)),
+            file=sys.stderr,
+        )
+        for error in report["errors"]:
+            print("  %s: %s" % (error["path"], error["error"].splitlines()[0]), file=sys.stderr)
+        return 1 if report["errors"] else 0
+
+    if args.command == "find":
+        if args.prefix:
+            found = index.prefix(args.name, args.kind)
+        else:
+            found = index.lookup(args.name, args.kind)
+    else:
+        found = index.implementers(args.type)
+    for symbol in found:
+        print(_format(symbol))
+    return 0 if found else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,18 +2,29 @@ import re
 from lark import v_args, Token
 from lark.visitors import Transformer
 
+# Объявления верхнего уровня, попадающие в unit["items"]
+UNIT_ITEM_TYPES = (
+    "class_def",
+    "method_declaration",
+    "interface_def",
+    "enum_declaration",
+    "const_block",
+    "delegate_declaration",
+)
+
 
 class ClassDeclarationsTransformer(Transformer):
+    # Типы, которые считаются узлами дерева при разборе children
+    node_types = (dict,)
+
     def unit(self, children):
         items = {}
         items["_type"] = "unit"
         items["items"] = []
 
         for ch in children:
-            if isinstance(ch, dict):
-                if ch.get("_type") == "class_def":
-                    items["items"].append(ch)
-                if ch.get("_type") == "method_declaration":
+            if isinstance(ch, self.node_types):
+                if ch.get("_type") in UNIT_ITEM_TYPES:
                     items["items"].append(ch)
 
         return items
@@ -22,11 +33,14 @@ class ClassDeclarationsTransformer(Transformer):
         items = {}
         items["_type"] = "class_def"
         items["access_modifier"] = children[0]
-        items["class_name"] = children[2]
-
-        for ch in children:
-            if isinstance(ch, dict):
-                if ch.get("_type") == "class_body":
+        items["class_name"] = children[3]
+        items["parents"] = []
+
+        for ch in children[4:]:
+            if isinstance(ch, self.node_types):
+                if ch.get("_type") == "type":
+                    items["parents"].append(ch)
+                elif ch.get("_type") == "class_body":
                     items["class_body"] = ch
 
         return items
@@ -38,10 +52,12 @@ class ClassDeclarationsTransformer(Transformer):
         items["method_declarations"] = []
         items["constructor_declarations"] = []
         items["const_declarations"] = []
+        items["event_declarations"] = []
+        items["enum_declarations"] = []
         items["_type"] = "class_body"
 
         for ch in children:
-            if isinstance(ch, dict):
+            if isinstance(ch, self.node_types):
                 if ch.get("_type") == "constructor":
                     items["constructor_declarations"].append(ch)
                 elif ch.get("_type") == "field_declaration":
@@ -52,10 +68,14 @@ class ClassDeclarationsTransformer(Transformer):
                     items["method_declarations"].append(ch)
                 elif ch.get("_type") == "class_const_declaration":
                     items["const_declarations"].append(ch)
+                elif ch.get("_type") == "enum_declaration":
+                    items["enum_declarations"].append(ch)
             if isinstance(ch, list):
                 for item in ch:
                     if item.get("_type") == "field_declaration":
                         items["field_declarations"].append(item)
+                    elif item.get("_type") == "event_declaration":
+                        items["event_declarations"].append(item)
         return items
 
     def class_const_declaration(self, children):
@@ -82,13 +102,12 @@ class ClassDeclarationsTransformer(Transformer):
 
     def parameter(self, children):
         params = []
-        names = []
         is_var = children[0] != None
         is_paramarray = children[1] != None
 
-        for ch in children:
-            if isinstance(ch, dict) and ch["_type"] == "variable":
-                names.append(ch)
+        # [VAR] [PARAMARRAY] имена... тип [значение]: переменная в значении
+        # по умолчанию - не имя параметра
+        names = children[2:-2]
 
         for name in names:
             params.append(
@@ -105,7 +124,22 @@ class ClassDeclarationsTransformer(Transformer):
 
     # === Модификаторы доступа ===
     def access_modifier(self, children):
-        return children[0]
+        # "Protected Friend" - два токена; склеенный Token с позициями от
+        # первого до последнего, чтобы диапазон объявления (spans.py)
+        # начинался с модификатора
+        first, last = children[0], children[-1]
+        if not isinstance(first, Token) or not isinstance(last, Token):
+            return " ".join(children)
+        return Token(
+            "ACCESS_MODIFIER",
+            " ".join(children),
+            first.start_pos,
+            first.line,
+            first.column,
+            last.end_line,
+            last.end_column,
+            last.end_pos,
+        )
 
     def protected_friend(self, _):
         return "Protected Friend"
@@ -115,7 +149,7 @@ class ClassDeclarationsTransformer(Transformer):
         fields = []
 
         for ch in children:
-            if isinstance(ch, dict) and ch["_type"] == "variable":
+            if isinstance(ch, self.node_types) and ch["_type"] == "variable":
                 field_names.append(ch)
 
         for name in field_names:
@@ -125,7 +159,8 @@ class ClassDeclarationsTransformer(Transformer):
                     "access_modifier": children[0],
                     "shared": children[1],
                     "name": name,
-                    "field_type": children[-1],
+                    "field_type": children[-2],
+                    "default": children[-1],
                 }
             )
 
@@ -160,7 +195,7 @@ class ClassDeclarationsTransformer(Transformer):
         var_block = None
 
         for ch in children:
-            if isinstance(ch, dict):
+            if isinstance(ch, self.node_types):
                 if ch["_type"] == "const_block":
                     if not const_block:
                         const_block = ch
@@ -202,7 +237,7 @@ class ClassDeclarationsTransformer(Transformer):
     def statement(self, children):
         if children:
             stmt = children[0]
-            if isinstance(stmt, dict) and stmt["_type"] in ("word", "variable"):
+            if isinstance(stmt, self.node_types) and stmt["_type"] in ("word", "variable"):
                 return {
                     "_type": "method_call",
                     "method": stmt,
@@ -269,15 +304,16 @@ class ClassDeclarationsTransformer(Transformer):
         }
 
     def simple_expression(self, children):
-        if len(children) == 1:
-            return children[0]
-
-        return {
-            "_type": "simple_expression",
-            "op": children[1].value if children[1] is Token else children[1],
-            "left": children[0],
-            "right": children[2],
-        }
+        # a + b - c -> ((a + b) - c): цепочка сворачивается влево
+        node = children[0]
+        for i in range(1, len(children) - 1, 2):
+            node = {
+                "_type": "simple_expression",
+                "op": children[i].value if children[i] is Token else children[i],
+                "left": node,
+                "right": children[i + 1],
+            }
+        return node
 
     def type_cast(self, children):
         return {
@@ -412,7 +448,7 @@ class ClassDeclarationsTransformer(Transformer):
             if isinstance(ch, Token):
                 if ch.type == "EXCEPT":
                     except_idx = i
-                elif ch.type == "TRY" and not statements:
+                elif ch.type == "TRY" and i == 0:
                     statements = children[i + 1]
                 elif ch.type == "ELSE":
                     else_statements = children[i + 1]
@@ -455,12 +491,16 @@ class ClassDeclarationsTransformer(Transformer):
         }
 
     def term(self, children):
-        return {
-            "_type": "term",
-            "op": children[1],
-            "left": children[0],
-            "right": children[2],
-        }
+        # Как simple_expression: a * b / c -> ((a * b) / c)
+        node = children[0]
+        for i in range(1, len(children) - 1, 2):
+            node = {
+                "_type": "term",
+                "op": children[i],
+                "left": node,
+                "right": children[i + 1],
+            }
+        return node
 
     def factor(self, children):
         return {
@@ -490,13 +530,13 @@ class ClassDeclarationsTransformer(Transformer):
     def property_get(self, children):
         return {
             "_type": "property_get",
-            "body": children[0],
+            "body": children[1],
         }
 
     def property_set(self, children):
         return {
             "_type": "property_set",
-            "body": children[0],
+            "body": children[1],
         }
 
     def var_block(self, children):
@@ -519,8 +559,9 @@ class ClassDeclarationsTransformer(Transformer):
         is_array = False
 
         for ch in children:
-            if isinstance(ch, dict):
-                if ch["_type"] == "variable":
+            if isinstance(ch, self.node_types):
+                # Имена - до типа; переменные после типа - значение по умолчанию
+                if ch["_type"] == "variable" and var_type is None:
                     var_names.append(ch)
                 elif ch["_type"] == "type":
                     var_type = ch
@@ -539,7 +580,7 @@ class ClassDeclarationsTransformer(Transformer):
                     "type": var_type,
                     "default_value": (
                         var_default_values
-                        if is_array
+                        if is_array or len(var_default_values) > 1
                         else var_default_values[0] if var_default_values else None
                     ),
                 }
@@ -564,7 +605,7 @@ class ClassDeclarationsTransformer(Transformer):
         items["parent"] = children[3]
 
         for ch in children:
-            if isinstance(ch, dict):
+            if isinstance(ch, self.node_types):
                 if ch.get("_type") == "interface_body":
                     items["interface_body"] = ch
 
@@ -577,7 +618,7 @@ class ClassDeclarationsTransformer(Transformer):
         items["_type"] = "interface_body"
 
         for ch in children:
-            if isinstance(ch, dict):
+            if isinstance(ch, self.node_types):
                 if ch.get("_type") == "interface_property_declaration":
                     items["interface_property_declarations"].append(ch)
                 elif ch.get("_type") == "interface_method_declaration":
@@ -617,7 +658,7 @@ class ClassDeclarationsTransformer(Transformer):
         arr_size = None
 
         for ch in children:
-            if isinstance(ch, dict):
+            if isinstance(ch, self.node_types):
                 if ch['_type'] == 'type':
                     arr_type = ch
 
@@ -662,14 +703,35 @@ class ClassDeclarationsTransformer(Transformer):
             "return_type": children[4],
         }
     
-    def event_declaration(self, children):
+    def enum_declaration(self, children):
         return {
-            "_type": "event_declaration",
+            "_type": "enum_declaration",
             "access_modifier": children[0],
             "name": children[2],
-            "delegate_type": children[3],
+            "values": children[3],
+        }
+
+    def enum_body(self, children):
+        return children
+
+    def enum_value(self, children):
+        return {
+            "_type": "enum_value",
+            "name": children[0],
+            "value": children[1],
         }
 
+    def event_declaration(self, children):
+        return [
+            {
+                "_type": "event_declaration",
+                "access_modifier": children[0],
+                "name": ch,
+                "delegate_type": children[-1],
+            }
+            for ch in children[2:-1]
+        ]
+
     def index_access(self, children):
         return {
             "_type": "index_access",
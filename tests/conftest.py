@@ -0,0 +1,31 @@
+import os
+import sys
+
+import pytest
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+EXAMPLES_DIR = os.path.join(os.path.dirname(SRC_DIR), "examples")
+sys.path.insert(0, SRC_DIR)
+
+
+def read_example(name):
+    with open(os.path.join(EXAMPLES_DIR, name), "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def positions(value):
+    # Токены дерева с позициями: dict == сравнивает только текст токенов
+    from lark import Token
+
+    if isinstance(value, Token):
+        return [(str(value), value.line, value.column, value.start_pos, value.end_line, value.end_column, value.end_pos)]
+    if isinstance(value, dict):
+        value = list(value.values())
+    if isinstance(value, list):
+        return [p for item in value for p in positions(item)]
+    return []
+
+
+@pytest.fixture(scope="session")
+def code():
+    return read_example("code.txt")
@@ -0,0 +1,57 @@
+from ast_binary import AstReader, LazyNode, dump, dumps, load, loads, to_plain
+from batch import parse_source
+from constants import VALUE_KEY, fold_units
+
+
+def _lazy_bodies(value):
+    if isinstance(value, LazyNode):
+        yield value
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _lazy_bodies(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _lazy_bodies(item)
+
+
+def test_round_trip(code):
+    tree = parse_source(code)
+    assert loads(dumps(tree)) == tree
+
+
+def test_lazy_round_trip(code):
+    tree = parse_source(code)
+    unit = loads(dumps(tree), lazy=True)
+    bodies = list(_lazy_bodies(unit))
+    assert bodies
+    assert not any(body.loaded for body in bodies)
+    assert to_plain(unit) == tree
+    assert all(body.loaded for body in bodies)
+
+
+def test_reader_items(code):
+    tree = parse_source(code)
+    reader = AstReader(dumps(tree))
+    assert len(reader) == len(tree["items"])
+    assert reader[-1] == tree["items"][-1]
+    assert [to_plain(item) for item in reader] == tree["items"]
+
+
+def test_file_round_trip(code, tmp_path):
+    tree = parse_source(code)
+    path = str(tmp_path / "code.fast")
+    dump(tree, path)
+    assert load(path) == tree
+    with AstReader(path) as reader:
+        assert to_plain(reader.unit()) == tree
+    assert [p.name for p in tmp_path.iterdir()] == ["code.fast"]
+
+
+def test_folded_constants_round_trip():
+    tree = parse_source('Const\n    A = 0 - 5;\n    B = 3 / 2;\n    C = 1 / 3;\n    D = 1000000 * 1000000;\n    E = "-5";\n')
+    fold_units([tree])
+    values = [item[VALUE_KEY] for item in tree["items"][0]["items"]]
+    assert values == [-5, 1.5, 1 / 3, 10**12, "-5"]
+    assert loads(dumps(tree)) == tree
+    loaded = [item[VALUE_KEY] for item in AstReader(dumps(tree))[0]["items"]]
+    assert [(type(v), v) for v in loaded] == [(type(v), v) for v in values]
@@ -0,0 +1,21 @@
+import os
+
+import lark
+
+import ast_cache
+from ast_cache import AstCache, transformer_version
+
+
+def test_version_covers_lexer_comments_and_lark(monkeypatch):
+    names = {os.path.basename(path) for path in ast_cache.OUTPUT_SOURCES}
+    assert {"syntax.lark", "transformer.py", "lexer.py", "comments.py"} <= names
+
+    version = transformer_version()
+    monkeypatch.setattr(lark, "__version__", lark.__version__ + ".post1")
+    assert transformer_version() != version
+
+
+def test_cache_key_follows_version(tmp_path, monkeypatch):
+    key = AstCache(str(tmp_path)).key("Sub M;")
+    monkeypatch.setattr(ast_cache, "transformer_version", lambda: "0" * 64)
+    assert AstCache(str(tmp_path)).key("Sub M;") != key
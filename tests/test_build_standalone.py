@@ -0,0 +1,15 @@
+import os
+import stat
+
+import build_standalone
+
+
+def test_output_mode_follows_umask(tmp_path, monkeypatch):
+    monkeypatch.setattr(build_standalone, "generate", lambda: "X = 1\n")
+    umask = os.umask(0o022)
+    try:
+        output = build_standalone.build(str(tmp_path / "out.py"))
+    finally:
+        os.umask(umask)
+    assert stat.S_IMODE(os.stat(output).st_mode) == 0o644
+    assert sorted(os.listdir(tmp_path)) == ["__pycache__", "out.py"]
@@ -0,0 +1,63 @@
+from array import array
+
+from clones import BANDS, ROWS, SIGNATURE_SIZE, CloneIndex
+
+METHOD = """Sub {name}(items: IArrayList; limit: Integer);
+Var
+    {i}: Integer;
+    {total}: Integer;
+Begin
+    {total} := 0;
+    For {i} := 0 To items.Count - 1 Do
+        If {i} > limit Then
+            Return;
+        End If;
+        {total} := {total} + items.Item({i}) * 2;
+        Debug.WriteLine("item" + {i}.ToString);
+    End For;
+    While {total} > 100 Do
+        {total} := {total} - limit;
+    End While;
+    Debug.WriteLine({total});
+End Sub {name};
+"""
+
+OTHER = """Sub Other(path: String);
+Var
+    f: IFile;
+Begin
+    Try
+        f := Files.Open(path);
+        f.Write("header");
+        f.Close;
+    Except On e: Exception Do
+        Debug.WriteLine(e.Message);
+    End Try;
+End Sub Other;
+"""
+
+
+def test_renamed_copy_is_detected(tmp_path):
+    (tmp_path / "a.fore").write_text(METHOD.format(name="Sum", i="i", total="total") + OTHER, encoding="utf-8")
+    (tmp_path / "b.fore").write_text(METHOD.format(name="Add", i="k", total="acc"), encoding="utf-8")
+    index = CloneIndex()
+    assert index.build(str(tmp_path), jobs=1) == []
+    report = index.report()
+    assert len(report) == 1
+    assert sorted(m["name"] for m in report[0]) == ["Add", "Sum"]
+    assert all(m["exact"] for m in report[0])
+
+
+def test_pairs_behind_dissimilar_bucket_head():
+    # B и C совпадают в 52 словах из 64; A - первый в их общих корзинах,
+    # но на них не похож
+    shared = set(range(0, 4 * ROWS))
+    a = array("I", [0 if i in shared else 1000 + i for i in range(SIGNATURE_SIZE)])
+    b = array("I", [0 if i in shared else 2000 + i for i in range(SIGNATURE_SIZE)])
+    c = array("I", b)
+    for band in range(4, BANDS):
+        c[band * ROWS] += 1
+    index = CloneIndex()
+    for name, sig in (("A", a), ("B", b), ("C", c)):
+        index.add("x.fore", name, 1, 100, name, sig)
+    assert index.groups(0.8) == [[1, 2]]
@@ -0,0 +1,35 @@
+import standalone
+from comments import strip_comments
+from conftest import positions
+from parser_factory import build_parser, get_parser
+
+COMMENTS = """/* multi
+line */
+Sub M;
+Var x: String;
+Begin
+    /* a */ x := "/* not a comment */"; { b
+    } x := 'c // d';
+    // e
+    /// f
+End Sub M;
+"""
+
+
+def test_strip_comments_keeps_offsets():
+    stripped = strip_comments(COMMENTS)
+    assert len(stripped) == len(COMMENTS)
+    assert stripped.count("\n") == COMMENTS.count("\n")
+    assert '"/* not a comment */"' in stripped
+    assert "'c // d'" in stripped
+    for comment in ("multi", "/* a */", "{ b", "// e", "/// f"):
+        assert comment not in stripped
+
+
+def test_parsers_agree_on_comments():
+    tree = get_parser().parse(COMMENTS)
+    # Стандартный лексер lark по %ignore грамматики и собранный модуль
+    stock = build_parser(cache=False, _plugins={}).parse(COMMENTS)
+    assert tree == stock
+    assert positions(tree) == positions(stock)
+    assert standalone.parse(COMMENTS) == tree
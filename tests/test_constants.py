@@ -0,0 +1,90 @@
+from batch import parse_source
+from constants import NOT_CONSTANT, VALUE_KEY, binary, fold_units
+
+GLOBALS = """Const
+    A = 11;
+    B = C + 1;
+    X = Y + 1;
+    Y = X + 1;
+    Q = -7 Div 2;
+    R = -7 Mod 2;
+Enum E
+    One = 1,
+    Two = A
+End Enum E;
+Sub M(p: Integer = A);
+Const L = A Div 2;
+Var v: Integer = L;
+Begin
+End Sub M;
+Sub N(A: Integer);
+Const K = A Div 2;
+Begin
+End Sub N;
+"""
+
+OTHER = """Const
+    C = A * 2;
+    D = E.Two + 1;
+"""
+
+
+def _values(tree):
+    # Имя объявления -> свёрнутое значение (NOT_CONSTANT, если ключа нет)
+    result = {}
+    stack = [tree]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, dict):
+            name = value.get("name")
+            if value.get("_type") != "method_declaration" and isinstance(name, dict):
+                result[str(name["value"])] = value.get(VALUE_KEY, NOT_CONSTANT)
+            stack.extend(value.values())
+        elif isinstance(value, list):
+            stack.extend(value)
+    return result
+
+
+def _fold():
+    trees = [parse_source(GLOBALS), parse_source(OTHER)]
+    folder = fold_units(trees)
+    values = _values(trees[0])
+    values.update(_values(trees[1]))
+    return folder, values
+
+
+def test_references_across_units():
+    _, values = _fold()
+    assert values["A"] == 11
+    assert values["C"] == 22
+    assert values["B"] == 23
+    assert values["Two"] == 11
+    assert values["D"] == 12
+
+
+def test_defaults_and_local_constants():
+    _, values = _fold()
+    assert values["L"] == 5
+    assert values["p"] == 11
+    assert values["v"] == 5
+
+
+def test_parameter_shadows_global_constant():
+    _, values = _fold()
+    assert values["K"] is NOT_CONSTANT
+
+
+def test_cycle_is_not_constant():
+    folder, values = _fold()
+    assert values["X"] is NOT_CONSTANT
+    assert values["Y"] is NOT_CONSTANT
+    assert folder.cycles
+
+
+def test_div_mod_truncate_toward_zero():
+    _, values = _fold()
+    assert (values["Q"], values["R"]) == (-3, -1)
+    assert binary("div", 7, -2) == -3
+    assert binary("mod", 7, -2) == 1
+    assert binary("mod", -7, -2) == -1
+    assert binary("div", 1, 0) is NOT_CONSTANT
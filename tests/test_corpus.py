@@ -0,0 +1,11 @@
+from batch import parse_source
+from corpus import generate, parse_mix
+
+
+def test_default_mix_parses():
+    parse_source(generate(300, seed=1))
+
+
+def test_compound_only_mix_terminates():
+    code = generate(300, seed=2, mix=parse_mix("if=1,try=1"))
+    assert parse_source(code)["items"]
@@ -0,0 +1,78 @@
+import asyncio
+import json
+import os
+import socket
+from concurrent.futures import Executor, Future
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+import daemon
+from daemon import Daemon, _claim_socket
+
+
+class _BrokenPool(Executor):
+    def __init__(self):
+        self.closed = False
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        future.set_exception(BrokenProcessPool("worker died"))
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.closed = True
+
+
+class _Writer:
+    def __init__(self):
+        self.lines = []
+
+    def write(self, data):
+        self.lines.append(data)
+
+    async def drain(self):
+        pass
+
+
+def test_live_socket_is_not_taken_over(tmp_path):
+    path = str(tmp_path / "d.sock")
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(path)
+    listener.listen()
+    try:
+        with pytest.raises(FileExistsError):
+            _claim_socket(path)
+        assert daemon.serve(path, 1) == 1
+        assert os.path.exists(path)
+    finally:
+        listener.close()
+
+
+def test_stale_socket_is_removed(tmp_path):
+    path = str(tmp_path / "d.sock")
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(path)
+    stale.close()
+    _claim_socket(path)
+    assert not os.path.exists(path)
+
+
+def test_broken_pool_replies_and_restarts(monkeypatch):
+    server = Daemon(workers=1)
+    broken = server.pool = _BrokenPool()
+    restarted = _BrokenPool()
+    monkeypatch.setattr(server, "_new_pool", lambda: restarted)
+    writer = _Writer()
+
+    async def respond():
+        slots = asyncio.Semaphore(1)
+        await slots.acquire()
+        await server._respond({"id": 7, "source": ""}, writer, asyncio.Lock(), slots)
+        assert not slots.locked()
+
+    asyncio.run(respond())
+    response = json.loads(b"".join(writer.lines))
+    assert (response["id"], response["ok"], response["error"]) == (7, False, "BrokenProcessPool")
+    assert server.pool is restarted
+    assert broken.closed
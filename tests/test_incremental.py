@@ -0,0 +1,68 @@
+import pytest
+from lark.exceptions import UnexpectedInput
+
+import incremental
+from batch import parse_source
+from conftest import positions
+from incremental import IncrementalParser
+from splitter import shift_positions
+
+
+def _assert_full(parser):
+    full = parse_source(parser.code)
+    assert parser.tree == full
+    assert positions(parser.tree) == positions(full)
+
+
+def test_edits_match_full_reparse(code):
+    parser = IncrementalParser(code)
+    _assert_full(parser)
+
+    # Оператор в методе класса
+    i = parser.code.index(":= ", parser.code.index("\nClass ")) + 3
+    assert parser.edit(i, i, "1 + ") == "member"
+    _assert_full(parser)
+
+    # Перевод строки в теле метода верхнего уровня: сдвигаются строки
+    # всех следующих объявлений
+    i = parser.code.index(":= ", parser.code.index("\nSub ")) + 3
+    assert parser.edit(i, i, "\n\n") == "declaration"
+    _assert_full(parser)
+
+    # Удаление и замена в начале модуля
+    assert parser.edit(0, 0, "// header\n") == "declaration"
+    _assert_full(parser)
+    assert parser.edit(0, len("// header\n"), "") == "declaration"
+    _assert_full(parser)
+
+
+def test_edit_across_declarations_reparses_everything(code):
+    parser = IncrementalParser(code)
+    start, end = parser.span(0)[1] - 1, parser.span(1)[0] + 1
+    assert parser.edit(start, end, parser.code[start:end] + "\n") == "full"
+    _assert_full(parser)
+
+
+def test_bugs_are_not_hidden_by_fallback(code, monkeypatch):
+    # Ошибка только при перепарсинге члена: уровень объявления прошел бы
+    calls = []
+
+    def broken(*args):
+        calls.append(args)
+        if len(calls) == 1:
+            raise RuntimeError("bug")
+        return shift_positions(*args)
+
+    parser = IncrementalParser(code)
+    monkeypatch.setattr(incremental, "shift_positions", broken)
+    i = parser.code.index(":= ", parser.code.index("\nClass ")) + 3
+    with pytest.raises(RuntimeError):
+        parser.edit(i, i, "1 + ")
+
+
+def test_syntax_error_falls_back_to_full_parse(code):
+    parser = IncrementalParser(code)
+    i = parser.code.index(":= ", parser.code.index("\nClass ")) + 3
+    with pytest.raises(UnexpectedInput):
+        parser.edit(i, i, ")")
+    assert parser.code == code
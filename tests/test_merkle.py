@@ -0,0 +1,86 @@
+import pytest
+
+from batch import parse_source
+from merkle import diff_snapshots, diff_trees, load_snapshot, new_snapshot, outline, save_snapshot, update_snapshot
+
+UNIT = """Class A: Object
+    Sub M;
+    Var x: Integer;
+    Begin
+        x := 1;
+        x := 2;
+    End Sub M;
+
+    Sub N;
+    Begin
+    End Sub N;
+End Class A;
+
+Sub Main;
+Begin
+End Sub Main;
+"""
+
+
+def _changes(old, new):
+    return sorted(
+        (c["change"], c["kind"], c["name"], c["container"]) for c in diff_trees(parse_source(old), parse_source(new))
+    )
+
+
+def test_positions_do_not_change_hashes():
+    assert outline(parse_source(UNIT))["hash"] == outline(parse_source("\n\n" + UNIT))["hash"]
+    assert _changes(UNIT, "\n\n" + UNIT) == []
+
+
+def test_statement_change_is_localized():
+    changed = UNIT.replace("x := 2;", "x := 3;")
+    assert _changes(UNIT, changed) == [
+        ("changed", "class", "A", None),
+        ("changed", "method", "M", "A"),
+        ("changed", "statement", "assignment_statement", "A.M"),
+    ]
+
+
+def test_declarations_added_and_removed():
+    changed = UNIT.replace("Sub Main;\nBegin\nEnd Sub Main;", "Sub Other;\nBegin\nEnd Sub Other;")
+    assert _changes(UNIT, changed) == [("added", "method", "Other", None), ("removed", "method", "Main", None)]
+
+
+def test_snapshot_update_and_diff(tmp_path):
+    root = tmp_path / "src"
+    root.mkdir()
+    (root / "a.fore").write_text(UNIT, encoding="utf-8")
+    (root / "b.fore").write_text("Sub B;\nBegin\nEnd Sub B;\n", encoding="utf-8")
+    path = str(tmp_path / "snapshot.json")
+
+    old = load_snapshot(path)
+    assert update_snapshot(old, str(root), jobs=1)["updated"] == 2
+    save_snapshot(old, path)
+
+    (root / "a.fore").write_text(UNIT.replace("x := 2;", "x := 3;"), encoding="utf-8")
+    (root / "b.fore").unlink()
+    new = load_snapshot(path)
+    report = update_snapshot(new, str(root), jobs=1)
+    assert (report["updated"], report["removed"], report["unchanged"]) == (1, 1, 0)
+
+    changes = sorted((c["path"], c["change"], c["kind"]) for c in diff_snapshots(load_snapshot(path), new))
+    assert changes == [
+        ("a.fore", "changed", "class"),
+        ("a.fore", "changed", "method"),
+        ("a.fore", "changed", "statement"),
+        ("b.fore", "removed", "file"),
+    ]
+
+
+def test_snapshot_versions(tmp_path):
+    path = tmp_path / "snapshot.json"
+    path.write_text('{"format": 0}', encoding="utf-8")
+    with pytest.raises(ValueError):
+        load_snapshot(str(path))
+
+    stale = dict(new_snapshot(), transformer="old")
+    with pytest.raises(ValueError):
+        diff_snapshots(stale, new_snapshot())
+    update_snapshot(stale, str(tmp_path), jobs=1)
+    assert stale == new_snapshot()
@@ -0,0 +1,34 @@
+import os
+
+import pytest
+
+from batch import parse_source
+from conftest import EXAMPLES_DIR
+from query import NodeIndex, QueryError, compile_query, main, select
+
+
+@pytest.fixture(scope="module")
+def index(code):
+    return NodeIndex().add(parse_source(code))
+
+
+def test_numeric_values(index):
+    assert compile_query("literal[value=1]").count(index) == compile_query('literal[value="1"]').count(index) > 0
+    assert compile_query("literal[value=-1]").count(index) == compile_query("literal[value='-1']").count(index)
+
+
+def test_numeric_is_not_a_node_type():
+    with pytest.raises(QueryError):
+        compile_query("1[value=1]")
+
+
+def test_escaped_quotes():
+    tree = parse_source('Sub M;\nVar s: String;\nBegin\n    s := "a""b";\nEnd Sub M;\n')
+    assert len(select(tree, r'literal[value="\"a\"\"b\""]')) == 1
+
+
+@pytest.mark.parametrize("text", ["try_block[", 'if_statement[x~="("]', "[name=A]"])
+def test_bad_selector_exits_with_message(text, capsys):
+    assert main([text, os.path.join(EXAMPLES_DIR, "small.txt")]) == 2
+    err = capsys.readouterr().err
+    assert err.startswith("query: ") and err.count("\n") == 1
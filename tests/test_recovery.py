@@ -0,0 +1,79 @@
+from batch import parse_source
+from conftest import positions
+from recovery import parse_recovering
+
+UNIT = """Class A: Object
+    Sub M;
+    Var x: Integer;
+    Begin
+        x := 1;
+        {statement}
+        x := 3;
+    End Sub M;
+{member}
+End Class A;
+{declaration}
+Sub Main;
+Begin
+    Debug.WriteLine(1);
+End Sub Main;
+"""
+
+MEMBER = """
+    Sub N({parameters});
+    Begin
+        x := 4;
+    End Sub N;
+"""
+
+
+def _unit(statement="x := 2;", parameters="a: Integer", member=True, declaration=""):
+    return UNIT.format(
+        statement=statement,
+        member=MEMBER.format(parameters=parameters) if member else "",
+        declaration=declaration,
+    )
+
+
+def _recover(code, level):
+    tree, diagnostics = parse_recovering(code)
+    assert [d["recovery"] for d in diagnostics] == [level]
+    return tree, diagnostics[0]
+
+
+def test_clean_input_matches_full_parse(code):
+    tree, diagnostics = parse_recovering(code)
+    assert diagnostics == []
+    full = parse_source(code)
+    assert tree == full
+    assert positions(tree) == positions(full)
+
+
+def test_broken_statement_is_skipped():
+    code = _unit(statement="x := * 2;")
+    tree, diagnostic = _recover(code, "statement")
+    assert (diagnostic["line"], diagnostic["pos"]) == (6, code.index("*"))
+    assert tree == parse_source(_unit(statement=""))
+
+
+def test_broken_member_is_skipped():
+    tree, _ = _recover(_unit(parameters="a: : Integer"), "member")
+    assert tree == parse_source(_unit(member=False))
+
+
+def test_broken_declaration_is_skipped():
+    tree, _ = _recover(_unit(declaration="Class B Object End Class B;"), "declaration")
+    assert tree == parse_source(_unit())
+
+
+def test_corrupted_statements_keep_other_declarations(code):
+    full = parse_source(code)
+    broken = code
+    for start in (len(code) // 3, 2 * len(code) // 3):
+        i = broken.index(":=", start)
+        broken = broken[:i] + ":= :=" + broken[i + 2 :]
+    tree, diagnostics = parse_recovering(broken)
+    assert [d["recovery"] for d in diagnostics] == ["statement", "statement"]
+    assert len(tree["items"]) == len(full["items"])
+    damaged = [i for i, (a, b) in enumerate(zip(tree["items"], full["items"])) if a != b]
+    assert 1 <= len(damaged) <= 2
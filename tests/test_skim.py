@@ -0,0 +1,66 @@
+from batch import parse_source
+from conftest import positions
+from skim import body_extents, expand_body, parse_skim
+
+MEMBER_ACCESS = """Class C: Object
+    Sub M;
+    Var x: Integer;
+    Begin
+        x := r.End;
+        x := r. // comment
+            Begin;
+        x := r./* comment */End + 1;
+        If x Then
+            x := 1;
+        End If;
+    End Sub M;
+End Class C;
+"""
+
+
+def _bodies(tree):
+    for item in tree["items"]:
+        if item["_type"] == "method_declaration":
+            yield item["body"]
+        body = item.get("class_body")
+        if body:
+            for key in ("method_declarations", "constructor_declarations"):
+                for member in body[key]:
+                    yield member["body"]
+            for prop in body["property_declarations"]:
+                for accessor in (prop["get_body"], prop["set_body"]):
+                    if accessor:
+                        yield accessor["body"]
+
+
+def _expand_all(code):
+    tree = parse_skim(code)
+    for body in _bodies(tree):
+        expand_body(code, body)
+        del body["body_span"]
+    return tree
+
+
+def test_member_access_is_not_a_body_boundary():
+    assert len(body_extents(MEMBER_ACCESS)) == 1
+    full = parse_source(MEMBER_ACCESS)
+    expanded = _expand_all(MEMBER_ACCESS)
+    assert expanded == full
+    assert positions(expanded) == positions(full)
+
+
+def test_skim_leaves_bodies_unparsed(code):
+    tree = parse_skim(code)
+    bodies = list(_bodies(tree))
+    assert bodies
+    for body in bodies:
+        assert body["statements"] is None
+        start, end = body["body_span"]
+        assert code[end : end + 3].lower() == "end"
+
+
+def test_expand_body_matches_full_parse(code):
+    full = parse_source(code)
+    expanded = _expand_all(code)
+    assert expanded == full
+    assert positions(expanded) == positions(full)
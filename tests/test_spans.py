@@ -0,0 +1,30 @@
+from spans import parse_with_spans
+
+CODE = """Public Class C: Object
+    Protected Friend Sub M;
+    Begin
+    End Sub M;
+    Private x: Integer;
+End Class C;
+"""
+
+
+def test_declaration_span_starts_at_access_modifier():
+    tree, table = parse_with_spans(CODE)
+    cls = tree["items"][0]
+    method = cls["class_body"]["method_declarations"][0]
+    field = cls["class_body"]["field_declarations"][0]
+    assert table.get(cls)[:3] == (1, 1, 0)
+    assert CODE[table.get(method).start_pos :].startswith("Protected Friend Sub M")
+    assert CODE[table.get(field).start_pos :].startswith("Private x")
+    modifier = table.get(method["access_modifier"])
+    assert CODE[modifier.start_pos : modifier.end_pos] == "Protected Friend"
+
+
+def test_frozen_table_matches_dict_lookup(code):
+    tree, table = parse_with_spans(code)
+    assert table.slots is None
+    frozen = table.flatten(tree)
+    table._thaw()
+    assert table.flatten(tree) == frozen
+    assert sum(span is not None for span in frozen) > len(table)
@@ -0,0 +1,17 @@
+import os
+
+from batch import parse_source
+from conftest import EXAMPLES_DIR, positions
+from splitter import parse_parallel, parse_parallel_file
+
+
+def test_parallel_parse_keeps_end_positions(code):
+    full = parse_source(code)
+    tree = parse_parallel(code, jobs=2)
+    assert tree == full
+    assert positions(tree) == positions(full)
+
+
+def test_parallel_file_parse_keeps_end_positions(code):
+    tree = parse_parallel_file(os.path.join(EXAMPLES_DIR, "code.txt"), jobs=2)
+    assert positions(tree) == positions(parse_source(code))
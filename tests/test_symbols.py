@@ -0,0 +1,36 @@
+import shutil
+
+from callgraph import build_repository
+from conftest import EXAMPLES_DIR
+from symbols import SymbolIndex, update_index
+
+
+def _files(index):
+    return index.to_dict()["files"]
+
+
+def test_callgraph_and_symbols_build_the_same_index(tmp_path):
+    shutil.copytree(EXAMPLES_DIR, str(tmp_path / "src"))
+    root = str(tmp_path / "src")
+    built, _, errors = build_repository(root, jobs=1)
+    assert errors == []
+    assert any("doc" in s for s in built.symbols.values())
+
+    index = SymbolIndex()
+    update_index(index, root, jobs=1)
+    assert _files(index) == _files(built)
+
+    # Индекс от callgraph не переиндексируется, и doc в нём уже есть
+    report = update_index(built, root, jobs=1)
+    assert report["indexed"] == 0 and report["unchanged"] == len(built.files)
+
+
+def test_prefix_after_bulk_add_and_remove():
+    index = SymbolIndex()
+    names = ["Zeta", "alpha", "Alpine", "beta", "ALPS"]
+    index.add_file("a.fore", [{"kind": "method", "name": n, "container": None, "line": 1, "column": 1} for n in names])
+    assert sorted(s["name"] for s in index.prefix("alp")) == ["ALPS", "Alpine", "alpha"]
+    index.add_file("b.fore", [{"kind": "method", "name": "Alpaca", "container": None, "line": 1, "column": 1}])
+    index.remove_file("a.fore")
+    assert [s["name"] for s in index.prefix("al")] == ["Alpaca"]
+    assert index.prefix("") == index.in_file("b.fore")